@@ -42,6 +42,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'shop.profiling.ProfilingMiddleware',
+    'shop.query_budget.QueryBudgetMiddleware',
+    'shop.query_log.QueryLogMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -140,3 +143,89 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Media
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Caches
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# The shared version numbers used by shop.cache live in the default cache, so in
+# production both aliases should point at a cache shared by all workers (memcached, redis).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'search': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'search',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+    # Rendered product and category pages of anonymous visitors
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pages',
+        'TIMEOUT': 600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 2000,
+        },
+    },
+}
+
+CATEGORY_CACHE_SIZE = 16
+TOOL_INDEX_CACHE_SIZE = 64
+AUTOCOMPLETE_MAX_AGE = 3600
+
+# Search
+SEARCH_PAGE_SIZE = 24
+SEARCH_FUZZY_THRESHOLD = 3
+SEARCH_FUZZY_MAX_DISTANCE = 2
+SEARCH_FUZZY_MAX_AGE = 3600
+SEARCH_CACHE_MAX_RESULTS = 1000
+SEARCH_MAX_CANDIDATES = 2000
+SEARCH_STATS_FLUSH_INTERVAL = 30
+
+# Cart holds: minutes an added product stays reserved for the cart (0 disables holds)
+CART_HOLD_MINUTES = 15
+
+# Product images: widths (in pixels) and encoder quality of the resized copies
+IMAGE_DERIVATIVE_WIDTHS = (320, 640, 1280)
+IMAGE_DERIVATIVE_QUALITY = 80
+# Threads per process building the resized copies of uploads, off the request path
+IMAGE_DERIVATIVE_WORKERS = 2
+
+# Listings
+CATEGORY_PAGE_SIZE = 24
+
+# Products per chunk of the staff catalog export; each chunk is streamed as one piece
+CATALOG_EXPORT_CHUNK_SIZE = 2000
+
+# What happens when a request runs more SQL queries than its view's @query_budget:
+# "raise" (used by the tests), "log" a warning with the repeated queries, or "off".
+# QUERY_BUDGETS = {'<url name>': (max_queries, max_time_ms)} overrides the declared budgets;
+# streaming views take a third item, max_queries_per_chunk.
+QUERY_BUDGET_MODE = 'log'
+
+# Sampled query log: the fraction of requests whose queries are aggregated per view and
+# fingerprint (0 disables it), flushed to rotating files read by `manage.py query_log_report`.
+# Every process writes its own file, QUERY_LOG_PATH with the process ID before the extension;
+# files not written to for QUERY_LOG_MAX_AGE_DAYS are deleted.
+QUERY_LOG_SAMPLE_RATE = 0
+QUERY_LOG_MIN_MS = 0
+QUERY_LOG_FLUSH_SECONDS = 60
+QUERY_LOG_PATH = BASE_DIR / 'logs' / 'query_log.jsonl'
+QUERY_LOG_MAX_BYTES = 10 * 2 ** 20
+QUERY_LOG_BACKUP_COUNT = 5
+QUERY_LOG_MAX_AGE_DAYS = 7
+
+# Per-request stack-sampling profiler, writing one speedscope (or "collapsed") file per
+# profiled request to PROFILE_DIR. PROFILE_SIGNED_REQUESTS profiles the requests carrying a
+# token from `manage.py profile_token <path>` in the X-Profile-Request header, for that path
+# and PROFILE_TOKEN_MAX_AGE seconds; PROFILE_SAMPLE_RATE profiles a fraction of all traffic.
+# Both off removes the middleware.
+PROFILE_SIGNED_REQUESTS = False
+PROFILE_SAMPLE_RATE = 0
+PROFILE_INTERVAL_MS = 1
+PROFILE_FORMAT = 'speedscope'
+PROFILE_DIR = BASE_DIR / 'logs' / 'profiles'
+PROFILE_TOKEN_MAX_AGE = 300
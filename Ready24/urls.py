@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
+from shop.storage import serve_media
 from shop.views import (
     IndexView,
     CategoryView,
@@ -26,12 +27,15 @@ from shop.views import (
     CreateUserView,
     ProductView,
     SearchView,
+    AutocompleteView,
     ProfileView,
     AddAddressView,
     AddToCartView,
+    AddToCartBatchView,
     CartView,
     CheckoutView,
-    PaymentView
+    PaymentView,
+    CatalogExportView,
 )
 
 urlpatterns = [
@@ -43,13 +47,16 @@ urlpatterns = [
     path('register/', CreateUserView.as_view(), name='register'),
     path('product/<slug>', ProductView.as_view(), name='product'),
     path('search/', SearchView.as_view(), name='search'),
+    path('search/autocomplete/', AutocompleteView.as_view(), name='autocomplete'),
     path('profile/<username>', ProfileView.as_view(), name='profile'),
     path('profile/addaddress/', AddAddressView.as_view(), name='add_address'),
     path('profile/addtocart/', AddToCartView.as_view(), name='add_to_cart'),
+    path('profile/addtocart/batch/', AddToCartBatchView.as_view(), name='add_to_cart_batch'),
     path('profile/cart/', CartView.as_view(), name='cart'),
     path('profile/checkout/', CheckoutView.as_view(), name='checkout'),
     path('profile/payment/', PaymentView.as_view(), name='payment'),
+    path('export/catalog/', CatalogExportView.as_view(), name='catalog_export'),
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.MEDIA_URL, view=serve_media, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""
+Benchmark of autocomplete lookups against catalogs of seeded sizes.
+
+Builds a `PrefixIndex` in memory (no database needed) from product names made the way
+`seed_catalog` makes them ("Cordless Drill 24-1234", Zipf-distributed popularity) plus
+department categories, then replays keystrokes: every prefix of a word of random product
+names, and the numeric prefixes every product shares ("2", "24", "24-1", ...). Lookups
+of common prefixes are served from the precomputed top lists, so the latency should stay
+flat as the catalog grows.
+
+Usage:
+    python benchmarks/bench_autocomplete.py [--sizes 10000 100000 500000] [--names 200]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Ready24.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from shop.autocomplete import PrefixIndex, Suggestion  # noqa: E402
+from shop.seeding import ADJECTIVES, DEPARTMENTS, NOUNS  # noqa: E402
+
+
+def make_suggestions(size, seed):
+    rnd = random.Random(seed)
+    suggestions = [
+        Suggestion(f'{rnd.choice(ADJECTIVES)} {rnd.choice(NOUNS)} {seed}-{i}', f'/p/{i}', 'product',
+                   int(1000 / (rnd.random() * 999 + 1)))
+        for i in range(size)
+    ]
+    suggestions += [
+        Suggestion(name, f'/c/{i}', 'category', size // len(DEPARTMENTS)) for i, name in enumerate(DEPARTMENTS)
+    ]
+    return suggestions
+
+
+def keystrokes(suggestions, names, seed):
+    rnd = random.Random(seed)
+    prefixes = []
+    for suggestion in rnd.sample(suggestions, names):
+        for word in suggestion.label.split():
+            prefixes += [word[:length] for length in range(1, len(word) + 1)]
+    last = suggestions[len(suggestions) - len(DEPARTMENTS) - 1].label.split()[-1]
+    prefixes += [last[:length] for length in range(1, len(last) + 1)]
+    return prefixes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 500_000])
+    parser.add_argument('--names', type=int, default=200, help='Product names typed letter by letter.')
+    parser.add_argument('--seed', type=int, default=24)
+    args = parser.parse_args()
+
+    print(f'{"products":>9} {"build":>8} {"prefixes":>9} {"lookups":>8} {"p50":>9} {"p95":>9} {"p99":>9} {"max":>9}')
+    for size in args.sizes:
+        suggestions = make_suggestions(size, args.seed)
+        start = time.perf_counter()
+        index = PrefixIndex(suggestions)
+        build = time.perf_counter() - start
+
+        samples = []
+        for prefix in keystrokes(suggestions, args.names, args.seed):
+            start = time.perf_counter()
+            index.complete(prefix)
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        p50, p95, p99 = (samples[min(int(len(samples) * q), len(samples) - 1)] for q in (0.5, 0.95, 0.99))
+        print(f'{size:>9} {build:>7.1f}s {len(index.top):>9} {len(samples):>8} '
+              f'{p50:>7.3f}ms {p95:>7.3f}ms {p99:>7.3f}ms {samples[-1]:>7.3f}ms')
+
+
+if __name__ == '__main__':
+    main()
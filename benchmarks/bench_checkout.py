@@ -0,0 +1,99 @@
+"""
+Benchmark of concurrent order commits against the same SKUs.
+
+Creates a throwaway test database, fills it with carts that all buy the same few
+products, runs `commit_order` for all of them from a thread pool and reports the
+throughput, latency percentiles and whether any stock went negative.
+
+Needs a database that supports concurrent writers: PostgreSQL, or SQLite with a file
+TEST NAME (in-memory SQLite is run single-threaded).
+
+Usage:
+    python benchmarks/bench_checkout.py [--checkouts 1000] [--threads 16] [--skus 5] [--stock 400]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Ready24.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from shop.models import Category, Product, ShoppingCart, ShoppingCartProduct  # noqa: E402
+from shop.orders import OutOfStock, commit_order  # noqa: E402
+
+
+def populate(checkouts, skus, stock):
+    category = Category.objects.create(name='Bench', description='bench')
+    products = Product.objects.bulk_create(
+        [Product(name=f'SKU {i}', slug=f'sku-{i}', stock=stock, vat='0.24', category=category) for i in range(skus)]
+    )
+    users = User.objects.bulk_create([User(username=f'bench{i}') for i in range(checkouts)])
+    carts = ShoppingCart.objects.bulk_create([ShoppingCart(user=user) for user in users])
+    ShoppingCartProduct.objects.bulk_create(
+        [ShoppingCartProduct(shopping_cart=cart, product=product) for cart in carts for product in products]
+    )
+    return products, carts
+
+
+def checkout(cart):
+    start = time.perf_counter()
+    try:
+        commit_order(cart)
+        ordered = True
+    except OutOfStock:
+        ordered = False
+    finally:
+        connection.close()
+    return ordered, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--checkouts', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--skus', type=int, default=5)
+    parser.add_argument('--stock', type=int, default=400)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        threads = args.threads
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            print('in-memory SQLite: running single-threaded')
+            threads = 1
+        products, carts = populate(args.checkouts, args.skus, args.stock)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(checkout, carts))
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(latency for _, latency in results)
+        ordered = sum(1 for ok, _ in results if ok)
+        stocks = list(Product.objects.filter(pk__in=[p.pk for p in products]).values_list('stock', flat=True))
+        print(f'{args.checkouts} checkouts x {args.skus} SKUs on {threads} threads ({connection.vendor})')
+        print(f'  throughput   {args.checkouts / elapsed:8.1f} checkouts/s')
+        print(f'  latency p50  {latencies[len(latencies) // 2] * 1000:8.2f} ms')
+        print(f'  latency p99  {latencies[int(len(latencies) * 0.99) - 1] * 1000:8.2f} ms')
+        print(f'  ordered      {ordered:8d} (expected {min(args.checkouts, args.stock)})')
+        print(f'  final stock  {stocks}')
+        if ordered != min(args.checkouts, args.stock) or min(stocks) < 0:
+            sys.exit('stock accounting is wrong')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
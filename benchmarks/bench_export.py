@@ -0,0 +1,84 @@
+"""
+Benchmark of the streaming catalog export.
+
+Creates a throwaway test database, bulk-inserts products with tools, then exports them
+for each catalog size and reports the throughput, the time to the first line and the
+peak Python memory measured with tracemalloc. The peak should not grow with the catalog.
+
+Usage:
+    python benchmarks/bench_export.py [--products 10000 100000] [--format csv] [--chunk-size 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Ready24.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from shop.exporting import export_catalog  # noqa: E402
+from shop.models import Category, Product, Tool  # noqa: E402
+
+
+def populate(count, start, category, tools, rnd):
+    products = Product.objects.bulk_create(
+        [
+            Product(name=f'Product {i}', slug=f'product-{i}', netto_price=rnd.randrange(100, 10_000),
+                    vat='0.24', category=category)
+            for i in range(start, start + count)
+        ],
+        batch_size=2000,
+    )
+    links = Product.tool.through
+    links.objects.bulk_create(
+        [links(product_id=product.pk, tool_id=tool.pk) for product in products for tool in rnd.sample(tools, 3)],
+        batch_size=5000,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=24)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        rnd = random.Random(args.seed)
+        category = Category.objects.create(name='Bench', slug='bench', description='bench')
+        tools = Tool.objects.bulk_create([Tool(name=f'Tool {i}') for i in range(200)])
+        print(f'{"products":>10} {"rows/s":>10} {"first line":>11} {"peak memory":>12}')
+        existing = 0
+        for total in sorted(args.products):
+            populate(total - existing, existing, category, tools, rnd)
+            existing = total
+            tracemalloc.start()
+            start = time.perf_counter()
+            lines = export_catalog(args.format, args.chunk_size)
+            next(lines)
+            first = time.perf_counter() - start
+            count = sum(1 for _ in lines)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            assert count == total if args.format == 'csv' else count == total - 1
+            print(f'{total:>10} {total / elapsed:>10,.0f} {first * 1000:>9.1f}ms {peak / 2 ** 20:>10.1f}MB')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
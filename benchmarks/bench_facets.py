@@ -0,0 +1,78 @@
+"""
+Benchmark of tool facet computation on a large category.
+
+Builds a `CategoryToolIndex` in memory (no database needed) with a skewed tool
+distribution and times `facet_counts` and `match` for growing tool selections.
+
+Usage:
+    python benchmarks/bench_facets.py [--products 100000] [--tools 40] [--repeat 50]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Ready24.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from shop.facets import CategoryToolIndex, bits_from_positions  # noqa: E402
+
+
+def build_index(products, tools, seed):
+    rnd = random.Random(seed)
+    # Popular tools (low IDs) are on most products, rare ones on a few.
+    weights = [1 / (rank + 1) for rank in range(tools)]
+    positions = {}
+    for bit in range(products):
+        for tool_id in set(rnd.choices(range(1, tools + 1), weights=weights, k=rnd.randint(3, 12))):
+            positions.setdefault(tool_id, []).append(bit)
+    # Same layout CategoryToolIndex.build() produces from the database.
+    index = CategoryToolIndex(category_id=1)
+    index._product_of = list(range(1, products + 1))
+    index._bit_of = {product_id: bit for bit, product_id in enumerate(index._product_of)}
+    index.all_bits = (1 << products) - 1
+    index.tool_bits = {tool_id: bits_from_positions(bits) for tool_id, bits in positions.items()}
+    return index
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=100_000)
+    parser.add_argument('--tools', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=24)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = build_index(args.products, args.tools, args.seed)
+    print(f'built index of {len(index)} products / {len(index.tool_bits)} tools '
+          f'in {time.perf_counter() - start:.2f}s')
+
+    print(f'{"selected":>8} {"matches":>8} {"facets p50":>11} {"facets p95":>11} {"ids p50":>9}')
+    for selected in range(0, 7):
+        tool_ids = list(range(1, selected + 1))
+        matches = index.match(tool_ids).bit_count()
+        facets_p50, facets_p95 = timed(lambda: index.facet_counts(tool_ids), args.repeat)
+        ids_p50, _ = timed(lambda: index.product_ids(index.match(tool_ids)), args.repeat)
+        print(f'{selected:>8} {matches:>8} {facets_p50 * 1000:>9.2f}ms {facets_p95 * 1000:>9.2f}ms '
+              f'{ids_p50 * 1000:>7.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
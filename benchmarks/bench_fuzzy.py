@@ -0,0 +1,80 @@
+"""
+Benchmark of typo lookups against growing search vocabularies.
+
+Builds a `SymmetricDeleteIndex` (no database needed) for several vocabulary sizes and
+times corrections of words with one and two typos. The lookup cost should stay flat as
+the vocabulary grows, since it only depends on the length of the query word.
+
+Usage:
+    python benchmarks/bench_fuzzy.py [--sizes 10000 50000 200000] [--queries 500]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Ready24.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from shop.fuzzy import SymmetricDeleteIndex  # noqa: E402
+
+
+def make_typo(rnd, word, typos):
+    for _ in range(typos):
+        position = rnd.randrange(len(word))
+        action = rnd.choice('dis')
+        if action == 'd' and len(word) > 5:
+            word = word[:position] + word[position + 1:]
+        elif action == 'i':
+            word = word[:position] + rnd.choice(string.ascii_lowercase) + word[position:]
+        else:
+            word = word[:position] + rnd.choice(string.ascii_lowercase) + word[position + 1:]
+    return word
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 50_000, 200_000])
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=24)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    print(f'{"vocabulary":>10} {"build":>8} {"1 typo p50":>11} {"2 typos p50":>12} {"p95":>8} {"found":>6}')
+    for size in args.sizes:
+        vocabulary = {}
+        while len(vocabulary) < size:
+            word = ''.join(rnd.choices(string.ascii_lowercase, k=rnd.randint(4, 12)))
+            vocabulary[word] = rnd.randint(1, 1000)
+        start = time.perf_counter()
+        index = SymmetricDeleteIndex(vocabulary)
+        build = time.perf_counter() - start
+
+        words = rnd.sample(list(vocabulary), args.queries)
+        results = {}
+        found = 0
+        for typos in (1, 2):
+            samples = []
+            for word in words:
+                query = make_typo(rnd, word, typos)
+                start = time.perf_counter()
+                matches = index.lookup(query)
+                samples.append(time.perf_counter() - start)
+                found += any(term == word for term, _ in matches)
+            samples.sort()
+            results[typos] = samples
+        p95 = max(results[2][int(len(results[2]) * 0.95) - 1], results[1][int(len(results[1]) * 0.95) - 1])
+        print(f'{size:>10} {build:>7.1f}s {results[1][len(words) // 2] * 1000:>9.3f}ms '
+              f'{results[2][len(words) // 2] * 1000:>10.3f}ms {p95 * 1000:>6.3f}ms '
+              f'{found / (2 * len(words)):>6.0%}')
+
+
+if __name__ == '__main__':
+    main()
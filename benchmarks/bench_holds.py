@@ -0,0 +1,59 @@
+"""
+Benchmark of the cart hold expiry wheel.
+
+Schedules holds spread over a hold window in a `TimingWheel` (no database needed), then
+advances the wheel tick by tick over the whole window and reports how many expirations
+are collected per second. Per-tick cost only depends on the entries that expire during
+that tick, not on the number of pending holds.
+
+Usage:
+    python benchmarks/bench_holds.py [--holds 100000 1000000] [--window 900]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Ready24.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from shop.holds import TimingWheel  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--holds', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--window', type=int, default=900, help='hold length in seconds')
+    parser.add_argument('--seed', type=int, default=24)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    print(f'{"holds":>10} {"schedule/s":>12} {"expire/s":>12} {"worst tick":>11}')
+    for holds in args.holds:
+        wheel = TimingWheel(tick=1, now=0)
+        due = [rnd.uniform(1, args.window) for _ in range(holds)]
+        start = time.perf_counter()
+        for key, timestamp in enumerate(due):
+            wheel.schedule(key, timestamp)
+        schedule = time.perf_counter() - start
+
+        expired = 0
+        worst = 0
+        start = time.perf_counter()
+        for now in range(1, args.window + 1):
+            tick_start = time.perf_counter()
+            expired += len(wheel.advance(now))
+            worst = max(worst, time.perf_counter() - tick_start)
+        expire = time.perf_counter() - start
+        assert expired == holds
+        print(f'{holds:>10} {holds / schedule:>12,.0f} {holds / expire:>12,.0f} {worst * 1000:>9.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark of the bulk catalog import.
+
+Creates a throwaway test database, writes a synthetic JSON Lines feed with many duplicate
+names (so slug collisions are common), a few hundred categories and a few thousand tools,
+runs the `import_catalog` command on it and reports rows per second. The per-batch search
+index update is included unless `--defer-search-index` is given.
+
+Usage:
+    python benchmarks/bench_import.py [--rows 100000] [--batch-size 5000] [--defer-search-index]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Ready24.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from shop.models import Product  # noqa: E402
+
+
+def write_feed(path, rows, seed):
+    rnd = random.Random(seed)
+    with open(path, 'w') as feed:
+        for i in range(rows):
+            feed.write(json.dumps({
+                'name': f'Product {rnd.randrange(rows // 4 or 1)}',
+                'category': f'Category {rnd.randrange(300)}',
+                'netto_price': rnd.randrange(100, 100_000),
+                'vat': rnd.choice(['0.11', '0.24']),
+                'stock': rnd.randrange(100),
+                'tools': [f'Tool {rnd.randrange(3000)}' for _ in range(rnd.randrange(4))],
+            }) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--defer-search-index', action='store_true')
+    parser.add_argument('--seed', type=int, default=24)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'feed.jsonl')
+            write_feed(path, args.rows, args.seed)
+            options = ['--batch-size', str(args.batch_size)]
+            if args.defer_search_index:
+                options.append('--defer-search-index')
+            start = time.perf_counter()
+            call_command('import_catalog', path, *options, stdout=StringIO())
+            elapsed = time.perf_counter() - start
+        imported = Product.objects.count()
+        print(f'{args.rows} rows in batches of {args.batch_size} ({connection.vendor})')
+        print(f'  elapsed      {elapsed:8.1f} s')
+        print(f'  throughput   {args.rows / elapsed:8.0f} rows/s')
+        print(f'  products     {imported:8d}')
+        if imported != args.rows:
+            sys.exit('some rows were not imported')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+Benchmark of the inverted-index product search against seeded catalogs, with a JSON baseline.
+
+For every catalog size, creates a throwaway test database, fills it with `seed_catalog`
+(search index included), then runs a deterministic set of queries of several kinds:
+
+    - word:     one word of a product name, from very common to rare;
+    - pair:     two words of the same product name;
+    - category: a category name;
+    - tool:     a tool name;
+    - typo:     a product name word with one letter changed, which takes the fuzzy fallback;
+    - miss:     a word found nowhere.
+
+Each query runs uncached through `run_search` (the index lookup, ranking and fuzzy
+fallback behind a search cache miss) followed by loading the first result page, and
+p50/p95/p99 latencies are reported per kind and over all queries, each the median over
+`--rounds` repetitions. The search subsystem targets p99 < 20 ms on a 500,000-product
+catalog (`--target-ms`); the run exits with status 1 when the overall p99 at the largest
+size misses it, or when a latency exceeds the baseline by more than `--threshold` and
+`--min-delta-ms`. `--save` writes the results as the new baseline and only reports a missed
+target. Latencies depend on the
+machine and database, so keep one baseline per machine (or CI runner).
+
+Usage:
+    python benchmarks/bench_search.py [--sizes 10000 100000] [--queries 20] [--rounds 3]
+                                      [--baseline benchmarks/baselines/search.json] [--save]
+    python benchmarks/bench_search.py --sizes 500000   # the size of the latency target
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from io import StringIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Ready24.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.cache import caches  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from bench_views import percentile  # noqa: E402
+from shop.fuzzy import fuzzy_matcher  # noqa: E402
+from shop.models import Category, Product, Tool  # noqa: E402
+from shop.search_cache import run_search  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / 'baselines' / 'search.json'
+KINDS = ('word', 'pair', 'category', 'tool', 'typo', 'miss')
+LATENCY_METRICS = ('p50_ms', 'p95_ms', 'p99_ms')
+
+
+def sample_queries(count, seed):
+    """
+    Returns `(kind, query)` pairs drawn deterministically from the seeded catalog.
+    """
+    rnd = random.Random(seed)
+    last_pk = Product.objects.order_by('-pk').values_list('pk', flat=True).first()
+    names = list(
+        Product.objects.filter(pk__in=[rnd.randint(1, last_pk) for _ in range(count * 4)]).values_list('name', flat=True)
+    )
+    words = [word for name in names for word in name.split() if len(word) > 3 and word.isalpha()]
+    pairs = [name.split()[:2] for name in names if len(name.split()) > 1]
+    categories = list(Category.objects.order_by('pk').values_list('name', flat=True))
+    tools = list(Tool.objects.order_by('pk').values_list('name', flat=True))
+    queries = []
+    for _ in range(count):
+        word = rnd.choice(words)
+        position = rnd.randrange(1, len(word))
+        queries += [
+            ('word', word),
+            ('pair', ' '.join(rnd.choice(pairs))),
+            ('category', rnd.choice(categories)),
+            ('tool', rnd.choice(tools)),
+            ('typo', word[:position] + ('x' if word[position] != 'x' else 'q') + word[position + 1:]),
+            ('miss', f'zq{rnd.randrange(10 ** 6)}x'),
+        ]
+    return queries
+
+
+def run_query(query, page_size):
+    result = run_search(query)
+    list(Product.objects.filter(pk__in=result.product_ids[:page_size]).select_related('category'))
+    return result
+
+
+def measure(queries, rounds):
+    page_size = getattr(settings, 'SEARCH_PAGE_SIZE', 24)
+    for _, query in queries:
+        run_query(query, page_size)
+    percentiles = {kind: {key: [] for key in LATENCY_METRICS} for kind in (*KINDS, 'all')}
+    matches = {}
+    for _ in range(rounds):
+        latencies = {kind: [] for kind in (*KINDS, 'all')}
+        for kind, query in queries:
+            start = time.perf_counter()
+            result = run_query(query, page_size)
+            elapsed = (time.perf_counter() - start) * 1000
+            latencies[kind].append(elapsed)
+            latencies['all'].append(elapsed)
+            matches.setdefault(kind, []).append(len(result.product_ids))
+        for kind, values in latencies.items():
+            values.sort()
+            for key, fraction in zip(LATENCY_METRICS, (0.50, 0.95, 0.99)):
+                percentiles[kind][key].append(percentile(values, fraction))
+    results = {}
+    for kind, values in percentiles.items():
+        results[kind] = {key: round(statistics.median(samples), 3) for key, samples in values.items()}
+        if kind in matches:
+            results[kind]['median_matches'] = statistics.median(matches[kind])
+    return results
+
+
+def bench_size(size, args):
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        start = time.perf_counter()
+        call_command(
+            'seed_catalog', '--products', str(size), '--categories', str(max(5, size // 2000)),
+            '--tools', str(max(20, size // 100)), '--users', '10', '--picture-pool', '0',
+            '--seed', str(args.seed), '--search-index', stdout=StringIO(),
+        )
+        print(f'seeded {size} products in {time.perf_counter() - start:.1f}s')
+        for alias in caches:
+            caches[alias].clear()
+        # Otherwise the previous size's vocabulary would serve the typos while the new one is
+        # built in the background during the measurements.
+        fuzzy_matcher.clear()
+        results = measure(sample_queries(args.queries, args.seed), args.rounds)
+        for kind, metrics in results.items():
+            columns = (*LATENCY_METRICS, 'median_matches')
+            print(f'{size:>9} {kind:<9}' + ''.join(f'{metrics.get(key, ""):>15}' for key in columns))
+        return results
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def regressions(results, baseline, threshold, min_delta_ms):
+    """
+    Lists the latencies of `results` worse than in `baseline` by more than `threshold` (a
+    fraction) and `min_delta_ms`.
+    """
+    found = []
+    for size, kinds in results.items():
+        for kind, metrics in kinds.items():
+            base = baseline.get(size, {}).get(kind)
+            if not base:
+                continue
+            for key in LATENCY_METRICS:
+                limit = max(base[key] * (1 + threshold), base[key] + min_delta_ms)
+                if metrics[key] > limit:
+                    found.append(f'{kind} @ {size} products: {key} {metrics[key]} > {base[key]} (limit {limit:g})')
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--queries', type=int, default=20, help='Queries of each kind.')
+    parser.add_argument('--rounds', type=int, default=3, help='Latencies are the median over the rounds.')
+    parser.add_argument('--seed', type=int, default=24)
+    parser.add_argument('--target-ms', type=float, default=20.0, help='p99 target at the largest size.')
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument('--threshold', type=float, default=0.4, help='Allowed slowdown, e.g. 0.4 for 40%%.')
+    parser.add_argument(
+        '--min-delta-ms', type=float, default=1.0, help='Latency growth always tolerated, in milliseconds.'
+    )
+    parser.add_argument('--save', action='store_true', help='Write the results as the new baseline.')
+    args = parser.parse_args()
+
+    setup_test_environment(debug=False)
+    print(f'{"products":>9} {"kind":<9}' + ''.join(f'{key:>15}' for key in (*LATENCY_METRICS, 'median_matches')))
+    results = {str(size): bench_size(size, args) for size in args.sizes}
+    report = {
+        'environment': {
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'machine': platform.machine(),
+            'queries': args.queries,
+            'rounds': args.rounds,
+        },
+        'results': results,
+    }
+    largest = str(max(args.sizes))
+    p99 = results[largest]['all']['p99_ms']
+    print(f'p99 over all queries at {largest} products: {p99} ms (target < {args.target_ms:g} ms)')
+    failed = p99 >= args.target_ms
+    if failed:
+        print(f'TARGET MISSED at {largest} products')
+
+    if args.save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2) + '\n')
+        print(f'Baseline written to {args.baseline}')
+        failed = False
+    elif not args.baseline.exists():
+        print(f'No baseline at {args.baseline}; run with --save to create one.')
+    else:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline['environment'] != report['environment']:
+            print(f'Warning: the baseline was recorded with {baseline["environment"]}')
+        found = regressions(results, baseline['results'], args.threshold, args.min_delta_ms)
+        for regression in found:
+            print(f'REGRESSION {regression}')
+        if not found:
+            print('No regression against the baseline.')
+        failed = failed or bool(found)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
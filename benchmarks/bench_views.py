@@ -0,0 +1,228 @@
+"""
+Benchmark of the main shop views against seeded catalogs, with JSON baselines.
+
+For every catalog size, creates a throwaway test database, fills it with `seed_catalog`,
+then requests each view through the Django test client and records:
+
+    - p50, p95 and p99 latency over `--iterations` requests, after `--warmup` ones, each
+      the median over `--rounds` repetitions to damp machine noise;
+    - the number of SQL queries of one request;
+    - the peak Python memory allocated by one request, measured with tracemalloc in a
+      separate pass so tracing does not distort the latencies.
+
+The anonymous page cache is disabled unless `--page-cache` is given, so the rendering path
+is what gets measured. Results are printed and compared with a baseline file: the run exits
+with status 1 when a latency or peak memory exceeds the baseline by more than `--threshold`
+(a fraction, latencies also by more than `--min-delta-ms`), or when a view runs more queries
+than in the baseline. Only the `--gate` metrics fail a run; p99 is recorded but not gated
+by default. `--save` writes the
+results as the new baseline instead. Latencies depend on the machine, so keep one baseline
+per machine (or CI runner) and refresh it when the hardware changes.
+
+Usage:
+    python benchmarks/bench_views.py [--sizes 1000 10000] [--iterations 50] [--rounds 3] [--threshold 0.4]
+                                     [--baseline benchmarks/baselines/views.json] [--save] [--gate ...]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Ready24.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.cache import caches  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, reset_queries  # noqa: E402
+from django.db.models import Count  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from shop.models import Category, Product, ShoppingCart  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / 'baselines' / 'views.json'
+VIEWS = ('index', 'category', 'product', 'search', 'cart', 'checkout')
+LATENCY_METRICS = ('p50_ms', 'p95_ms', 'p99_ms')
+METRICS = (*LATENCY_METRICS, 'queries', 'peak_kb')
+# The p99 of a few dozen requests is their maximum, too noisy to fail a run on by default.
+DEFAULT_GATED = ('p50_ms', 'p95_ms', 'queries', 'peak_kb')
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    rank = max(1, round(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def view_requests(anonymous, customer):
+    """
+    Returns `(view name, client, url)` for each benchmarked view. The category is the
+    largest one and the customer one whose active cart has the most lines.
+    """
+    category = Category.objects.annotate(size=Count('product')).order_by('-size').first()
+    product = Product.objects.filter(category=category, primary_picture__isnull=False).order_by('pk').first()
+    return [
+        ('index', anonymous, reverse('index')),
+        ('category', anonymous, reverse('categories', kwargs={'slug': category.slug})),
+        ('product', anonymous, reverse('product', kwargs={'slug': (product or category.product_set.first()).slug})),
+        ('search', anonymous, reverse('search') + '?searched=cordless+drill'),
+        ('cart', customer, reverse('cart')),
+        ('checkout', customer, reverse('checkout')),
+    ]
+
+
+def measure(client, url, iterations, warmup, rounds):
+    for _ in range(warmup):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {url} returned {response.status_code}')
+    percentiles = {key: [] for key in LATENCY_METRICS}
+    for _ in range(rounds):
+        gc.collect()
+        latencies = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            client.get(url)
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        for key, fraction in zip(LATENCY_METRICS, (0.50, 0.95, 0.99)):
+            percentiles[key].append(percentile(latencies, fraction))
+
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        client.get(url)
+    query_count = len(queries)
+    tracemalloc.start()
+    client.get(url)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        **{key: round(statistics.median(values), 3) for key, values in percentiles.items()},
+        'queries': query_count,
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def bench_size(size, args):
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root, PAGE_CACHE_ENABLED=args.page_cache
+        ):
+            call_command(
+                'seed_catalog', '--products', str(size), '--categories', str(max(5, size // 2000)),
+                '--tools', str(max(20, size // 100)), '--users', str(max(50, size // 100)),
+                '--seed', str(args.seed), '--search-index', stdout=StringIO(),
+            )
+            for alias in caches:
+                caches[alias].clear()
+            cart = (
+                ShoppingCart.objects.filter(active=True).annotate(lines=Count('shoppingcartproduct'))
+                .order_by('-lines', 'pk').select_related('user').first()
+            )
+            customer = Client()
+            customer.force_login(cart.user)
+            results = {}
+            for name, client, url in view_requests(Client(), customer):
+                if args.views and name not in args.views:
+                    continue
+                results[name] = measure(client, url, args.iterations, args.warmup, args.rounds)
+                print(f'{size:>9} {name:<10}' + ''.join(f'{results[name][key]:>10}' for key in results[name]))
+            return results
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def regressions(results, baseline, threshold, min_delta_ms, gated=DEFAULT_GATED):
+    """
+    Lists the `gated` metrics of `results` worse than in `baseline`: latencies and peak memory by
+    more than `threshold`, query counts by any amount. Latencies must also have grown by
+    `min_delta_ms`, so jitter on sub-millisecond pages is not reported.
+    """
+    found = []
+    for size, views in results.items():
+        for view, metrics in views.items():
+            base = baseline.get(size, {}).get(view)
+            if not base:
+                continue
+            for key, value in metrics.items():
+                if key not in gated or key not in base:
+                    continue
+                limit = base[key] if key == 'queries' else base[key] * (1 + threshold)
+                if key in LATENCY_METRICS:
+                    limit = max(limit, base[key] + min_delta_ms)
+                if value > limit:
+                    found.append(f'{view} @ {size} products: {key} {value} > {base[key]} (limit {limit:g})')
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--views', nargs='+', choices=VIEWS)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--rounds', type=int, default=3, help='Latencies are the median over the rounds.')
+    parser.add_argument('--seed', type=int, default=24)
+    parser.add_argument('--page-cache', action='store_true', help='Keep the anonymous page cache enabled.')
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument('--threshold', type=float, default=0.4, help='Allowed slowdown, e.g. 0.4 for 40%%.')
+    parser.add_argument(
+        '--min-delta-ms', type=float, default=1.0, help='Latency growth always tolerated, in milliseconds.'
+    )
+    parser.add_argument('--gate', nargs='+', choices=METRICS, default=DEFAULT_GATED, help='Metrics that fail the run.')
+    parser.add_argument('--save', action='store_true', help='Write the results as the new baseline.')
+    args = parser.parse_args()
+
+    setup_test_environment(debug=False)
+    print(f'{"products":>9} {"view":<10}' + ''.join(f'{key:>10}' for key in METRICS))
+    results = {str(size): bench_size(size, args) for size in args.sizes}
+    report = {
+        'environment': {
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'machine': platform.machine(),
+            'iterations': args.iterations,
+            'rounds': args.rounds,
+            'page_cache': args.page_cache,
+        },
+        'results': results,
+    }
+
+    if args.save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2) + '\n')
+        print(f'Baseline written to {args.baseline}')
+        return
+    if not args.baseline.exists():
+        print(f'No baseline at {args.baseline}; run with --save to create one.')
+        return
+    baseline = json.loads(args.baseline.read_text())
+    if baseline['environment'] != report['environment']:
+        print(f'Warning: the baseline was recorded with {baseline["environment"]}')
+    found = regressions(results, baseline['results'], args.threshold, args.min_delta_ms, args.gate)
+    for regression in found:
+        print(f'REGRESSION {regression}')
+    if found:
+        sys.exit(1)
+    print('No regression against the baseline.')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,54 @@
 import pytest
 
+from django.core.cache import caches
+from django.db import connection
 from django.test import Client
 from django.contrib.auth.models import User
 from shop.models import Product, Tool, Category, ShoppingCart, ShoppingCartProduct, Address
+from shop.autocomplete import autocompleter
+from shop.cache import BackgroundIndex
+from shop.facets import tool_index
+from shop.fuzzy import fuzzy_matcher
+from shop.holds import HoldManager
+from shop.images import DerivativeWorkers
+from shop.my_contex_processor import category_cache
+from shop.query_log import query_log
+from shop.search_cache import SearchStatsRecorder, search_stats
+
+
+@pytest.fixture(autouse=True)
+def clear_caches(monkeypatch):
+    # Rebuild in-memory indexes inline, a background thread would not see the test transaction.
+    monkeypatch.setattr(BackgroundIndex, 'rebuild_in_background', BackgroundIndex.rebuild)
+    # Build picture derivatives inline, for the same reason.
+    monkeypatch.setattr(DerivativeWorkers, 'submit', DerivativeWorkers.build)
+    # Tests expire holds explicitly with `HoldManager.process`.
+    monkeypatch.setattr(HoldManager, 'start', lambda self: None)
+    # Tests save search statistics explicitly with `SearchStatsRecorder.flush`.
+    monkeypatch.setattr(SearchStatsRecorder, 'start', lambda self: None)
+    for cache in caches.all():
+        cache.clear()
+    category_cache.clear()
+    tool_index.clear()
+    autocompleter.clear()
+    fuzzy_matcher.clear()
+    search_stats.clear()
+    yield
+    query_log.clear()
+
+
+@pytest.fixture(autouse=True)
+def enforce_query_budgets(settings):
+    # Going over a view's @query_budget fails the test instead of logging a warning.
+    settings.QUERY_BUDGET_MODE = 'raise'
+
+
+@pytest.fixture
+def concurrent_db(transactional_db):
+    # Shared-cache in-memory SQLite fails concurrent writers with "table is locked" instead of
+    # waiting, so threaded tests need a real database (PostgreSQL or file-backed SQLite).
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        pytest.skip("in-memory SQLite does not support concurrent writers")
 
 
 @pytest.fixture
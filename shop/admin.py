@@ -9,7 +9,9 @@ from .models import (
     PromoCodes,
     ShoppingCart,
     Address,
-    ShoppingCartProduct
+    ShoppingCartProduct,
+    Order,
+    OrderLine,
 )
 
 admin.site.register(Product)
@@ -20,4 +22,6 @@ admin.site.register(PromoCodes)
 admin.site.register(ShoppingCart)
 admin.site.register(Address)
 admin.site.register(ShoppingCartProduct)
+admin.site.register(Order)
+admin.site.register(OrderLine)
 
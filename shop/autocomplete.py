@@ -0,0 +1,141 @@
+import heapq
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.models import Count
+from django.urls import reverse
+
+from .cache import CATALOG_NAMESPACE, BackgroundIndex
+from .models import Category, Product
+from .search import fold
+
+
+class Suggestion:
+    """
+    A single autocomplete entry.
+
+    Attributes:
+        label (str): The name shown to the user.
+        url (str): The page the suggestion leads to.
+        kind (str): Either "product" or "category".
+        weight (int): The popularity used to order suggestions sharing a prefix.
+    """
+
+    __slots__ = ('label', 'url', 'kind', 'weight')
+
+    def __init__(self, label, url, kind, weight):
+        self.label = label
+        self.url = url
+        self.kind = kind
+        self.weight = weight
+
+    def as_dict(self):
+        return {'label': self.label, 'url': self.url, 'type': self.kind}
+
+
+class PrefixIndex:
+    """
+    Sorted array of folded names supporting prefix lookups with binary search.
+
+    Every word of a name starts its own key, so "Pocket knife" is found by "poc" and "kni".
+    The best suggestions are precomputed for every prefix of up to `precomputed_length`
+    characters and for every longer prefix matching more than `max_scan` keys, so a lookup
+    ranks at most `max_scan` keys however large the catalog and common the prefix.
+
+    Suggestions are kept sorted from the most to the least popular, equally popular ones by
+    label, so a suggestion's position is also its rank.
+    """
+
+    def __init__(self, suggestions, limit=10, precomputed_length=3, max_scan=1000):
+        self.limit = limit
+        self.precomputed_length = precomputed_length
+        self.max_scan = max_scan
+        self.suggestions = sorted(suggestions, key=lambda suggestion: (-suggestion.weight, suggestion.label))
+        entries = []
+        for position, suggestion in enumerate(self.suggestions):
+            words = fold(suggestion.label).split()
+            for start in range(len(words)):
+                entries.append((' '.join(words[start:]), position))
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.positions = [position for _, position in entries]
+        self.top = {}
+        self._precompute()
+
+    def __len__(self):
+        return len(self.suggestions)
+
+    def _best(self, positions):
+        return heapq.nsmallest(self.limit, set(positions))
+
+    def _precompute(self):
+        # Walks the ranges of keys sharing a prefix, one character deeper at a time, only
+        # going down the ranges that still have prefixes to precompute.
+        ranges = [(0, len(self.keys), 0)]
+        while ranges:
+            start, end, depth = ranges.pop()
+            index = start
+            while index < end:
+                key = self.keys[index]
+                if len(key) <= depth:
+                    index += 1
+                    continue
+                prefix = key[:depth + 1]
+                stop = bisect_left(self.keys, prefix + '\uffff', index, end)
+                large = stop - index > self.max_scan
+                if large or depth < self.precomputed_length:
+                    self.top[prefix] = self._best(self.positions[index:stop])
+                if large or depth + 1 < self.precomputed_length:
+                    ranges.append((index, stop, depth + 1))
+                index = stop
+
+    def complete(self, prefix, limit=None):
+        """
+        Returns the most popular suggestions whose name has a word starting with `prefix`.
+        """
+        limit = min(limit or self.limit, self.limit)
+        prefix = ' '.join(fold(prefix).split())
+        if not prefix:
+            return []
+        positions = self.top.get(prefix)
+        if positions is None:
+            start = bisect_left(self.keys, prefix)
+            end = bisect_left(self.keys, prefix + '\uffff', start)
+            positions = self._best(self.positions[start:end])
+        return [self.suggestions[position] for position in positions[:limit]]
+
+
+def load_suggestions():
+    """
+    Reads product and category names with their popularity in two queries.
+
+    Products are weighted by how many carts they were added to, categories by their
+    number of products.
+    """
+    suggestions = []
+    products = Product.objects.annotate(popularity=Count('shoppingcartproduct')).values_list(
+        'name', 'slug', 'popularity'
+    )
+    for name, slug, popularity in products.iterator(chunk_size=5000):
+        suggestions.append(Suggestion(name, reverse('product', kwargs={'slug': slug}), 'product', popularity))
+    categories = Category.objects.annotate(products=Count('product')).values_list('name', 'slug', 'products')
+    for name, slug, products in categories:
+        suggestions.append(Suggestion(name, reverse('categories', kwargs={'slug': slug}), 'category', products))
+    return suggestions
+
+
+class Autocompleter(BackgroundIndex):
+    """
+    Per-worker holder of the `PrefixIndex`, rebuilt in the background when the catalog changes.
+
+    Lookups never hit the database.
+    """
+
+    def __init__(self, max_age=3600):
+        super().__init__(CATALOG_NAMESPACE, lambda: PrefixIndex(load_suggestions()), max_age)
+
+    def complete(self, prefix, limit=None):
+        return self.get().complete(prefix, limit)
+
+
+autocompleter = Autocompleter(max_age=getattr(settings, 'AUTOCOMPLETE_MAX_AGE', 3600))
@@ -0,0 +1,190 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import connection
+
+VERSION_KEY_PREFIX = 'shop:version:'
+
+# Bumped on every change to products, categories or tools.
+CATALOG_NAMESPACE = 'catalog'
+
+
+def _initial_version():
+    # Start from a timestamp instead of 1 so an evicted counter never goes back
+    # to a number some worker has already seen.
+    return time.time_ns() // 1000
+
+
+def get_version(namespace):
+    """
+    Returns the shared version number of the given namespace.
+
+    The version lives in the Django cache so every worker sees the same number.
+    """
+    key = VERSION_KEY_PREFIX + namespace
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(namespaces):
+    """
+    Returns the shared version numbers of several namespaces with one cache round trip
+    (two when some counters have to be created).
+    """
+    keys = {VERSION_KEY_PREFIX + namespace: namespace for namespace in namespaces}
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, _initial_version(), timeout=None)
+        found.update(cache.get_many(missing))
+    return {keys[key]: version for key, version in found.items()}
+
+
+def bump_version(namespace):
+    """
+    Increments the shared version number of the given namespace, invalidating every
+    worker's local copy of the data stored under it.
+    """
+    key = VERSION_KEY_PREFIX + namespace
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), timeout=None)
+        return cache.get(key)
+
+
+class VersionedCache:
+    """
+    Bounded in-process LRU cache tied to a shared version number.
+
+    Every worker keeps its own copy of the values. On each lookup the shared version
+    of the namespace is compared with the version the local copy was built for, and
+    the local copy is dropped when they differ.
+
+    Attributes:
+        namespace (str): The name of the shared version counter.
+        maxsize (int): The maximum number of entries kept in memory.
+        hits (int): The number of lookups served from memory.
+        misses (int): The number of lookups that had to call the loader.
+    """
+
+    def __init__(self, namespace, maxsize=128):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_set(self, key, loader):
+        """
+        Returns the value stored under `key`, calling `loader()` to build it on a miss.
+        """
+        version = get_version(self.namespace)
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = loader()
+
+        with self._lock:
+            if self._version == version:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self):
+        """
+        Bumps the shared version so every worker reloads on its next lookup.
+        """
+        return bump_version(self.namespace)
+
+    def clear(self):
+        """
+        Drops the local copy and resets the counters of this worker.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {
+            'namespace': self.namespace,
+            'version': self._version,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+class BackgroundIndex:
+    """
+    Per-worker holder of an in-memory structure rebuilt from the database.
+
+    When the shared version of `namespace` changes, or the structure is older than
+    `max_age` seconds, `build()` runs in a background thread while the old structure keeps
+    serving. Only the very first lookup of a worker builds it synchronously.
+    """
+
+    def __init__(self, namespace, build, max_age=3600):
+        self.namespace = namespace
+        self.build = build
+        self.max_age = max_age
+        self._value = None
+        self._version = None
+        self._built_at = 0
+        self._rebuilding = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        version = get_version(self.namespace)
+        if self._value is None:
+            self.rebuild(version)
+        elif version != self._version or time.monotonic() - self._built_at > self.max_age:
+            self.rebuild_in_background(version)
+        return self._value
+
+    def rebuild(self, version):
+        value = self.build()
+        with self._lock:
+            self._value = value
+            self._version = version
+            self._built_at = time.monotonic()
+
+    def rebuild_in_background(self, version):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def run():
+            try:
+                self.rebuild(version)
+            finally:
+                self._rebuilding = False
+                connection.close()
+
+        threading.Thread(target=run, name=f'{self.namespace}-rebuild', daemon=True).start()
+
+    def clear(self):
+        with self._lock:
+            self._value = None
+            self._version = None
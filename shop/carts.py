@@ -0,0 +1,87 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+
+from .holds import place_holds
+from .models import Product, ShoppingCart, ShoppingCartProduct
+
+
+class UnknownProducts(Exception):
+    """
+    Raised when some of the products added to a cart do not exist.
+
+    Attributes:
+        product_ids (list): The IDs that were not found.
+    """
+
+    def __init__(self, product_ids):
+        self.product_ids = sorted(product_ids)
+        super().__init__(f"Products do not exist: {self.product_ids}")
+
+
+def get_active_cart(user):
+    """
+    Returns the active cart of a user, creating it if needed.
+
+    Relies on the `unique_active_cart_per_user` constraint: when two requests race to create
+    the cart, the loser gets an IntegrityError and reads the winner's cart instead.
+    """
+    cart = ShoppingCart.objects.filter(user=user, active=True).first()
+    if cart is not None:
+        return cart
+    try:
+        with transaction.atomic():
+            return ShoppingCart.objects.create(user=user, active=True)
+    except IntegrityError:
+        return ShoppingCart.objects.get(user=user, active=True)
+
+
+def add_to_cart(cart, items):
+    """
+    Adds products to a cart atomically.
+
+    Missing lines are inserted with quantity 0 while ignoring conflicts on the
+    `unique_cart_product` constraint, then every quantity is incremented by a single
+    `UPDATE ... SET quantity = quantity + CASE product_id ... END`. Concurrent calls
+    therefore never lose increments, whatever the number of products.
+
+    When `CART_HOLD_MINUTES` is set, the added quantities are also held for that long in
+    the same transaction (see `holds.place_holds`).
+
+    Parameters:
+        cart (ShoppingCart): The cart to add to.
+        items (iterable): `(product_id, quantity)` pairs. Repeated products are summed.
+
+    Raises:
+        UnknownProducts: If some product IDs do not exist. Nothing is added in that case.
+        ValueError: If a quantity is not a positive integer.
+    """
+    quantities = Counter()
+    for product_id, quantity in items:
+        if quantity < 1:
+            raise ValueError(f"Quantity must be positive, got {quantity} for product {product_id}")
+        quantities[int(product_id)] += quantity
+    if not quantities:
+        return
+
+    existing = set(Product.objects.filter(pk__in=quantities).values_list('pk', flat=True))
+    missing = set(quantities) - existing
+    if missing:
+        raise UnknownProducts(missing)
+
+    with transaction.atomic():
+        ShoppingCartProduct.objects.bulk_create(
+            [
+                ShoppingCartProduct(shopping_cart=cart, product_id=product_id, quantity=0)
+                for product_id in sorted(quantities)
+            ],
+            ignore_conflicts=True,
+        )
+        ShoppingCartProduct.objects.filter(shopping_cart=cart, product_id__in=quantities).update(
+            quantity=F('quantity') + Case(
+                *[When(product_id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+                default=Value(0),
+            )
+        )
+        place_holds(cart, quantities)
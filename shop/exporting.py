@@ -0,0 +1,126 @@
+import csv
+import json
+from collections import defaultdict
+from itertools import islice
+
+from .models import Picture, Product
+from .storage import get_picture_storage
+
+# The columns understood by `import_catalog`, followed by read-only ones.
+EXPORT_FIELDS = (
+    'name', 'category', 'slug', 'netto_price', 'vat', 'stock', 'height', 'length', 'width', 'weight', 'tools',
+    'id', 'gross_price', 'pictures',
+)
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+}
+_PRODUCT_VALUES = (
+    'pk', 'name', 'category__name', 'slug', 'netto_price', 'vat', 'gross_price_cents',
+    'stock', 'height', 'length', 'width', 'weight',
+)
+
+
+def iter_catalog(chunk_size=2000):
+    """
+    Yields every product as a plain dict, in primary key order, with constant memory.
+
+    Products are read as tuples through `.iterator()`, which uses a server-side cursor on
+    databases that have them, so rows arrive while the query is still running. The tools
+    and pictures of every chunk of `chunk_size` products are then loaded with one query
+    each, instead of one per product or a prefetch of the whole catalog.
+    """
+    rows = Product.objects.order_by('pk').values_list(*_PRODUCT_VALUES).iterator(chunk_size=chunk_size)
+    storage = get_picture_storage()
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        product_ids = [row[0] for row in chunk]
+        tools = defaultdict(list)
+        links = Product.tool.through.objects.filter(product_id__in=product_ids)
+        for product_id, name in links.order_by('tool__name').values_list('product_id', 'tool__name'):
+            tools[product_id].append(name)
+        pictures = defaultdict(list)
+        for product_id, name in Picture.objects.filter(product_id__in=product_ids).order_by('pk').values_list(
+            'product_id', 'image'
+        ):
+            pictures[product_id].append(storage.url(name))
+        for pk, name, category, slug, netto, vat, gross_cents, stock, height, length, width, weight in chunk:
+            yield {
+                'name': name,
+                'category': category,
+                'slug': slug,
+                'netto_price': netto,
+                'vat': vat,
+                'stock': stock,
+                'height': height,
+                'length': length,
+                'width': width,
+                'weight': weight,
+                'tools': tools[pk],
+                'id': pk,
+                'gross_price': f'{gross_cents // 100}.{gross_cents % 100:02d}',
+                'pictures': pictures[pk],
+            }
+
+
+class _Echo:
+    """
+    File-like object handing back what `csv.writer` writes, so each row becomes a string.
+    """
+
+    def write(self, value):
+        return value
+
+
+def header_lines(export_format):
+    """
+    Returns the number of lines preceding the products in an export of the given format.
+    """
+    return 1 if export_format == 'csv' else 0
+
+
+def csv_lines(records):
+    """
+    Formats records as CSV lines, the list columns joined with "|" as `import_catalog` expects.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for record in records:
+        yield writer.writerow([
+            '|'.join(value) if isinstance(value, list) else value
+            for value in (record[field] for field in EXPORT_FIELDS)
+        ])
+
+
+def jsonl_lines(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def join_lines(lines, count, header_lines=0):
+    """
+    Joins every `count` lines into one string, so a response streaming an export with
+    `count` as chunk size writes one piece per chunk of products. The first piece also
+    carries the `header_lines` leading lines, which keeps the pieces aligned with the chunks.
+    """
+    size = count + header_lines
+    while piece := ''.join(islice(lines, size)):
+        yield piece
+        size = count
+
+
+def export_catalog(export_format, chunk_size=2000, url_prefix=''):
+    """
+    Returns a generator of the lines of a catalog export, in `csv` or `jsonl` format.
+
+    Parameters:
+        url_prefix (str): Prepended to picture URLs, such as the site's scheme and host.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format!r}")
+    records = iter_catalog(chunk_size)
+    if url_prefix:
+        records = (dict(record, pictures=[url_prefix + url for url in record['pictures']]) for record in records)
+    return csv_lines(records) if export_format == 'csv' else jsonl_lines(records)
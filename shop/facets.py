@@ -0,0 +1,234 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+from .cache import bump_version, get_version
+from .models import Product
+
+
+def iter_bits(bits):
+    """
+    Yields the positions of the set bits of `bits` in ascending order.
+    """
+    binary = format(bits, 'b')[::-1]
+    position = binary.find('1')
+    while position != -1:
+        yield position
+        position = binary.find('1', position + 1)
+
+
+def bits_from_positions(positions):
+    """
+    Builds a bitset from bit positions in linear time, instead of OR-ing one
+    growing integer per position.
+    """
+    positions = list(positions)
+    if not positions:
+        return 0
+    buffer = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+class CategoryToolIndex:
+    """
+    Inverted index from tool to the products of one category that have it.
+
+    Every product of the category gets a bit position, and each tool keeps a Python
+    integer used as a bitset of the products linked to it. Filtering by several
+    tools is then a chain of `&` operations on those integers.
+
+    Attributes:
+        category_id (int): The category the index was built for.
+        version (int): The shared version the index is up to date with.
+        all_bits (int): Bitset of every product currently in the category.
+        tool_bits (dict): Maps a tool ID to the bitset of products having that tool.
+    """
+
+    def __init__(self, category_id, version=None):
+        self.category_id = category_id
+        self.version = version
+        self.all_bits = 0
+        self.tool_bits = {}
+        self._bit_of = {}
+        self._product_of = []
+
+    @classmethod
+    def build(cls, category_id, version=None):
+        """
+        Builds the index of a category with two queries.
+        """
+        index = cls(category_id, version)
+        product_ids = Product.objects.filter(category_id=category_id).order_by('pk').values_list('pk', flat=True)
+        index._product_of = list(product_ids.iterator(chunk_size=5000))
+        index._bit_of = {product_id: bit for bit, product_id in enumerate(index._product_of)}
+        index.all_bits = (1 << len(index._product_of)) - 1
+
+        positions = {}
+        links = Product.tool.through.objects.filter(product__category_id=category_id).values_list('product_id', 'tool_id')
+        for product_id, tool_id in links.iterator(chunk_size=5000):
+            bit = index._bit_of.get(product_id)
+            if bit is not None:
+                positions.setdefault(tool_id, []).append(bit)
+        index.tool_bits = {tool_id: bits_from_positions(bits) for tool_id, bits in positions.items()}
+        return index
+
+    def __len__(self):
+        return len(self._bit_of)
+
+    def _assign_bit(self, product_id):
+        bit = self._bit_of.get(product_id)
+        if bit is None:
+            bit = len(self._product_of)
+            self._bit_of[product_id] = bit
+            self._product_of.append(product_id)
+            self.all_bits |= 1 << bit
+        return bit
+
+    def add_product(self, product_id, tool_ids=()):
+        self._assign_bit(product_id)
+        self.add_tools(product_id, tool_ids)
+
+    def remove_product(self, product_id):
+        bit = self._bit_of.pop(product_id, None)
+        if bit is None:
+            return
+        mask = ~(1 << bit)
+        self._product_of[bit] = None
+        self.all_bits &= mask
+        for tool_id in list(self.tool_bits):
+            self.tool_bits[tool_id] &= mask
+            if not self.tool_bits[tool_id]:
+                del self.tool_bits[tool_id]
+
+    def add_tools(self, product_id, tool_ids):
+        bit = self._assign_bit(product_id)
+        for tool_id in tool_ids:
+            self.tool_bits[tool_id] = self.tool_bits.get(tool_id, 0) | (1 << bit)
+
+    def remove_tools(self, product_id, tool_ids):
+        bit = self._bit_of.get(product_id)
+        if bit is None:
+            return
+        mask = ~(1 << bit)
+        for tool_id in tool_ids:
+            if tool_id in self.tool_bits:
+                self.tool_bits[tool_id] &= mask
+                if not self.tool_bits[tool_id]:
+                    del self.tool_bits[tool_id]
+
+    def clear_tools(self, product_id):
+        self.remove_tools(product_id, list(self.tool_bits))
+
+    def bits_of(self, product_ids):
+        """
+        Returns the bitset of the given products, ignoring those not in the category.
+        """
+        return bits_from_positions([self._bit_of[pk] for pk in product_ids if pk in self._bit_of])
+
+    def match(self, tool_ids, within=None):
+        """
+        Returns the bitset of products that have every tool in `tool_ids`, optionally
+        restricted to the `within` bitset.
+        """
+        bits = self.all_bits if within is None else self.all_bits & within
+        for tool_id in tool_ids:
+            bits &= self.tool_bits.get(tool_id, 0)
+            if not bits:
+                break
+        return bits
+
+    def facet_counts(self, tool_ids, within=None):
+        """
+        Returns, for every tool of the category, how many products would remain if that
+        tool were added to the `tool_ids` selection, counting only products in `within`
+        when given.
+        """
+        bits = self.match(tool_ids, within)
+        return {tool_id: (bits & tool_bits).bit_count() for tool_id, tool_bits in self.tool_bits.items()}
+
+    def product_ids(self, bits):
+        """
+        Translates a bitset returned by `match` back to a list of product IDs.
+        """
+        return [self._product_of[bit] for bit in iter_bits(bits)]
+
+
+class ToolIndexRegistry:
+    """
+    Per-worker registry of `CategoryToolIndex` objects, kept coherent across workers
+    through a shared version number per category.
+
+    Committed changes made in this worker are applied to the local index in place. Other
+    workers see the bumped version and rebuild the index of that category on next use.
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def namespace(category_id):
+        return f'tool_index:{category_id}'
+
+    def get(self, category_id):
+        version = get_version(self.namespace(category_id))
+        with self._lock:
+            index = self._indexes.get(category_id)
+            if index is not None and index.version == version:
+                self._indexes.move_to_end(category_id)
+                return index
+        index = CategoryToolIndex.build(category_id, version)
+        with self._lock:
+            self._indexes[category_id] = index
+            self._indexes.move_to_end(category_id)
+            while len(self._indexes) > self.maxsize:
+                self._indexes.popitem(last=False)
+        return index
+
+    def update(self, category_id, change):
+        """
+        Applies `change(index)` to the local index of a category and bumps its version,
+        once the current transaction commits. A rolled back change is never applied, and
+        other workers only rebuild from rows they can see.
+
+        The local index is only kept when no other worker bumped the version in the
+        meantime, otherwise it is dropped and rebuilt on next use.
+        """
+        transaction.on_commit(lambda: self._apply(category_id, change))
+
+    def _apply(self, category_id, change):
+        namespace = self.namespace(category_id)
+        with self._lock:
+            index = self._indexes.get(category_id)
+            before = get_version(namespace)
+            after = bump_version(namespace)
+            if index is None:
+                return
+            if index.version == before and after == before + 1:
+                change(index)
+                index.version = after
+            else:
+                del self._indexes[category_id]
+
+    def invalidate(self, category_id):
+        """
+        Drops the index of a category in every worker once the current transaction commits.
+        """
+        transaction.on_commit(lambda: self._drop(category_id))
+
+    def _drop(self, category_id):
+        bump_version(self.namespace(category_id))
+        with self._lock:
+            self._indexes.pop(category_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+
+tool_index = ToolIndexRegistry(maxsize=getattr(settings, 'TOOL_INDEX_CACHE_SIZE', 64))
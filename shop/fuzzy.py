@@ -0,0 +1,140 @@
+from itertools import combinations
+
+from django.conf import settings
+from django.db.models import Count
+
+from .cache import CATALOG_NAMESPACE, BackgroundIndex
+from .models import SearchIndexEntry
+
+
+def deletes(word, max_distance):
+    """
+    Returns every string obtained by removing up to `max_distance` characters from `word`.
+    """
+    variants = {word}
+    for distance in range(1, min(max_distance, len(word)) + 1):
+        for positions in combinations(range(len(word)), distance):
+            variants.add(''.join(char for i, char in enumerate(word) if i not in positions))
+    return variants
+
+
+def edit_distance(a, b, limit):
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent transpositions).
+
+    Returns `limit + 1` as soon as the distance is known to exceed `limit`.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class SymmetricDeleteIndex:
+    """
+    Typo lookup over the search vocabulary using the symmetric delete algorithm.
+
+    Every term is stored under all variants obtained by deleting up to `max_distance`
+    characters from its first `prefix_length` characters. A query generates the same
+    variants, so candidates are found with a few dictionary lookups whose number does not
+    depend on the vocabulary size. Candidates are then verified with a real edit distance.
+
+    Attributes:
+        frequencies (dict): Maps each vocabulary term to the number of products containing it.
+        max_distance (int): The largest edit distance that is corrected.
+        prefix_length (int): How many leading characters are used to build the variants.
+    """
+
+    def __init__(self, frequencies, max_distance=2, prefix_length=7):
+        self.frequencies = frequencies
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.variants = {}
+        for term in frequencies:
+            for variant in deletes(term[:prefix_length], max_distance):
+                self.variants.setdefault(variant, []).append(term)
+
+    def __len__(self):
+        return len(self.frequencies)
+
+    def allowed_distance(self, word):
+        # One typo in a four letter word is already a quarter of it.
+        return 1 if len(word) <= 4 else self.max_distance
+
+    def lookup(self, word):
+        """
+        Returns vocabulary terms within the allowed distance of `word`, as `(term, distance)`
+        pairs, closest and most frequent first.
+        """
+        limit = self.allowed_distance(word)
+        candidates = set()
+        for variant in deletes(word[:self.prefix_length], limit):
+            candidates.update(self.variants.get(variant, ()))
+        matches = []
+        for term in candidates:
+            distance = edit_distance(word, term, limit)
+            if distance <= limit:
+                matches.append((term, distance))
+        matches.sort(key=lambda match: (match[1], -self.frequencies[match[0]], match[0]))
+        return matches
+
+    def correct(self, terms):
+        """
+        Replaces terms missing from the vocabulary with their best match.
+
+        Returns None when nothing could be corrected.
+        """
+        corrected = []
+        changed = False
+        for term in terms:
+            if term not in self.frequencies:
+                matches = self.lookup(term)
+                if matches:
+                    term = matches[0][0]
+                    changed = True
+            corrected.append(term)
+        return corrected if changed else None
+
+
+def load_vocabulary():
+    """
+    Reads every search term with its document frequency in one grouped query.
+    """
+    terms = SearchIndexEntry.objects.values('term').annotate(documents=Count('product')).values_list(
+        'term', 'documents'
+    )
+    return dict(terms.iterator(chunk_size=5000))
+
+
+class FuzzyMatcher(BackgroundIndex):
+    """
+    Per-worker holder of the `SymmetricDeleteIndex`, rebuilt in the background when the
+    catalog changes.
+    """
+
+    def __init__(self, max_distance=2, max_age=3600):
+        super().__init__(
+            CATALOG_NAMESPACE,
+            lambda: SymmetricDeleteIndex(load_vocabulary(), max_distance=max_distance),
+            max_age,
+        )
+
+    def correct(self, terms):
+        return self.get().correct(terms)
+
+
+fuzzy_matcher = FuzzyMatcher(
+    max_distance=getattr(settings, 'SEARCH_FUZZY_MAX_DISTANCE', 2),
+    max_age=getattr(settings, 'SEARCH_FUZZY_MAX_AGE', 3600),
+)
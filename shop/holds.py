@@ -0,0 +1,261 @@
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .models import Product, ShoppingCartProduct
+
+logger = logging.getLogger(__name__)
+
+
+class TimingWheel:
+    """
+    Hashed timing wheel of hold expirations.
+
+    Time is cut into ticks of `tick` seconds and the wheel has `slots` buckets; an entry due
+    at tick T goes to bucket `T % slots` together with T, so entries more than one turn
+    away stay in their bucket until their turn comes. Scheduling is O(1) and advancing
+    costs one bucket per elapsed tick, whatever the number of pending entries.
+
+    Rescheduling a key simply adds a new entry; the entry whose due time no longer matches
+    `self._due[key]` is skipped when its bucket comes up.
+    """
+
+    def __init__(self, tick=1.0, slots=4096, now=None):
+        self.tick = tick
+        self.slots = slots
+        self._buckets = [[] for _ in range(slots)]
+        self._due = {}
+        self._current = self._tick_of(time.time() if now is None else now)
+
+    def __len__(self):
+        return len(self._due)
+
+    def _tick_of(self, timestamp):
+        return math.floor(timestamp / self.tick)
+
+    def schedule(self, key, timestamp):
+        due = max(math.ceil(timestamp / self.tick), self._current + 1)
+        self._due[key] = due
+        self._buckets[due % self.slots].append((due, key))
+
+    def cancel(self, key):
+        self._due.pop(key, None)
+
+    def advance(self, now):
+        """
+        Moves the wheel to `now` and returns the keys that became due.
+        """
+        target = self._tick_of(now)
+        expired = []
+        # A long pause only needs one full turn of the wheel.
+        ticks = range(self._current + 1, target + 1)
+        if len(ticks) > self.slots:
+            ticks = range(target - self.slots + 1, target + 1)
+        for current in ticks:
+            bucket = self._buckets[current % self.slots]
+            if not bucket:
+                continue
+            pending = []
+            for due, key in bucket:
+                if self._due.get(key) != due:
+                    continue
+                if due <= target:
+                    expired.append(key)
+                    del self._due[key]
+                else:
+                    pending.append((due, key))
+            self._buckets[current % self.slots] = pending
+        self._current = max(self._current, target)
+        return expired
+
+
+def hold_duration():
+    return timedelta(minutes=getattr(settings, 'CART_HOLD_MINUTES', 0))
+
+
+def place_holds(cart, quantities):
+    """
+    Holds stock for products just added to a cart.
+
+    For every product, `reserved` is incremented only if enough unreserved stock is left
+    (`stock >= reserved + n`); products without enough stock are added to the cart without
+    a hold. The expiry of every held line is reset and registered in the hold manager once
+    the transaction commits.
+
+    Parameters:
+        cart (ShoppingCart): The cart the products were added to.
+        quantities (dict): Maps product IDs to the quantity just added.
+
+    Returns:
+        list: The IDs of the products that could be held.
+    """
+    duration = hold_duration()
+    if not duration:
+        return []
+    held = []
+    for product_id in sorted(quantities):
+        quantity = quantities[product_id]
+        reserved = Product.objects.filter(pk=product_id, stock__gte=F('reserved') + quantity).update(
+            reserved=F('reserved') + quantity
+        )
+        if reserved:
+            held.append(product_id)
+    if not held:
+        return held
+    expires_at = timezone.now() + duration
+    lines = ShoppingCartProduct.objects.filter(shopping_cart=cart, product_id__in=held)
+    lines.update(
+        held_quantity=F('held_quantity') + Case(
+            *[When(product_id=product_id, then=Value(quantities[product_id])) for product_id in held],
+            default=Value(0),
+        ),
+        hold_expires_at=expires_at,
+    )
+    line_ids = list(lines.values_list('pk', flat=True))
+    transaction.on_commit(lambda: hold_manager.schedule_many(line_ids, expires_at))
+    return held
+
+
+def release_holds(line_ids, now=None):
+    """
+    Releases the holds of the given lines that are expired at `now`.
+
+    Lines whose hold was extended or already released in the meantime are skipped. Runs
+    three queries per batch: lock and read the lines, give the stock back with one
+    `UPDATE ... CASE` over all products, clear the lines.
+
+    Returns:
+        int: The number of lines released.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        lines = list(
+            ShoppingCartProduct.objects.select_for_update()
+            .filter(pk__in=line_ids, hold_expires_at__lte=now, held_quantity__gt=0)
+            .order_by('product_id')
+            .values_list('pk', 'product_id', 'held_quantity')
+        )
+        if not lines:
+            return 0
+        released = {}
+        for _, product_id, held in lines:
+            released[product_id] = released.get(product_id, 0) + held
+        Product.objects.filter(pk__in=released).update(
+            reserved=F('reserved') - Case(
+                *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in released.items()],
+                default=Value(0),
+            )
+        )
+        ShoppingCartProduct.objects.filter(pk__in=[pk for pk, _, _ in lines]).update(
+            held_quantity=0, hold_expires_at=None
+        )
+    return len(lines)
+
+
+def release_deleted_hold(line_id):
+    """
+    Gives back the stock held by a cart line about to be deleted, such as by the deletion of
+    its cart or user or from the admin. `HoldManager.recover` only sees the lines left in
+    the database, so the reservation of a deleted line would otherwise never expire.
+
+    Must run in the transaction deleting the line, which locks it against `release_holds`.
+    """
+    held = (
+        ShoppingCartProduct.objects.select_for_update()
+        .filter(pk=line_id, held_quantity__gt=0, hold_expires_at__isnull=False)
+        .values_list('product_id', 'held_quantity')
+        .first()
+    )
+    if held is None:
+        return
+    product_id, quantity = held
+    Product.objects.filter(pk=product_id).update(reserved=F('reserved') - quantity)
+    transaction.on_commit(lambda: hold_manager.cancel(line_id))
+
+
+class HoldManager:
+    """
+    Expires cart holds from a background thread, so request threads never wait for it.
+
+    Expiry times are kept in a `TimingWheel`; every tick the thread collects the due lines
+    and releases them in batches of `batch_size`. On start, pending holds are reloaded from
+    the indexed `hold_expires_at` column, so a restart does not leak reserved stock. The
+    first request of every process starts the manager (see `signals.start_hold_manager`).
+    """
+
+    def __init__(self, tick=1.0, batch_size=1000):
+        self.tick = tick
+        self.batch_size = batch_size
+        self.wheel = TimingWheel(tick=tick)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def schedule_many(self, line_ids, expires_at):
+        self.start()
+        timestamp = expires_at.timestamp()
+        with self._lock:
+            for line_id in line_ids:
+                self.wheel.schedule(line_id, timestamp)
+
+    def cancel(self, line_id):
+        with self._lock:
+            self.wheel.cancel(line_id)
+
+    def recover(self):
+        """
+        Schedules every pending hold found in the database.
+        """
+        pending = (
+            ShoppingCartProduct.objects.filter(hold_expires_at__isnull=False).values_list('pk', 'hold_expires_at')
+        )
+        with self._lock:
+            for line_id, expires_at in pending.iterator(chunk_size=5000):
+                self.wheel.schedule(line_id, expires_at.timestamp())
+
+    def process(self, now=None):
+        """
+        Advances the wheel and releases every hold that became due.
+
+        Returns:
+            int: The number of lines released.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            due = self.wheel.advance(now)
+        released = 0
+        moment = datetime.fromtimestamp(now, tz=dt_timezone.utc)
+        for start in range(0, len(due), self.batch_size):
+            released += release_holds(due[start:start + self.batch_size], moment)
+        return released
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='cart-holds', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self.recover()
+        except Exception:
+            logger.exception("Could not reload pending cart holds")
+        while True:
+            time.sleep(self.tick)
+            try:
+                close_old_connections()
+                self.process()
+            except Exception:
+                logger.exception("Could not release expired cart holds")
+
+
+hold_manager = HoldManager()
@@ -0,0 +1,238 @@
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps, features
+
+from .models import Picture, acquire_blobs, derivative_names, release_blobs
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_DIRECTORY = 'images/derivatives'
+
+# (key, MIME type, Pillow format, Pillow feature), best compression first. JPEG is the
+# fallback every browser understands.
+FORMATS = [
+    ('avif', 'image/avif', 'AVIF', 'avif'),
+    ('webp', 'image/webp', 'WEBP', 'webp'),
+    ('jpeg', 'image/jpeg', 'JPEG', None),
+]
+FALLBACK_FORMAT = 'jpeg'
+ORIENTATION_TAG = 0x0112
+
+
+def available_formats():
+    """
+    Returns the keys of the derivative formats this Pillow build can encode.
+    """
+    return [key for key, _, _, feature in FORMATS if feature is None or features.check(feature)]
+
+
+def mime_type(key):
+    return next(mime for format_key, mime, _, _ in FORMATS if format_key == key)
+
+
+def derivative_widths(original_width):
+    """
+    Returns the configured widths not larger than the original, or the original width when
+    the image is smaller than all of them. Images are never upscaled.
+    """
+    widths = [width for width in getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', (320, 640, 1280)) if width <= original_width]
+    return sorted(widths) or [original_width]
+
+
+def encode(image, key):
+    """
+    Encodes a resized image in one format and returns the bytes.
+    """
+    pillow_format = next(pillow for format_key, _, pillow, _ in FORMATS if format_key == key)
+    if key == FALLBACK_FORMAT and image.mode not in ('RGB', 'L'):
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+        image = background
+    output = BytesIO()
+    options = {'quality': getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 80)}
+    if key == FALLBACK_FORMAT:
+        options.update(optimize=True, progressive=True)
+    image.save(output, pillow_format, **options)
+    return output.getvalue()
+
+
+def picture_storage():
+    """
+    Returns the storage of `Picture.image`, where the derivatives are stored next to the originals.
+    """
+    return Picture._meta.get_field('image').storage
+
+
+def derivative_name(data, key):
+    """
+    Names a derivative after its content, the way `ContentHashStorage` names uploads, so
+    identical outputs share one file and a URL never changes meaning, which lets it be
+    cached forever.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    return f'{DERIVATIVE_DIRECTORY}/{digest[:2]}/{digest}.{key}'
+
+
+def build_derivatives(name, formats=None):
+    """
+    Writes every size and format of a stored image and returns their description.
+
+    Touches storage only, never the database, so it can run in worker processes.
+
+    Parameters:
+        name (str): The storage name of the original image.
+        formats (list, optional): The format keys to produce, defaults to `available_formats()`.
+
+    Returns:
+        dict: Maps each format key to a list of `[width, storage name]` pairs, smallest first.
+    """
+    formats = formats or available_formats()
+    storage = picture_storage()
+    with storage.open(name, 'rb') as source:
+        original = Image.open(source)
+        if original.getexif().get(ORIENTATION_TAG, 1) < 5:
+            # Lets the JPEG decoder downscale by a power of two while decoding. Skipped for
+            # rotated photos, whose width becomes their height.
+            largest = derivative_widths(original.width)[-1]
+            original.draft('RGB', (largest, largest * original.height // original.width))
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA', 'L'):
+            original = original.convert('RGBA' if 'A' in original.getbands() else 'RGB')
+        original.load()
+    widths = derivative_widths(original.width)
+    derivatives = {key: [] for key in formats}
+    for width in widths:
+        height = max(round(original.height * width / original.width), 1)
+        resized = original if width == original.width else original.resize((width, height), Image.LANCZOS)
+        for key in formats:
+            data = encode(resized, key)
+            # Saved even when already stored: `ContentHashStorage` then only refreshes the
+            # file's modification time, so gc_media_blobs does not delete a reused blob.
+            derivative = storage.save(derivative_name(data, key), ContentFile(data))
+            derivatives[key].append([width, derivative])
+    return derivatives
+
+
+def store_derivatives(built):
+    """
+    Saves built derivatives with one UPDATE, so the pictures' save signals do not fire
+    again, and moves the `MediaBlob` references from the previous derivatives of every
+    picture to the new ones. The files of pictures deleted in the meantime are registered
+    without references, for `gc_media_blobs` to delete.
+
+    Parameters:
+        built (dict): Maps picture IDs to their new `derivatives` value.
+    """
+    with transaction.atomic():
+        previous = dict(
+            Picture.objects.select_for_update().filter(pk__in=built).values_list('pk', 'derivatives')
+        )
+        Picture.objects.bulk_update(
+            [Picture(pk=pk, derivatives=derivatives) for pk, derivatives in built.items() if pk in previous],
+            ['derivatives'],
+        )
+        new_names = [name for derivatives in built.values() for name in derivative_names(derivatives)]
+        acquire_blobs(new_names, picture_storage())
+        released = [name for derivatives in previous.values() for name in derivative_names(derivatives)]
+        for pk, derivatives in built.items():
+            if pk not in previous:
+                released.extend(derivative_names(derivatives))
+        release_blobs(released)
+
+
+def generate_derivatives(picture):
+    """
+    Builds the derivatives of a picture and stores them with `store_derivatives`.
+    """
+    picture.derivatives = build_derivatives(picture.image.name)
+    store_derivatives({picture.pk: picture.derivatives})
+    return picture.derivatives
+
+
+def generate_derivatives_later(picture_id):
+    """
+    Builds the derivatives of a picture after its upload was committed. Failures are logged,
+    pages keep using the original image until the picture is backfilled.
+    """
+    picture = Picture.objects.filter(pk=picture_id).first()
+    if picture is None or not picture.image:
+        return
+    try:
+        generate_derivatives(picture)
+    except (OSError, Image.UnidentifiedImageError):
+        logger.exception("Could not build the derivatives of picture %s", picture_id)
+
+
+class DerivativeWorkers:
+    """
+    Small per-process thread pool building the derivatives of uploaded pictures, so the
+    upload request returns without decoding and encoding every size and format.
+
+    Pillow releases the GIL while resizing and encoding, so threads are enough. Jobs still
+    queued when the process exits are lost; `generate_thumbnails` backfills those pictures.
+    """
+
+    def __init__(self, max_workers=2):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, picture_id):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='picture-derivatives')
+            self._executor.submit(self._run, picture_id)
+
+    def build(self, picture_id):
+        generate_derivatives_later(picture_id)
+
+    def _run(self, picture_id):
+        try:
+            self.build(picture_id)
+        finally:
+            connection.close()
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+derivative_workers = DerivativeWorkers(getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2))
+
+
+def srcset(picture, key=None):
+    """
+    Returns the `srcset` attribute value of a picture in one format, the best format every
+    browser supports (WebP, else the fallback) by default.
+    """
+    derivatives = picture.derivatives or {}
+    if key is None:
+        key = 'webp' if 'webp' in derivatives else FALLBACK_FORMAT
+    storage = picture.image.storage
+    return ', '.join(f'{storage.url(name)} {width}w' for width, name in derivatives.get(key, ()))
+
+
+def image_url(picture, width=None):
+    """
+    Returns the URL of the smallest fallback derivative at least `width` pixels wide (the
+    largest one if none is), or of the original when the picture has no derivatives.
+    """
+    candidates = (picture.derivatives or {}).get(FALLBACK_FORMAT)
+    if not candidates:
+        return picture.image.url
+    storage = picture.image.storage
+    if width is None:
+        return storage.url(candidates[-1][1])
+    for candidate_width, name in candidates:
+        if candidate_width >= width:
+            return storage.url(name)
+    return storage.url(candidates[-1][1])
@@ -0,0 +1,251 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils.text import slugify
+
+from .cache import CATALOG_NAMESPACE, bump_version
+from .facets import tool_index
+from .models import VAT_CHOICES, Category, Product, SearchIndexEntry, Tool
+from .my_contex_processor import category_cache
+from .page_cache import NAV_TAG, category_tag, invalidate_tags, product_tag
+from .search import weighted_terms
+
+INTEGER_FIELDS = ('netto_price', 'stock', 'height', 'length', 'width', 'weight')
+UPDATED_FIELDS = ('name', 'category', 'vat') + INTEGER_FIELDS
+VAT_RATES = {Decimal(rate): rate for rate, _ in VAT_CHOICES}
+
+
+class SlugAllocator:
+    """
+    Hands out unique slugs without querying the database per row.
+
+    The taken slugs are loaded once; collisions get the next free `-<n>` suffix, and the
+    last suffix used for every base is remembered, so a thousand "Hammer" rows do not scan
+    "hammer-1" ... "hammer-999" again for each new one.
+    """
+
+    def __init__(self, taken, max_length=100):
+        self.taken = set(taken)
+        self.max_length = max_length
+        self._next_suffix = {}
+
+    @classmethod
+    def for_model(cls, model):
+        field = model._meta.get_field('slug')
+        return cls(model.objects.values_list('slug', flat=True).iterator(chunk_size=10000), field.max_length)
+
+    def allocate(self, name):
+        base = (slugify(name) or 'item')[:self.max_length]
+        if base not in self.taken:
+            self.taken.add(base)
+            return base
+        suffix = self._next_suffix.get(base, 1)
+        while True:
+            ending = f'-{suffix}'
+            slug = base[:self.max_length - len(ending)] + ending
+            suffix += 1
+            if slug not in self.taken:
+                break
+        self._next_suffix[base] = suffix
+        self.taken.add(slug)
+        return slug
+
+    def claim(self, slug):
+        """
+        Reserves a slug given by the feed, or allocates a free variant if it is taken.
+        """
+        if slug in self.taken:
+            return self.allocate(slug)
+        self.taken.add(slug)
+        return slug
+
+
+def read_feed(feed, feed_format):
+    """
+    Streams the rows of a CSV or JSON Lines feed as `(line number, row)` pairs.
+
+    CSV rows are dicts, with the tools in one `tools` column separated by "|". JSONL rows
+    are left as text for `parse_row()` to decode, so a malformed line is reported like any
+    other invalid row; they may give the tools as a list.
+    """
+    if feed_format == 'csv':
+        reader = csv.DictReader(feed)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(feed, 1):
+            if line.strip():
+                yield line_number, line
+
+
+def parse_row(raw):
+    """
+    Validates a feed row and converts it to model values.
+
+    Raises:
+        ValueError: If the row is not valid JSON, is missing a name or category, or has an
+            invalid number or VAT rate.
+    """
+    if isinstance(raw, str):
+        raw = json.loads(raw)
+        if not isinstance(raw, dict):
+            raise ValueError("expected a JSON object")
+    name = str(raw.get('name') or '').strip()
+    category = str(raw.get('category') or '').strip()
+    if not name or not category:
+        raise ValueError("name and category are required")
+    if len(name) > 128 or len(category) > 128:
+        raise ValueError("name and category must be at most 128 characters")
+    row = {'name': name, 'category': category, 'slug': slugify(str(raw.get('slug') or ''))}
+    for field in INTEGER_FIELDS:
+        value = raw.get(field)
+        try:
+            row[field] = int(value) if value not in (None, '') else 0
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be an integer, got {value!r}")
+    try:
+        rate = Decimal(str(raw.get('vat') or '0.24').strip().rstrip('%'))
+    except InvalidOperation:
+        raise ValueError(f"invalid VAT rate {raw.get('vat')!r}")
+    if rate >= 1:
+        rate /= 100
+    if rate not in VAT_RATES:
+        raise ValueError(f"unsupported VAT rate {raw.get('vat')!r}")
+    row['vat'] = VAT_RATES[rate]
+    tools = raw.get('tools') or []
+    if isinstance(tools, str):
+        tools = tools.split('|')
+    row['tools'] = sorted({str(tool).strip()[:128] for tool in tools if str(tool).strip()})
+    return row
+
+
+class CatalogImporter:
+    """
+    Writes batches of parsed feed rows with a constant number of queries per batch.
+
+    Categories and tools are resolved through in-memory name maps loaded once; unknown ones
+    are created with one bulk insert per batch. Rows whose `slug` matches an existing
+    product update it, all other rows create products with slugs from a `SlugAllocator`.
+    Each batch is one transaction: product inserts and updates, the tool links written
+    straight to the through table, and the search index entries of the batch, computed from
+    the feed rows rather than by reloading the products.
+
+    Bulk queries bypass model signals, so the caches the signals maintain (tool index,
+    page cache, catalog version) are invalidated once per batch instead.
+    """
+
+    def __init__(self, update_search_index=True):
+        self.update_search_index = update_search_index
+        self.categories = {}
+        self._category_terms = {}
+        for pk, name, description in Category.objects.order_by('-pk').values_list('pk', 'name', 'description'):
+            self.categories[name] = pk
+            self._category_terms[pk] = weighted_terms({'category': [name], 'description': [description]})
+        self.tools = dict(Tool.objects.values_list('name', 'pk'))
+        self.category_slugs = SlugAllocator.for_model(Category)
+        self.product_slugs = SlugAllocator.for_model(Product)
+        self.created = 0
+        self.updated = 0
+
+    def _resolve_categories(self, rows):
+        missing = sorted({row['category'] for row in rows} - set(self.categories))
+        if missing:
+            created = Category.objects.bulk_create(
+                [Category(name=name, slug=self.category_slugs.allocate(name)) for name in missing]
+            )
+            for category in created:
+                self.categories[category.name] = category.pk
+                self._category_terms[category.pk] = weighted_terms({'category': [category.name]})
+        return bool(missing)
+
+    def _resolve_tools(self, rows):
+        missing = sorted({tool for row in rows for tool in row['tools']} - set(self.tools))
+        if missing:
+            Tool.objects.bulk_create([Tool(name=name) for name in missing], ignore_conflicts=True)
+            self.tools.update(Tool.objects.filter(name__in=missing).values_list('name', 'pk'))
+
+    def _search_terms(self, product, tool_names):
+        terms = weighted_terms({'name': [product.name], 'tools': tool_names})
+        terms.update(self._category_terms[product.category_id])
+        return terms
+
+    def import_batch(self, rows):
+        """
+        Imports parsed rows in one transaction and returns `(created, updated)` counts.
+        Of several rows with the same slug, the last one wins.
+        """
+        if not rows:
+            return 0, 0
+        rows = list({row['slug'] or index: row for index, row in enumerate(rows)}.values())
+        with transaction.atomic():
+            categories_created = self._resolve_categories(rows)
+            self._resolve_tools(rows)
+            existing, previous_categories = {}, set()
+            for slug, pk, category_id in Product.objects.filter(
+                slug__in=[row['slug'] for row in rows if row['slug']]
+            ).values_list('slug', 'pk', 'category_id'):
+                existing[slug] = pk
+                # Products moved to another category leave it, so it is invalidated too.
+                previous_categories.add(category_id)
+            new, changed, tool_names = [], [], []
+            for row in rows:
+                values = {field: row[field] for field in INTEGER_FIELDS}
+                product = Product(name=row['name'], category_id=self.categories[row['category']], vat=row['vat'], **values)
+                if row['slug'] in existing:
+                    product.pk = existing[row['slug']]
+                    product.slug = row['slug']
+                    changed.append(product)
+                else:
+                    product.slug = self.product_slugs.claim(row['slug']) if row['slug'] else (
+                        self.product_slugs.allocate(row['name'])
+                    )
+                    new.append(product)
+                tool_names.append((product, row['tools']))
+
+            Product.objects.bulk_create(new, batch_size=1000)
+            Product.objects.bulk_update(changed, UPDATED_FIELDS, batch_size=1000)
+            links = Product.tool.through
+            links.objects.filter(product_id__in=[product.pk for product in changed]).delete()
+            links.objects.bulk_create(
+                [
+                    links(product_id=product.pk, tool_id=self.tools[name])
+                    for product, names in tool_names
+                    for name in names
+                ],
+                batch_size=5000,
+                ignore_conflicts=True,
+            )
+            if self.update_search_index:
+                SearchIndexEntry.objects.filter(product_id__in=[product.pk for product in changed]).delete()
+                SearchIndexEntry.objects.bulk_create(
+                    [
+                        SearchIndexEntry(term=term, product_id=product.pk, weight=weight)
+                        for product, names in tool_names
+                        for term, weight in self._search_terms(product, names).items()
+                    ],
+                    batch_size=1000,
+                )
+
+        category_ids = {product.category_id for product in new + changed} | previous_categories
+        updated_ids = [product.pk for product in changed]
+        transaction.on_commit(lambda: invalidate_imported(category_ids, updated_ids, categories_created))
+        self.created += len(new)
+        self.updated += len(changed)
+        return len(new), len(changed)
+
+
+def invalidate_imported(category_ids, updated_product_ids, categories_created):
+    """
+    Invalidates what the model signals would have invalidated for the imported products.
+    """
+    for category_id in category_ids:
+        tool_index.invalidate(category_id)
+    tags = [category_tag(category_id) for category_id in category_ids]
+    tags += [product_tag(product_id) for product_id in updated_product_ids]
+    if categories_created:
+        tags.append(NAV_TAG)
+        category_cache.invalidate()
+    invalidate_tags(*tags)
+    bump_version(CATALOG_NAMESPACE)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from shop.exporting import EXPORT_FORMATS, export_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        'Streams the whole catalog as CSV or JSON Lines with constant memory. '
+        'The output can be imported again with import_catalog.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', help='File to write to. Defaults to standard output.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Products read per batch.')
+        parser.add_argument('--url-prefix', default='', help='Prepended to picture URLs, e.g. https://example.com')
+
+    def handle(self, *args, **options):
+        lines = export_catalog(options['format'], options['chunk_size'], options['url_prefix'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
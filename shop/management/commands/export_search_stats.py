@@ -0,0 +1,27 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand
+
+from shop.models import SearchQueryStat
+
+
+class Command(BaseCommand):
+    help = 'Exports the most searched queries, e.g. to pre-warm the search cache after a deploy.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help='Number of queries to export.')
+        parser.add_argument('--format', choices=['json', 'csv'], default='json')
+
+    def handle(self, *args, **options):
+        stats = SearchQueryStat.objects.order_by('-hits', 'query')[:options['limit']]
+        rows = [
+            {'query': stat.query, 'hits': stat.hits, 'last_searched': stat.last_searched.isoformat()}
+            for stat in stats
+        ]
+        if options['format'] == 'csv':
+            writer = csv.DictWriter(self.stdout, fieldnames=['query', 'hits', 'last_searched'])
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            self.stdout.write(json.dumps(rows, indent=2))
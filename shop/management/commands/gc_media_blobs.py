@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from shop.models import MediaBlob
+from shop.storage import get_picture_storage
+
+
+class Command(BaseCommand):
+    help = 'Deletes the stored picture files no longer referenced by any picture, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Blobs deleted per transaction.')
+        parser.add_argument(
+            '--grace-minutes', type=int, default=60,
+            help='Keep blobs unreferenced or re-uploaded more recently than this.',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted.')
+
+    def handle(self, *args, **options):
+        storage = get_picture_storage()
+        cutoff = timezone.now() - timedelta(minutes=options['grace_minutes'])
+        garbage = MediaBlob.objects.filter(refcount__lte=0, updated_at__lt=cutoff).order_by('pk')
+        if options['dry_run']:
+            count = garbage.count()
+            size = sum(garbage.values_list('size', flat=True))
+            self.stdout.write(f'Would delete {count} blobs ({size} bytes).')
+            return
+
+        deleted = freed = kept = 0
+        last_pk = 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    garbage.select_for_update().filter(pk__gt=last_pk).values_list('pk', 'name', 'size')[:options['batch_size']]
+                )
+                if not batch:
+                    break
+                last_pk = batch[-1][0]
+                MediaBlob.objects.filter(pk__in=[pk for pk, _, _ in batch]).delete()
+            for _, name, size in batch:
+                if not storage.exists(name):
+                    continue
+                # A re-upload of the same content touches the file before its row is counted again.
+                if storage.get_modified_time(name) >= cutoff:
+                    kept += 1
+                    continue
+                storage.delete(name)
+                deleted += 1
+                freed += size
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} blobs ({freed} bytes), kept {kept} recently reused.'))
@@ -0,0 +1,63 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from PIL import Image
+
+from shop.images import build_derivatives, store_derivatives
+from shop.models import Picture
+
+
+def build_safely(name):
+    try:
+        return build_derivatives(name), None
+    except (OSError, Image.UnidentifiedImageError) as error:
+        return None, f'{name}: {error}'
+
+
+class Command(BaseCommand):
+    help = 'Builds the resized WebP/AVIF/JPEG copies of product pictures, in parallel worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Number of worker processes, 0 builds in this process.',
+        )
+        parser.add_argument('--batch-size', type=int, default=200, help='Pictures saved per database update.')
+        parser.add_argument('--force', action='store_true', help='Rebuild pictures that already have derivatives.')
+
+    def handle(self, *args, **options):
+        pictures = Picture.objects.exclude(image='').order_by('pk')
+        if not options['force']:
+            pictures = pictures.filter(derivatives={})
+        pending = list(pictures.values_list('pk', 'image'))
+        if not pending:
+            self.stdout.write(self.style.SUCCESS('All pictures already have derivatives.'))
+            return
+
+        executor = None
+        if options['workers'] > 0:
+            # Forked workers must not share the parent's database connections.
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup)
+        built = 0
+        try:
+            for start in range(0, len(pending), options['batch_size']):
+                batch = pending[start:start + options['batch_size']]
+                names = [name for _, name in batch]
+                results = executor.map(build_safely, names, chunksize=4) if executor else map(build_safely, names)
+                updated = {}
+                for (pk, _), (derivatives, error) in zip(batch, results):
+                    if error:
+                        self.stderr.write(error)
+                    else:
+                        updated[pk] = derivatives
+                store_derivatives(updated)
+                built += len(updated)
+                self.stdout.write(f'{min(start + len(batch), len(pending))}/{len(pending)} pictures processed')
+        finally:
+            if executor:
+                executor.shutdown()
+        self.stdout.write(self.style.SUCCESS(f'Built derivatives for {built} pictures.'))
@@ -0,0 +1,94 @@
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.importing import CatalogImporter, parse_row, read_feed
+from shop.search import rebuild_index
+
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports products from a CSV or JSON Lines feed in batches. Columns: name, category, slug, '
+        'netto_price, vat, stock, height, length, width, weight and tools (separated by "|" in CSV). '
+        'Rows with the slug of an existing product update it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('feed', help='Path of the feed file.')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows imported per transaction.')
+        parser.add_argument(
+            '--checkpoint',
+            help='File recording the rows already committed. Defaults to the feed path plus ".checkpoint".',
+        )
+        parser.add_argument('--resume', action='store_true', help='Skip the rows committed by an interrupted run.')
+        parser.add_argument(
+            '--defer-search-index', action='store_true',
+            help='Rebuild the whole search index once at the end instead of per batch.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['feed']
+        feed_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        try:
+            stat = os.stat(path)
+        except OSError as error:
+            raise CommandError(f'Cannot read {path}: {error}')
+        feed_id = {'feed': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+        skip = 0
+        if options['resume'] and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as file:
+                checkpoint = json.load(file)
+            if {key: checkpoint.get(key) for key in feed_id} != feed_id:
+                raise CommandError(f'{path} changed since the checkpoint was written; import it again without --resume.')
+            skip = checkpoint['rows']
+            self.stdout.write(f'Resuming after {skip} rows.')
+
+        importer = CatalogImporter(update_search_index=not options['defer_search_index'])
+        started = time.monotonic()
+        done = skip
+        errors = 0
+        with open(path, newline='', encoding='utf-8-sig') as feed:
+            rows = islice(read_feed(feed, feed_format), skip, None)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                parsed = []
+                for line_number, raw in batch:
+                    try:
+                        parsed.append(parse_row(raw))
+                    except ValueError as error:
+                        errors += 1
+                        if errors <= MAX_REPORTED_ERRORS:
+                            self.stderr.write(f'Line {line_number}: {error}')
+                importer.import_batch(parsed)
+                done += len(batch)
+                self._write_checkpoint(checkpoint_path, dict(feed_id, rows=done))
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'{done} rows: {importer.created} created, {importer.updated} updated, {errors} invalid '
+                    f'({(done - skip) / elapsed if elapsed else 0:.0f} rows/s)'
+                )
+
+        if options['defer_search_index']:
+            self.stdout.write('Rebuilding the search index...')
+            rebuild_index(chunk_size=2000)
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {done - skip} rows: {importer.created} created, {importer.updated} updated, {errors} invalid.'
+        ))
+
+    def _write_checkpoint(self, checkpoint_path, checkpoint):
+        temporary = f'{checkpoint_path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(checkpoint, file)
+        os.replace(temporary, checkpoint_path)
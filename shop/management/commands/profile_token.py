@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from shop.profiling import PROFILE_HEADER, profile_token
+
+
+class Command(BaseCommand):
+    help = (
+        'Prints a signed token profiling the requests to one path that send it in the X-Profile-Request '
+        'header, when PROFILE_SIGNED_REQUESTS is on.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='The URL path the token is valid for, such as /search/.')
+        parser.add_argument('--curl', action='store_true', help='Print it as a curl header option.')
+
+    def handle(self, *args, **options):
+        token = profile_token(options['path'])
+        self.stdout.write(f"-H '{PROFILE_HEADER}: {token}'" if options['curl'] else token)
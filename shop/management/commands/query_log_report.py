@@ -0,0 +1,66 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from shop.query_log import prune_query_logs, query_log, read_query_log
+
+SORT_KEYS = {
+    'total': lambda row: row['total_ms'],
+    'max': lambda row: row['max_ms'],
+    'count': lambda row: row['count'],
+    'avg': lambda row: row['total_ms'] / row['count'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Summarizes the sampled query log: the most expensive query fingerprints per view.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', help='Log path whose per-process files are read. Defaults to QUERY_LOG_PATH.',
+        )
+        parser.add_argument('--sort', choices=sorted(SORT_KEYS), default='total')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--view', help='Only show this view (URL name).')
+        parser.add_argument('--since', help='Only count entries flushed at or after this ISO timestamp.')
+        parser.add_argument('--json', action='store_true', help='Print the rows as JSON.')
+
+    def handle(self, *args, **options):
+        # Aggregates of this process not flushed yet, e.g. when run from a shell.
+        query_log.flush()
+        prune_query_logs(options['path'])
+        rows = {}
+        for entry in read_query_log(options['path']):
+            if options['view'] and entry['view'] != options['view']:
+                continue
+            if options['since'] and entry['flushed_at'] < options['since']:
+                continue
+            key = (entry['view'], entry['fingerprint'])
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = {
+                    'view': entry['view'], 'fingerprint': entry['fingerprint'], 'count': 0, 'total_ms': 0.0,
+                    'max_ms': 0.0, 'template': None, 'code': None,
+                }
+            row['count'] += entry['count']
+            row['total_ms'] += entry['total_ms']
+            if entry['max_ms'] >= row['max_ms']:
+                row.update(max_ms=entry['max_ms'], template=entry['template'], code=entry['code'])
+
+        top = sorted(rows.values(), key=SORT_KEYS[options['sort']], reverse=True)[:options['limit']]
+        if options['json']:
+            self.stdout.write(json.dumps(top, indent=2))
+            return
+        if not top:
+            self.stdout.write('The query log is empty.')
+            return
+        self.stdout.write(f'{"total ms":>10} {"count":>7} {"avg ms":>8} {"max ms":>8}  view / query / call site')
+        for row in top:
+            self.stdout.write(
+                f'{row["total_ms"]:>10.1f} {row["count"]:>7} {row["total_ms"] / row["count"]:>8.2f} '
+                f'{row["max_ms"]:>8.2f}  {row["view"]}'
+            )
+            self.stdout.write(f'{"":>37}{row["fingerprint"][:160]}')
+            for place in (row['template'], row['code']):
+                if place:
+                    self.stdout.write(f'{"":>37}at {place}')
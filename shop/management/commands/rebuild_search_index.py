@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from shop.models import SearchIndexEntry
+from shop.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the product search index from scratch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Products indexed per transaction.')
+
+    def handle(self, *args, **options):
+        rebuild_index(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {SearchIndexEntry.objects.count()} search terms.'))
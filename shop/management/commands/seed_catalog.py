@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.importing import invalidate_imported
+from shop.search import rebuild_index
+from shop.seeding import CatalogSeeder
+
+
+class Command(BaseCommand):
+    help = (
+        'Fills the database with a deterministic synthetic shop for load and scale testing: categories, '
+        'tools, products, pictures, users, addresses, carts and cart lines, with skewed distributions.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--tools', type=int, default=500)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--picture-pool', type=int, default=20, help='Distinct image files shared by products.')
+        parser.add_argument('--seed', type=int, default=24, help='Random seed; the same seed gives the same data.')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows inserted per transaction.')
+        parser.add_argument('--search-index', action='store_true', help='Rebuild the search index afterwards.')
+
+    def handle(self, *args, **options):
+        if options['categories'] < 1 or options['tools'] < 1:
+            raise CommandError('At least one category and one tool are needed.')
+        started = time.monotonic()
+
+        def log(message):
+            self.stdout.write(f'[{time.monotonic() - started:7.1f}s] {message}')
+
+        seeder = CatalogSeeder(seed=options['seed'], batch_size=options['batch_size'], log=log)
+        if seeder.is_seeded():
+            raise CommandError(f'The database already holds data seeded with {options["seed"]}; use another --seed.')
+        category_ids = seeder.seed_categories(options['categories'])
+        tool_ids = seeder.seed_tools(options['tools'])
+        product_ids = seeder.seed_products(options['products'], category_ids, tool_ids)
+        seeder.seed_pictures(product_ids, pool_size=options['picture_pool'])
+        seeder.seed_customers(options['users'], product_ids)
+        invalidate_imported(category_ids, [], categories_created=True)
+        if options['search_index']:
+            log('Rebuilding the search index...')
+            rebuild_index(chunk_size=2000)
+        self.stdout.write(self.style.SUCCESS(f'Seeded in {time.monotonic() - started:.1f}s.'))
@@ -0,0 +1,26 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from shop.models import SearchQueryStat
+from shop.search_cache import cached_search
+
+
+class Command(BaseCommand):
+    help = 'Runs the most popular searches so their results are cached before users ask for them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help='Number of top queries to warm.')
+        parser.add_argument(
+            '--from-file', help='JSON file written by export_search_stats, instead of the database.'
+        )
+
+    def handle(self, *args, **options):
+        if options['from_file']:
+            with open(options['from_file']) as stats_file:
+                queries = [row['query'] for row in json.load(stats_file)][:options['limit']]
+        else:
+            queries = SearchQueryStat.objects.order_by('-hits').values_list('query', flat=True)[:options['limit']]
+        for query in queries:
+            cached_search(query, record=False)
+        self.stdout.write(self.style.SUCCESS(f'Warmed {len(queries)} search queries.'))
@@ -1,33 +1,45 @@
 from django.db import migrations
+from django.db.models import Q
 from django.utils.text import slugify
 
 
-def populate_category_slugs(apps, schema_editor):
-    categories = apps.get_model('shop', 'Category')
-    for category in categories.objects.all():
-        if not category.slug:
-            base_slug = slugify(category.name)
-            slug = base_slug
-            counter = 1
-            while categories.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
+def populate_slugs(model, batch_size=1000):
+    """
+    Gives every row without a slug a unique one, `<name>` or `<name>-<n>`.
+
+    The taken slugs are loaded once and the allocation happens in memory, remembering the
+    last suffix of every base, then the rows are written with `bulk_update` instead of one
+    existence query per candidate and one save per row.
+    """
+    taken = set(model.objects.exclude(slug__isnull=True).exclude(slug='').values_list('slug', flat=True))
+    next_suffix = {}
+    missing = model.objects.filter(Q(slug__isnull=True) | Q(slug='')).only('pk', 'name').order_by('pk')
+    last_pk = 0
+    while True:
+        rows = list(missing.filter(pk__gt=last_pk)[:batch_size])
+        if not rows:
+            break
+        last_pk = rows[-1].pk
+        for row in rows:
+            base = slugify(row.name)[:100]
+            slug = base
+            counter = next_suffix.get(base, 1)
+            while slug in taken:
+                ending = f"-{counter}"
+                slug = f"{base[:100 - len(ending)]}{ending}"
                 counter += 1
-            category.slug = slug
-            category.save()
+            next_suffix[base] = counter
+            taken.add(slug)
+            row.slug = slug
+        model.objects.bulk_update(rows, ['slug'])
+
+
+def populate_category_slugs(apps, schema_editor):
+    populate_slugs(apps.get_model('shop', 'Category'))
 
 
 def populate_product_slugs(apps, schema_editor):
-    products = apps.get_model('shop', 'Product')
-    for product in products.objects.all():
-        if not product.slug:
-            base_slug = slugify(product.name)
-            slug = base_slug
-            counter = 1
-            while products.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            product.slug = slug
-            product.save()
+    populate_slugs(apps.get_model('shop', 'Product'))
 
 
 class Migration(migrations.Migration):
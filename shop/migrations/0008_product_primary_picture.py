@@ -0,0 +1,25 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_primary_pictures(apps, schema_editor):
+    products = apps.get_model('shop', 'Product')
+    pictures = apps.get_model('shop', 'Picture')
+    first_picture = pictures.objects.filter(product=models.OuterRef('pk')).order_by('pk').values('pk')[:1]
+    products.objects.update(primary_picture=models.Subquery(first_picture))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_alter_tool_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='primary_picture',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='shop.picture'),
+        ),
+        migrations.RunPython(populate_primary_pictures, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_product_primary_picture'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchIndexEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveIntegerField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_entries', to='shop.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'product'], name='shop_search_term_product_idx')],
+            },
+        ),
+    ]
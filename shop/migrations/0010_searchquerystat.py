@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_searchindexentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchQueryStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=255, unique=True)),
+                ('hits', models.PositiveBigIntegerField(default=0)),
+                ('last_searched', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
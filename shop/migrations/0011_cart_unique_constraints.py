@@ -0,0 +1,48 @@
+from django.db import migrations, models
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Merges duplicate active carts of a user and duplicate lines of a cart, so the unique
+    constraints below can be created.
+    """
+    carts = apps.get_model('shop', 'ShoppingCart')
+    lines = apps.get_model('shop', 'ShoppingCartProduct')
+
+    duplicated_users = (
+        carts.objects.filter(active=True).values('user').annotate(count=models.Count('pk')).filter(count__gt=1)
+    )
+    for row in duplicated_users:
+        kept, *extra = carts.objects.filter(user=row['user'], active=True).order_by('pk')
+        lines.objects.filter(shopping_cart__in=extra).update(shopping_cart=kept)
+        carts.objects.filter(pk__in=[cart.pk for cart in extra]).update(active=False)
+
+    duplicated_lines = (
+        lines.objects.values('shopping_cart', 'product')
+        .annotate(count=models.Count('pk'), quantity=models.Sum('quantity'))
+        .filter(count__gt=1)
+    )
+    for row in duplicated_lines:
+        kept, *extra = lines.objects.filter(shopping_cart=row['shopping_cart'], product=row['product']).order_by('pk')
+        lines.objects.filter(pk__in=[line.pk for line in extra]).delete()
+        kept.quantity = row['quantity']
+        kept.save(update_fields=['quantity'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_searchquerystat'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(condition=models.Q(('active', True)), fields=('user',), name='unique_active_cart_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcartproduct',
+            constraint=models.UniqueConstraint(fields=('shopping_cart', 'product'), name='unique_cart_product'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_cart_unique_constraints'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('address_name', models.CharField(blank=True, max_length=128)),
+                ('street', models.CharField(blank=True, max_length=128)),
+                ('city', models.CharField(blank=True, max_length=128)),
+                ('zipcode', models.CharField(blank=True, max_length=128)),
+                ('total_net_cents', models.PositiveBigIntegerField(default=0)),
+                ('total_vat_cents', models.PositiveBigIntegerField(default=0)),
+                ('total_gross_cents', models.PositiveBigIntegerField(default=0)),
+                ('cart', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='shop.shoppingcart')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='orders', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created_at'], name='shop_order_user_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_name', models.CharField(max_length=128)),
+                ('quantity', models.PositiveIntegerField()),
+                ('vat_percent', models.PositiveSmallIntegerField()),
+                ('unit_net_cents', models.PositiveBigIntegerField()),
+                ('unit_gross_cents', models.PositiveBigIntegerField()),
+                ('line_gross_cents', models.PositiveBigIntegerField()),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='shop.order')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='shop.product')),
+            ],
+        ),
+    ]
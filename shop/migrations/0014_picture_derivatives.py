@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_cart_holds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='picture',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
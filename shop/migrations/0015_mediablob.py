@@ -0,0 +1,54 @@
+from django.db import migrations, models
+
+import shop.storage
+
+
+def count_references(apps, schema_editor):
+    """
+    Registers the files already used by pictures, with one reference per picture.
+    """
+    pictures = apps.get_model('shop', 'Picture')
+    blobs = apps.get_model('shop', 'MediaBlob')
+    storage = shop.storage.get_picture_storage()
+    references = pictures.objects.exclude(image='').values('image').annotate(refcount=models.Count('pk'))
+    blobs.objects.bulk_create(
+        [
+            blobs(
+                name=row['image'],
+                refcount=row['refcount'],
+                size=storage.size(row['image']) if storage.exists(row['image']) else 0,
+            )
+            for row in references.iterator()
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_picture_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('refcount', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('refcount__lte', 0)), fields=['updated_at'], name='mediablob_unreferenced')],
+            },
+        ),
+        migrations.AlterField(
+            model_name='picture',
+            name='image',
+            field=models.ImageField(storage=shop.storage.get_picture_storage, upload_to='images/'),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
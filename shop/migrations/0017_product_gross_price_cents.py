@@ -0,0 +1,32 @@
+from django.db import migrations, models
+from django.db.models.functions import Cast, Round
+
+
+def compute_gross_prices(apps, schema_editor):
+    products = apps.get_model('shop', 'Product')
+    percent = Cast(Round(Cast(models.F('vat'), models.FloatField()) * 100), models.IntegerField())
+    products.objects.update(gross_price_cents=models.F('netto_price') * 100 + models.F('netto_price') * percent)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0016_product_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='gross_price_cents',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(compute_gross_prices, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_category_price',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'gross_price_cents', 'id'], name='product_category_gross'),
+        ),
+    ]
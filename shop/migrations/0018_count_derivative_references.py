@@ -0,0 +1,42 @@
+from collections import Counter
+
+from django.db import migrations, models
+
+import shop.storage
+
+
+def count_derivative_references(apps, schema_editor):
+    """
+    Adds one reference per picture to the derivative files built before they were counted.
+    """
+    pictures = apps.get_model('shop', 'Picture')
+    blobs = apps.get_model('shop', 'MediaBlob')
+    storage = shop.storage.get_picture_storage()
+    counts = Counter()
+    for derivatives in pictures.objects.exclude(derivatives={}).values_list('derivatives', flat=True).iterator():
+        counts.update(name for entries in derivatives.values() for _, name in entries)
+    known = set()
+    names = list(counts)
+    for start in range(0, len(names), 1000):
+        known.update(blobs.objects.filter(name__in=names[start:start + 1000]).values_list('name', flat=True))
+    blobs.objects.bulk_create(
+        [
+            blobs(name=name, refcount=count, size=storage.size(name) if storage.exists(name) else 0)
+            for name, count in counts.items() if name not in known
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    for name in known:
+        blobs.objects.filter(name=name).update(refcount=models.F('refcount') + counts[name])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0017_product_gross_price_cents'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_derivative_references, migrations.RunPython.noop),
+    ]
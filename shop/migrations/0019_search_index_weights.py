@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0018_count_derivative_references'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='searchindexentry',
+            name='shop_search_term_product_idx',
+        ),
+        migrations.AddIndex(
+            model_name='searchindexentry',
+            index=models.Index(fields=['term', 'product', 'weight'], name='shop_search_term_prod_wt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchindexentry',
+            index=models.Index(fields=['term', '-weight', 'product'], name='shop_search_term_weight_idx'),
+        ),
+    ]
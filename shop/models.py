@@ -1,10 +1,17 @@
 import datetime
+from collections import Counter
+from decimal import Decimal
 from itertools import product
 
 from django.utils.text import slugify
 
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Cast, Now, Round
+
+from .cache import CATALOG_NAMESPACE, bump_version
+from .page_cache import category_tag, invalidate_tags_on_commit, product_tag
+from .storage import get_picture_storage
 
 VAT_CHOICES = (
     ('0.11', '11%'),
@@ -52,6 +59,96 @@ class Category(models.Model):
         super().save(*args, **kwargs)
 
 
+def vat_percent(prefix=''):
+    """
+    The VAT rate of a product as an integer percentage ('0.24' -> 24), computed in the database.
+    """
+    return Cast(Round(Cast(models.F(f'{prefix}vat'), models.FloatField()) * 100), models.IntegerField())
+
+
+def vat_percent_of(vat):
+    """
+    The VAT rate of a product as an integer percentage ('0.24' -> 24), computed in Python.
+    """
+    return int((Decimal(str(vat)) * 100).to_integral_value())
+
+
+def gross_price_expression(netto_price=None, vat=None):
+    """
+    The database expression of `Product.gross_price_cents`, optionally for new values of
+    `netto_price` and `vat` being written by the same UPDATE.
+    """
+    if netto_price is None:
+        netto_price = models.F('netto_price')
+    elif not hasattr(netto_price, 'resolve_expression'):
+        netto_price = models.Value(netto_price)
+    percent = vat_percent() if vat is None else models.Value(vat_percent_of(vat))
+    return netto_price * 100 + netto_price * percent
+
+
+def invalidate_products_on_commit(products):
+    """
+    Makes the cached pages and search results showing the given `(pk, category_id)`
+    products stale once the transaction commits, as the model signals do for single saves.
+    """
+    products = list(products)
+    if not products:
+        return
+    invalidate_tags_on_commit(
+        *{tag for pk, category_id in products for tag in (product_tag(pk), category_tag(category_id))}
+    )
+    transaction.on_commit(lambda: bump_version(CATALOG_NAMESPACE))
+
+
+PRICE_FIELDS = ('netto_price', 'vat', 'gross_price_cents')
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    Keeps `Product.gross_price_cents` in sync when prices or VAT rates are changed in bulk.
+
+    Bulk updates send no signals, so price changes also invalidate the cached pages and
+    search results of the updated products here (see `invalidate_products_on_commit`).
+    """
+
+    def update(self, **kwargs):
+        if not any(field in kwargs for field in PRICE_FIELDS):
+            return super().update(**kwargs)
+        if 'gross_price_cents' not in kwargs:
+            kwargs['gross_price_cents'] = gross_price_expression(kwargs.get('netto_price'), kwargs.get('vat'))
+        # Read before the UPDATE, which may change the rows out of the filter.
+        products = list(self.values_list('pk', 'category_id'))
+        updated = super().update(**kwargs)
+        invalidate_products_on_commit(products)
+        return updated
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.gross_price_cents = obj.compute_gross_price_cents()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if not set(PRICE_FIELDS) & set(fields):
+            return super().bulk_update(objs, fields, *args, **kwargs)
+        objs = list(objs)
+        if 'gross_price_cents' not in fields:
+            for obj in objs:
+                obj.gross_price_cents = obj.compute_gross_price_cents()
+            fields = [*fields, 'gross_price_cents']
+        updated = super().bulk_update(objs, fields, *args, **kwargs)
+        invalidate_products_on_commit((obj.pk, obj.category_id) for obj in objs)
+        return updated
+
+    def refresh_gross_prices(self):
+        """
+        Recomputes the gross price of every product of the queryset with a single UPDATE.
+        """
+        return self.update(gross_price_cents=gross_price_expression())
+
+
 class Product(models.Model):
     """
     Represents a product in the inventory.
@@ -68,6 +165,11 @@ class Product(models.Model):
         tool (ManyToManyField): The tools associated with this product.
         category (ForeignKey): The category to which the product belongs.
         slug (str): A unique slug generated from the product name.
+        primary_picture (ForeignKey): The first picture of the product, kept up to date when pictures
+            change so listings can load it with `select_related`.
+        reserved (int): The quantity currently held by shopping carts.
+        gross_price_cents (int): The price customers pay (net price plus VAT), in cents. Kept up
+            to date by `save()` and by bulk updates, so listings can filter and sort on it.
     """
 
     name = models.CharField(max_length=128)
@@ -81,18 +183,54 @@ class Product(models.Model):
     tool = models.ManyToManyField(Tool)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     slug = models.SlugField(max_length=100, unique=True, blank=True)
+    primary_picture = models.ForeignKey(
+        'Picture', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    reserved = models.PositiveIntegerField(default=0)
+    gross_price_cents = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination and price ranges of category listings (see `shop.pagination`).
+            models.Index(fields=['category', 'name', 'id'], name='product_category_name'),
+            models.Index(fields=['category', 'gross_price_cents', 'id'], name='product_category_gross'),
+        ]
 
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
         """
-        Saves the product. If no slug is provided, generates one from the product name.
+        Saves the product. If no slug is provided, generates one from the product name. The gross
+        price is recomputed from the net price and the VAT rate.
         """
         if not self.slug:
             self.slug = slugify(self.name)
+        self.gross_price_cents = self.compute_gross_price_cents()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'netto_price', 'vat'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'gross_price_cents'}
         super().save(*args, **kwargs)
 
+    @property
+    def available(self):
+        """
+        The stock that is not held by any shopping cart.
+        """
+        return max(self.stock - self.reserved, 0)
+
+    def compute_gross_price_cents(self):
+        return self.netto_price * 100 + self.netto_price * vat_percent_of(self.vat)
+
+    @property
+    def gross_price(self):
+        """
+        The gross price as a `Decimal` in ISK.
+        """
+        return (Decimal(self.gross_price_cents) / 100).quantize(Decimal('0.01'))
+
     def calculate_price(self):
         """
         Calculates the gross price of the product by applying the VAT rate to the net price.
@@ -109,16 +247,160 @@ class Picture(models.Model):
 
     Attributes:
         product (ForeignKey): The product to which the image belongs.
-        image (ImageField): The image file.
+        image (ImageField): The image file, stored once per distinct content (see `ContentHashStorage`).
+        derivatives (JSONField): The resized copies of the image, mapping each format
+            ("avif", "webp", "jpeg") to `[width, file name]` pairs, smallest first.
     """
 
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
-    image = models.ImageField(upload_to='images/')
+    image = models.ImageField(upload_to='images/', storage=get_picture_storage)
+    derivatives = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return self.image.name
 
 
+def refresh_primary_picture(product_id):
+    """
+    Points `Product.primary_picture` at the product's first picture with a single UPDATE.
+    """
+    first_picture = Picture.objects.filter(product=models.OuterRef('pk')).order_by('pk').values('pk')[:1]
+    Product.objects.filter(pk=product_id).update(primary_picture=models.Subquery(first_picture))
+
+
+class MediaBlob(models.Model):
+    """
+    Counts the rows referencing a stored media file, since identical uploads share one file.
+
+    Attributes:
+        name (str): The storage name of the file.
+        size (int): The size of the file in bytes.
+        refcount (int): The number of references to the file: one per `Picture` row using
+            it as its image, and one per picture using it as a derivative.
+        updated_at (datetime): When the reference count last changed.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refcount = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Lets gc_media_blobs find garbage without scanning referenced blobs.
+            models.Index(fields=['updated_at'], condition=models.Q(refcount__lte=0), name='mediablob_unreferenced'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
+
+
+def acquire_blob(name, storage):
+    """
+    Adds a reference to a stored file, registering it on first use.
+    """
+    if not name:
+        return
+    if not MediaBlob.objects.filter(name=name).update(refcount=models.F('refcount') + 1, updated_at=Now()):
+        size = storage.size(name) if storage.exists(name) else 0
+        MediaBlob.objects.bulk_create([MediaBlob(name=name, size=size)], ignore_conflicts=True)
+        MediaBlob.objects.filter(name=name).update(refcount=models.F('refcount') + 1, updated_at=Now())
+
+
+def release_blob(name):
+    """
+    Removes a reference to a stored file. Files left without references are deleted later
+    by the `gc_media_blobs` command.
+    """
+    if name:
+        MediaBlob.objects.filter(name=name).update(refcount=models.F('refcount') - 1, updated_at=Now())
+
+
+def _change_refcounts(counts, sign):
+    by_count = {}
+    for name, count in counts.items():
+        by_count.setdefault(count, []).append(name)
+    for count, names in by_count.items():
+        MediaBlob.objects.filter(name__in=names).update(refcount=models.F('refcount') + sign * count, updated_at=Now())
+
+
+def acquire_blobs(names, storage):
+    """
+    Same as `acquire_blob` for many files (a name listed twice gets two references), with a
+    few queries per distinct reference count.
+    """
+    counts = Counter(name for name in names if name)
+    if not counts:
+        return
+    known = set(MediaBlob.objects.filter(name__in=counts).values_list('name', flat=True))
+    MediaBlob.objects.bulk_create(
+        [
+            MediaBlob(name=name, size=storage.size(name) if storage.exists(name) else 0)
+            for name in counts if name not in known
+        ],
+        ignore_conflicts=True,
+    )
+    _change_refcounts(counts, 1)
+
+
+def release_blobs(names):
+    """
+    Same as `release_blob` for many files.
+    """
+    counts = Counter(name for name in names if name)
+    if counts:
+        _change_refcounts(counts, -1)
+
+
+def derivative_names(derivatives):
+    """
+    Returns the storage names listed in a `Picture.derivatives` value.
+    """
+    return [name for entries in (derivatives or {}).values() for _, name in entries]
+
+
+class SearchIndexEntry(models.Model):
+    """
+    Represents one term of the product search index.
+
+    Attributes:
+        term (str): The normalized and stemmed search term.
+        product (ForeignKey): The product containing the term.
+        weight (int): How strongly the term describes the product, summed over the fields it appears in.
+    """
+
+    term = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_entries')
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'product', 'weight'], name='shop_search_term_prod_wt_idx'),
+            models.Index(fields=['term', '-weight', 'product'], name='shop_search_term_weight_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.term} -> {self.product_id}'
+
+
+class SearchQueryStat(models.Model):
+    """
+    Represents how often a normalized search query was run.
+
+    Attributes:
+        query (str): The normalized query (lowercased, accent-folded, single spaces).
+        hits (int): The number of searches for the query.
+        last_searched (datetime): When the query was last searched.
+    """
+
+    query = models.CharField(max_length=255, unique=True)
+    hits = models.PositiveBigIntegerField(default=0)
+    last_searched = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.query} ({self.hits})'
+
+
 class PromoCodes(models.Model):
     """
     Represents a promotional code that provides a discount.
@@ -163,6 +445,13 @@ class ShoppingCart(models.Model):
     promo_code = models.ForeignKey(PromoCodes, on_delete=models.SET_NULL, null=True, blank=True)
     active = models.BooleanField(default=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user'], condition=models.Q(active=True), name='unique_active_cart_per_user'
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user.username} cart with ID {self.id} ({self.active})"
 
@@ -175,11 +464,20 @@ class ShoppingCartProduct(models.Model):
         product (ForeignKey): The product added to the shopping cart.
         shopping_cart (ForeignKey): The shopping cart to which the product is added.
         quantity (int): The quantity of the product in the shopping cart.
+        held_quantity (int): The part of the quantity holding the product's stock.
+        hold_expires_at (datetime): When the hold is released, or None if nothing is held.
     """
 
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     shopping_cart = models.ForeignKey(ShoppingCart, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+    held_quantity = models.PositiveIntegerField(default=0)
+    hold_expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['shopping_cart', 'product'], name='unique_cart_product'),
+        ]
 
     def total_price(self):
         return self.product.calculate_price() * self.quantity
@@ -205,3 +503,77 @@ class Address(models.Model):
 
     def __str__(self):
         return f'{self.user.username} adress: {self.name}'
+
+
+class Order(models.Model):
+    """
+    Represents a paid order. Written once at payment and never recalculated, so it keeps the
+    prices, VAT and names the customer paid for even when the catalog changes later.
+
+    Attributes:
+        user (ForeignKey): The user who placed the order.
+        cart (OneToOneField): The shopping cart the order was created from.
+        created_at (datetime): When the order was paid.
+        address_name (str): The name of the delivery address.
+        street (str): The delivery street.
+        city (str): The delivery city.
+        zipcode (str): The delivery postal code.
+        total_net_cents (int): The net total, in cents.
+        total_vat_cents (int): The VAT total, in cents.
+        total_gross_cents (int): The gross total, in cents.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.PROTECT, related_name='orders')
+    cart = models.OneToOneField(ShoppingCart, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    address_name = models.CharField(max_length=128, blank=True)
+    street = models.CharField(max_length=128, blank=True)
+    city = models.CharField(max_length=128, blank=True)
+    zipcode = models.CharField(max_length=128, blank=True)
+    total_net_cents = models.PositiveBigIntegerField(default=0)
+    total_vat_cents = models.PositiveBigIntegerField(default=0)
+    total_gross_cents = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='shop_order_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'Order {self.id} of {self.user_id}'
+
+    @property
+    def total_gross(self):
+        return (Decimal(self.total_gross_cents) / 100).quantize(Decimal('0.01'))
+
+
+class OrderLine(models.Model):
+    """
+    Represents one product of an order, denormalized at payment time.
+
+    Attributes:
+        order (ForeignKey): The order the line belongs to.
+        product (ForeignKey): The ordered product, kept only as a reference.
+        product_name (str): The name of the product when it was ordered.
+        quantity (int): The ordered quantity.
+        vat_percent (int): The VAT rate applied, as a whole percentage.
+        unit_net_cents (int): The net price of one item, in cents.
+        unit_gross_cents (int): The gross price of one item, in cents.
+        line_gross_cents (int): The gross price of the whole line, in cents.
+    """
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines')
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True)
+    product_name = models.CharField(max_length=128)
+    quantity = models.PositiveIntegerField()
+    vat_percent = models.PositiveSmallIntegerField()
+    unit_net_cents = models.PositiveBigIntegerField()
+    unit_gross_cents = models.PositiveBigIntegerField()
+    line_gross_cents = models.PositiveBigIntegerField()
+
+    def __str__(self):
+        return f'{self.quantity} x {self.product_name}'
+
+    @property
+    def line_gross(self):
+        return (Decimal(self.line_gross_cents) / 100).quantize(Decimal('0.01'))
@@ -1,8 +1,13 @@
+from django.conf import settings
+
+from .cache import VersionedCache
 from .models import Category
 
+category_cache = VersionedCache('categories', maxsize=getattr(settings, 'CATEGORY_CACHE_SIZE', 16))
+
 
 def category_list(request):
-    categories = Category.objects.all()
+    categories = category_cache.get_or_set('all', lambda: list(Category.objects.all()))
     ctx = {
         'categories': categories
     }
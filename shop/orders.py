@@ -0,0 +1,119 @@
+from django.db import transaction
+from django.db.models import F
+
+from .models import Order, OrderLine, Product, ShoppingCart, ShoppingCartProduct
+from .pricing import priced_cart_lines
+
+
+class OrderError(Exception):
+    """
+    Base class of the errors raised while committing an order. The transaction is rolled
+    back, so no stock is taken and the cart stays active.
+    """
+
+
+class CartAlreadyOrdered(OrderError):
+    def __init__(self, cart):
+        self.cart = cart
+        super().__init__(f"Cart {cart.pk} was already ordered")
+
+
+class OutOfStock(OrderError):
+    """
+    Attributes:
+        product_ids (list): The products that do not have enough stock for the cart.
+    """
+
+    def __init__(self, product_ids):
+        self.product_ids = product_ids
+        super().__init__(f"Not enough stock for products: {product_ids}")
+
+
+def commit_order(cart, address=None):
+    """
+    Turns an active cart into an order, taking the stock of every line in one transaction.
+
+    - The cart is claimed first with `UPDATE ... SET active = false WHERE active`, so a
+      double-submitted payment cannot take the stock twice.
+    - Every line then runs
+      `UPDATE product SET stock = stock - n WHERE id = ... AND stock >= reserved + n`,
+      so stock held by other carts is left alone. A line holding `h` units (see
+      `holds.place_holds`) consumes its hold instead: the check becomes
+      `stock >= reserved - h + n` and `reserved` is decreased by `h`.
+    - Lines are processed in product ID order, so concurrent checkouts lock rows in the
+      same order and cannot deadlock.
+    - If any product is short, every shortage is collected, then the transaction is rolled
+      back and `OutOfStock` is raised.
+    - Finally an immutable `Order` is written with the prices, VAT and names of the lines,
+      using one query to price the cart and one bulk insert for the lines.
+
+    Parameters:
+        cart (ShoppingCart): The active cart to order.
+        address (Address, optional): The delivery address copied into the order.
+
+    Returns:
+        Order: The created order.
+
+    Raises:
+        CartAlreadyOrdered: If the cart is no longer active.
+        OutOfStock: If some products do not have enough stock.
+    """
+    with transaction.atomic():
+        if not ShoppingCart.objects.filter(pk=cart.pk, active=True).update(active=False):
+            raise CartAlreadyOrdered(cart)
+        lines = ShoppingCartProduct.objects.select_for_update().filter(shopping_cart=cart).order_by('product_id')
+        short = []
+        held = False
+        for product_id, quantity, held_quantity in lines.values_list('product_id', 'quantity', 'held_quantity'):
+            if held_quantity:
+                held = True
+                taken = Product.objects.filter(
+                    pk=product_id, stock__gte=F('reserved') - held_quantity + quantity
+                ).update(stock=F('stock') - quantity, reserved=F('reserved') - held_quantity)
+            else:
+                taken = Product.objects.filter(
+                    pk=product_id, stock__gte=F('reserved') + quantity
+                ).update(stock=F('stock') - quantity)
+            if not taken:
+                short.append(product_id)
+        if short:
+            raise OutOfStock(short)
+        if held:
+            lines.filter(held_quantity__gt=0).update(held_quantity=0, hold_expires_at=None)
+        order = write_order(cart, address)
+    cart.active = False
+    return order
+
+
+def write_order(cart, address=None):
+    """
+    Writes the `Order` and `OrderLine` snapshot of a cart.
+    """
+    priced = list(priced_cart_lines(cart))
+    net = priced[0].cart_net_cents if priced else 0
+    vat = priced[0].cart_vat_cents if priced else 0
+    order = Order.objects.create(
+        user_id=cart.user_id,
+        cart=cart,
+        address_name=address.name if address else '',
+        street=address.street if address else '',
+        city=address.city if address else '',
+        zipcode=address.zipcode if address else '',
+        total_net_cents=net,
+        total_vat_cents=vat,
+        total_gross_cents=net + vat,
+    )
+    OrderLine.objects.bulk_create([
+        OrderLine(
+            order=order,
+            product_id=line.product_id,
+            product_name=line.product.name,
+            quantity=line.quantity,
+            vat_percent=line.vat_percent,
+            unit_net_cents=line.unit_net_cents,
+            unit_gross_cents=line.unit_net_cents + line.unit_vat_cents,
+            line_gross_cents=line.line_net_cents + line.line_vat_cents,
+        )
+        for line in priced
+    ])
+    return order
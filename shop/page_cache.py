@@ -0,0 +1,110 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+
+from .cache import bump_version, get_versions
+
+TAG_PREFIX = 'page:'
+
+# Every page shows the category menu of base.html.
+NAV_TAG = 'nav'
+
+
+def product_tag(product_id):
+    return f'product:{product_id}'
+
+
+def category_tag(category_id):
+    return f'category:{category_id}'
+
+
+def tool_tag(tool_id):
+    return f'tool:{tool_id}'
+
+
+def invalidate_tags(*tags):
+    """
+    Makes every cached page depending on one of the tags stale.
+    """
+    for tag in tags:
+        bump_version(TAG_PREFIX + tag)
+
+
+def invalidate_tags_on_commit(*tags):
+    """
+    Same as `invalidate_tags`, once the current transaction commits. Bumping the tags
+    before the commit would let a concurrent request cache the old page under the new tag
+    versions, where it would stay until the page expires.
+    """
+    transaction.on_commit(lambda: invalidate_tags(*tags))
+
+
+def tag_versions(tags):
+    versions = get_versions([TAG_PREFIX + tag for tag in tags])
+    return {tag: versions[TAG_PREFIX + tag] for tag in tags}
+
+
+class AnonymousPageCacheMixin:
+    """
+    Caches the rendered page of anonymous GET requests.
+
+    Pages are keyed by path and by the values of the `page_cache_params` query parameters,
+    sorted and deduplicated, so `?tools=2&tools=1` and `?tools=1&tools=2&utm=x` share one
+    entry. Each entry stores the versions of the dependency tags the view declared with
+    `add_page_tags()` (`product:<id>`, `category:<id>`, `tool:<id>`, plus `nav` for the
+    menu); on lookup the versions are read with one `get_many` and the entry is only served
+    if none changed. Saving a product therefore only invalidates its page and its category's
+    pages, without touching the database. Entries also expire after the timeout of the
+    "pages" cache.
+
+    Logged-in users are never served from or stored in the cache, so their header (cart,
+    username) stays personal. Responses setting cookies or using a CSRF token are not stored.
+    """
+
+    page_cache_params = ()
+    page_cache_alias = 'pages'
+    _page_tags = None
+
+    def page_cache_key(self, request):
+        parts = [request.path]
+        for param in self.page_cache_params:
+            values = sorted(set(request.GET.getlist(param)))
+            parts.append(f'{param}={",".join(values)}')
+        digest = hashlib.md5('?'.join(parts).encode(), usedforsecurity=False).hexdigest()
+        return f'shop:page:{digest}'
+
+    def add_page_tags(self, *tags):
+        """
+        Declares what the page being rendered shows. Call it right after loading the data,
+        since the versions are read now: an edit committed in between is then noticed.
+        """
+        if self._page_tags is not None:
+            self._page_tags.update(tag_versions(tags))
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method != 'GET' or request.user.is_authenticated or not getattr(settings, 'PAGE_CACHE_ENABLED', True):
+            return super().dispatch(request, *args, **kwargs)
+        page_cache = caches[self.page_cache_alias]
+        key = self.page_cache_key(request)
+        entry = page_cache.get(key)
+        if entry is not None and tag_versions(entry['tags']) == entry['tags']:
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+            response['X-Page-Cache'] = 'hit'
+            return response
+
+        self._page_tags = tag_versions([NAV_TAG])
+        response = super().dispatch(request, *args, **kwargs)
+        personal = response.cookies or request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        if response.status_code == 200 and not personal and not getattr(response, 'streaming', False):
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+            page_cache.set(key, {
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'tags': self._page_tags,
+            })
+        response['X-Page-Cache'] = 'miss'
+        return response
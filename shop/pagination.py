@@ -0,0 +1,192 @@
+from urllib.parse import urlencode
+
+from django.core import signing
+from django.db.models import Q
+
+CURSOR_SALT = 'shop.pagination'
+
+# Sort name -> model fields, each ending with the primary key so every key is unique.
+PRODUCT_SORTS = {
+    'name': ('name', 'pk'),
+    '-name': ('-name', '-pk'),
+    'price': ('gross_price_cents', 'pk'),
+    '-price': ('-gross_price_cents', '-pk'),
+    'id': ('pk',),
+}
+DEFAULT_PRODUCT_SORT = 'name'
+SORT_LABELS = {
+    'name': 'Name A-Z',
+    '-name': 'Name Z-A',
+    'price': 'Lowest price',
+    '-price': 'Highest price',
+}
+
+
+def sort_links(params, labels=SORT_LABELS):
+    """
+    Returns `(sort, label, query string)` triples for the sort choices of a listing, the
+    query strings keeping `params` (a list of `(name, value)` pairs such as the tool filters).
+    """
+    return [(sort, label, urlencode(params + [('sort', sort)])) for sort, label in labels.items()]
+
+
+def price_params(params):
+    """
+    Returns the non-empty price range parameters of a request as `(name, value)` pairs, for
+    the links that must keep them.
+    """
+    return [(name, params[name]) for name in ('min_price', 'max_price') if params.get(name)]
+
+
+def dump_cursor(payload):
+    return signing.dumps(payload, salt=CURSOR_SALT, compress=True)
+
+
+def load_cursor(token):
+    """
+    Returns the payload of a cursor token, or None if it was tampered with or is malformed.
+    """
+    try:
+        return signing.loads(token, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        return None
+
+
+class KeysetPage:
+    """
+    One page of results and the cursors leading to its neighbours.
+
+    Attributes:
+        object_list (list): The items of the page.
+        next_cursor (str): The token of the following page, or None on the last page.
+        previous_cursor (str): The token of the preceding page, or None on the first page.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class KeysetPaginator:
+    """
+    Seek pagination of a queryset over a unique ordering.
+
+    Instead of `OFFSET`, each page continues from the sort key of the last row of the
+    previous one: `WHERE (name, id) > (last name, last id) ORDER BY name, id LIMIT n + 1`.
+    With an index on the sort key every page costs the same, however deep, and rows
+    inserted meanwhile never shift pages. Cursors are signed, so clients cannot forge keys.
+
+    Parameters:
+        queryset (QuerySet): The rows to paginate.
+        ordering (tuple): Field names, optionally prefixed with "-", the last one unique.
+        page_size (int): The number of rows per page.
+    """
+
+    def __init__(self, queryset, ordering, page_size):
+        self.queryset = queryset
+        self.ordering = ordering
+        self.page_size = page_size
+        self.fields = [field.lstrip('-') for field in ordering]
+
+    def _seek(self, key, forward):
+        # (a, b, c) > (x, y, z)  <=>  a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        condition = Q()
+        equal = Q()
+        for field, direction, value in zip(self.fields, self.ordering, key):
+            ascending = not direction.startswith('-')
+            lookup = 'gt' if ascending == forward else 'lt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def _key(self, item):
+        return [getattr(item, field) for field in self.fields]
+
+    def _reversed_ordering(self):
+        return [field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering]
+
+    def page(self, cursor=None):
+        """
+        Returns the page designated by a cursor token, or the first page when the token is
+        missing or invalid.
+        """
+        payload = load_cursor(cursor) if cursor else None
+        if not payload or payload.get('o') != list(self.ordering) or len(payload.get('k', ())) != len(self.fields):
+            payload = None
+        forward = payload is None or payload['d'] == 'next'
+        queryset = self.queryset.order_by(*(self.ordering if forward else self._reversed_ordering()))
+        if payload:
+            queryset = queryset.filter(self._seek(payload['k'], forward))
+        rows = list(queryset[:self.page_size + 1])
+        more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if not forward:
+            rows.reverse()
+        if not rows:
+            return KeysetPage([])
+        has_next = more if forward else True
+        has_previous = payload is not None if forward else more
+        return KeysetPage(
+            rows,
+            self._cursor(rows[-1], 'next') if has_next else None,
+            self._cursor(rows[0], 'prev') if has_previous else None,
+        )
+
+    def _cursor(self, item, direction):
+        return dump_cursor({'o': list(self.ordering), 'k': self._key(item), 'd': direction})
+
+
+class IdListPaginator:
+    """
+    Cursor pagination of an already ordered list of IDs, such as cached search results.
+
+    The cursor holds the ID the page continues from, which is located again in the list,
+    so a page does not repeat or skip results when the list is rebuilt between requests.
+    When that ID has dropped out of the rebuilt list, the page resumes at the position the
+    ID had, which at worst repeats or skips the results that moved across it.
+    """
+
+    def __init__(self, ids, page_size):
+        self.ids = ids
+        self.page_size = page_size
+
+    def page(self, cursor=None):
+        payload = load_cursor(cursor) if cursor else None
+        start = 0
+        if payload and 'i' in payload:
+            forward = payload.get('d') == 'next'
+            if payload['i'] in self.ids:
+                position = self.ids.index(payload['i'])
+                start = position + 1 if forward else max(position - self.page_size, 0)
+            elif isinstance(payload.get('p'), int):
+                # The results after the missing ID moved up one place, into its position.
+                position = min(max(payload['p'], 0), len(self.ids))
+                start = position if forward else max(position - self.page_size, 0)
+        ids = self.ids[start:start + self.page_size]
+        if not ids:
+            return KeysetPage([])
+        end = start + len(ids)
+        return KeysetPage(
+            ids,
+            dump_cursor({'i': ids[-1], 'p': end - 1, 'd': 'next'}) if end < len(self.ids) else None,
+            dump_cursor({'i': ids[0], 'p': start, 'd': 'prev'}) if start > 0 else None,
+        )
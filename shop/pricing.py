@@ -0,0 +1,103 @@
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.db.models import F, Sum, Window
+
+from .models import ShoppingCartProduct, vat_percent
+
+
+class CartTotals(NamedTuple):
+    """
+    Totals of a cart, in ISK.
+    """
+
+    net: Decimal
+    vat: Decimal
+    gross: Decimal
+
+
+def cents_to_decimal(cents):
+    return (Decimal(cents or 0) / 100).quantize(Decimal('0.01'))
+
+
+def priced_cart_lines(cart):
+    """
+    Returns the lines of a cart annotated with integer-cent prices, plus the cart totals
+    computed by window functions in the same query:
+
+        - vat_percent: The VAT rate as a whole percentage.
+        - unit_net_cents, unit_vat_cents: The price of one item.
+        - line_net_cents, line_vat_cents: The price of the line (unit price times quantity).
+        - cart_net_cents, cart_vat_cents: The sums over the whole cart, repeated on every row.
+    """
+    unit_net = F('product__netto_price') * 100
+    unit_vat = F('product__gross_price_cents') - unit_net
+    return (
+        ShoppingCartProduct.objects.filter(shopping_cart=cart)
+        .select_related('product__primary_picture')
+        .annotate(
+            vat_percent=vat_percent('product__'),
+            unit_net_cents=unit_net,
+            unit_vat_cents=unit_vat,
+            line_net_cents=F('quantity') * unit_net,
+            line_vat_cents=F('quantity') * unit_vat,
+            cart_net_cents=Window(Sum(F('quantity') * unit_net)),
+            cart_vat_cents=Window(Sum(F('quantity') * unit_vat)),
+        )
+        .order_by('pk')
+    )
+
+
+def cart_summary(cart):
+    """
+    Loads the lines of a cart with their prices and the cart totals in a single query.
+
+    Every line gets `unit_price` and `line_total` attributes with the gross amounts as
+    `Decimal`.
+
+    Returns:
+        tuple: The list of lines and a `CartTotals`.
+    """
+    lines = list(priced_cart_lines(cart))
+    for line in lines:
+        line.unit_price = cents_to_decimal(line.unit_net_cents + line.unit_vat_cents)
+        line.line_total = cents_to_decimal(line.line_net_cents + line.line_vat_cents)
+    if not lines:
+        return lines, CartTotals(Decimal('0.00'), Decimal('0.00'), Decimal('0.00'))
+    net, vat = lines[0].cart_net_cents, lines[0].cart_vat_cents
+    return lines, CartTotals(cents_to_decimal(net), cents_to_decimal(vat), cents_to_decimal(net + vat))
+
+
+def parse_price(value):
+    """
+    Converts a price typed by a customer ("1500", "1499.90") to cents, or None if invalid.
+    """
+    try:
+        price = Decimal(value.strip().replace(',', '.'))
+    except (AttributeError, ArithmeticError):
+        return None
+    if not price.is_finite() or price < 0:
+        return None
+    return int((price * 100).to_integral_value())
+
+
+def price_range(params):
+    """
+    Reads the `min_price` and `max_price` query parameters (gross prices in ISK).
+
+    Returns:
+        tuple: `(min_cents, max_cents)`, either of them None when missing or invalid.
+    """
+    return parse_price(params.get('min_price', '')), parse_price(params.get('max_price', ''))
+
+
+def filter_price_range(queryset, price_range):
+    """
+    Restricts products to a gross price range, using the indexed `gross_price_cents` column.
+    """
+    min_cents, max_cents = price_range
+    if min_cents is not None:
+        queryset = queryset.filter(gross_price_cents__gte=min_cents)
+    if max_cents is not None:
+        queryset = queryset.filter(gross_price_cents__lte=max_cents)
+    return queryset
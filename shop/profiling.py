@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile-Request'
+PROFILE_FORMATS = ('speedscope', 'collapsed')
+_TOKEN_SALT = 'shop.profiling'
+_FILENAME_RE = re.compile(r'[^A-Za-z0-9_.-]+')
+
+# Where a sample's time goes, judged by the innermost frame of a known layer: database
+# access and query compilation, template rendering, or anything else.
+_LAYERS = (
+    ('orm', (f'{os.sep}django{os.sep}db{os.sep}',)),
+    ('template', (f'{os.sep}django{os.sep}template{os.sep}', f'{os.sep}django{os.sep}templatetags{os.sep}')),
+)
+
+
+def profile_token(path):
+    """
+    Returns a signed token enabling the profiler for the requests to `path` sending it in
+    the `X-Profile-Request` header, valid for `PROFILE_TOKEN_MAX_AGE` seconds. Binding the
+    token to one path keeps a leaked token from profiling the rest of the site.
+    """
+    return signing.TimestampSigner(salt=_TOKEN_SALT).sign(f'profile:{path}')
+
+
+def valid_profile_token(token, path):
+    max_age = getattr(settings, 'PROFILE_TOKEN_MAX_AGE', 300)
+    try:
+        return signing.TimestampSigner(salt=_TOKEN_SALT).unsign(token, max_age=max_age) == f'profile:{path}'
+    except signing.BadSignature:
+        return False
+
+
+def code_name(code):
+    # `co_qualname` ("View.get" rather than "get") is only there from Python 3.11.
+    return getattr(code, 'co_qualname', code.co_name)
+
+
+def layer_of(stack):
+    """
+    Classifies a sampled stack, given innermost frame first, as "orm", "template" or "python".
+    """
+    for code in stack:
+        for layer, markers in _LAYERS:
+            if any(marker in code.co_filename for marker in markers):
+                return layer
+    return 'python'
+
+
+class StackSampler:
+    """
+    Samples the Python stack of one thread from a background thread.
+
+    Every `interval` seconds the sampler reads the stack of the profiled thread, up to but
+    excluding `root_frame`, and weighs it by the time elapsed since the previous sample.
+    The interval is a lower bound: the sampler needs the GIL to read the stack, so under
+    load samples are about `sys.getswitchinterval()` apart.
+
+    Attributes:
+        samples (dict): Maps stacks (tuples of code objects, outermost first) to the total
+            time in milliseconds they were seen running.
+        layers (dict): The time in milliseconds spent in ORM, template and other Python code.
+        duration_ms (float): The wall-clock time between `start` and `stop`.
+    """
+
+    def __init__(self, interval=0.001, thread_id=None, root_frame=None):
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.root_frame = root_frame
+        self.samples = {}
+        self.layers = {'orm': 0.0, 'template': 0.0, 'python': 0.0}
+        self.duration_ms = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._started = self._last = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='shop-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            weight, self._last = (now - self._last) * 1000, now
+            stack = []
+            while frame is not None and frame is not self.root_frame:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            if stack:
+                self.layers[layer_of(stack)] += weight
+                key = tuple(reversed(stack))
+                self.samples[key] = self.samples.get(key, 0.0) + weight
+
+    @property
+    def sampled_ms(self):
+        return sum(self.layers.values())
+
+    def layer_summary(self):
+        total = self.sampled_ms or 1.0
+        return ', '.join(f'{layer} {ms / total:.0%}' for layer, ms in self.layers.items())
+
+
+def _frame_name(code):
+    return f'{code_name(code)} ({Path(code.co_filename).name}:{code.co_firstlineno})'
+
+
+def collapsed_stacks(sampler):
+    """
+    Yields the samples in the collapsed-stack format of flamegraph.pl and speedscope:
+    one line per stack, frames separated by semicolons, followed by its weight in
+    microseconds.
+    """
+    for stack, weight in sampler.samples.items():
+        yield ';'.join(_frame_name(code) for code in stack) + f' {round(weight * 1000)}\n'
+
+
+def speedscope_profile(sampler, name):
+    """
+    Returns the samples as a speedscope "sampled" profile (https://www.speedscope.app).
+    """
+    frames, indexes = [], {}
+    samples, weights = [], []
+    for stack, weight in sampler.samples.items():
+        sample = []
+        for code in stack:
+            index = indexes.get(code)
+            if index is None:
+                index = indexes[code] = len(frames)
+                frames.append({'name': code_name(code), 'file': code.co_filename, 'line': code.co_firstlineno})
+            sample.append(index)
+        samples.append(sample)
+        weights.append(round(weight, 3))
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'shop.profiling',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': round(sampler.sampled_ms, 3),
+            'samples': samples,
+            'weights': weights,
+        }],
+    }
+
+
+def write_profile(sampler, view, request, directory=None, format='speedscope'):
+    """
+    Writes the profile of one request to `PROFILE_DIR` and returns the file path. The
+    file name carries the time, the view name and the process ID; the speedscope profile
+    name also carries the URL and the ORM/template/Python split.
+    """
+    directory = Path(directory or getattr(settings, 'PROFILE_DIR', settings.BASE_DIR / 'logs' / 'profiles'))
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = timezone.now().strftime('%Y%m%dT%H%M%S.%f')
+    extension = 'speedscope.json' if format == 'speedscope' else 'collapsed.txt'
+    path = directory / f'{stamp}-{_FILENAME_RE.sub("_", view)}-{os.getpid()}.{extension}'
+    name = (
+        f'{view} {request.method} {request.get_full_path()} '
+        f'{sampler.duration_ms:.1f} ms ({sampler.layer_summary()})'
+    )
+    with open(path, 'w', encoding='utf-8') as file:
+        if format == 'speedscope':
+            json.dump(speedscope_profile(sampler, name), file)
+        else:
+            file.writelines(collapsed_stacks(sampler))
+    return path
+
+
+class ProfilingMiddleware:
+    """
+    Profiles single requests with a stack sampler and writes one profile file per request.
+
+    A request is profiled when it sends a valid signed token for its path (`manage.py
+    profile_token <path>`) in the `X-Profile-Request` header and `PROFILE_SIGNED_REQUESTS` is on, or when it falls in
+    the `PROFILE_SAMPLE_RATE` fraction of traffic. Profiles go to `PROFILE_DIR` in the
+    `PROFILE_FORMAT` format ("speedscope" or "collapsed"), named after the view; the time
+    spent in the ORM, in templates and in other Python code is logged with the path.
+    Responses to signed requests carry the file name in an `X-Profile` header and the split
+    in `X-Profile-Layers`.
+
+    With both settings off (the default) the middleware removes itself from the stack at
+    startup, so it costs nothing.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0)
+        self.signed_requests = getattr(settings, 'PROFILE_SIGNED_REQUESTS', False)
+        if self.sample_rate <= 0 and not self.signed_requests:
+            raise MiddlewareNotUsed
+        self.interval = getattr(settings, 'PROFILE_INTERVAL_MS', 1) / 1000
+        self.format = getattr(settings, 'PROFILE_FORMAT', 'speedscope')
+        if self.format not in PROFILE_FORMATS:
+            raise ValueError(f'PROFILE_FORMAT must be one of {", ".join(PROFILE_FORMATS)}.')
+
+    def __call__(self, request):
+        token = request.headers.get(PROFILE_HEADER) if self.signed_requests else None
+        signed = token is not None and valid_profile_token(token, request.path)
+        if not signed and not (self.sample_rate > 0 and random.random() < self.sample_rate):
+            return self.get_response(request)
+
+        with StackSampler(self.interval, root_frame=sys._getframe()) as sampler:
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None and match.view_name else 'unresolved'
+        path = write_profile(sampler, view, request, format=self.format)
+        logger.info(
+            'Profiled %s %s (%s) in %.1f ms: %s. Written to %s',
+            request.method, request.get_full_path(), view, sampler.duration_ms, sampler.layer_summary(), path,
+        )
+        if signed:
+            response['X-Profile'] = path.name
+            response['X-Profile-Layers'] = sampler.layer_summary()
+        return response
@@ -0,0 +1,243 @@
+import logging
+import re
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.template.base import TokenType
+
+logger = logging.getLogger(__name__)
+
+_SHOP_DIR = str(Path(__file__).resolve().parent)
+# Middleware modules on the stack of every query, never the call site itself.
+_INSTRUMENTATION_FILES = ('query_budget.py', 'query_log.py')
+_IN_LIST_RE = re.compile(r'\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)')
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACE_RE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    Raised at the end of a request that ran more queries than its view's budget, when
+    `QUERY_BUDGET_MODE` is "raise" (as in the tests).
+    """
+
+
+class QueryBudget:
+    """
+    The maximum number of SQL queries and total database time of one request to a view.
+
+    Attributes:
+        max_queries (int): The query limit, or None for no limit.
+        max_time_ms (float): The database time limit in milliseconds, or None for no limit.
+        max_queries_per_chunk (int): Queries allowed on top of `max_queries` for every chunk of
+            a streaming response, or None.
+    """
+
+    def __init__(self, max_queries=None, max_time_ms=None, max_queries_per_chunk=None):
+        self.max_queries = max_queries
+        self.max_time_ms = max_time_ms
+        self.max_queries_per_chunk = max_queries_per_chunk
+
+    def __str__(self):
+        limits = [f'{self.max_queries} queries' if self.max_queries is not None else None,
+                  f'{self.max_queries_per_chunk} per chunk' if self.max_queries_per_chunk is not None else None,
+                  f'{self.max_time_ms:g} ms' if self.max_time_ms is not None else None]
+        return ', '.join(limit for limit in limits if limit) or 'unlimited'
+
+    def query_limit(self, chunks=0):
+        if self.max_queries is None:
+            return None
+        return self.max_queries + (self.max_queries_per_chunk or 0) * chunks
+
+
+def query_budget(max_queries=None, max_time_ms=None, max_queries_per_chunk=None):
+    """
+    Declares the query budget of a view function or class-based view:
+
+        @query_budget(max_queries=6, max_time_ms=100)
+        class CategoryView(View):
+            ...
+
+    Streaming views whose length depends on the data declare `max_queries_per_chunk`, the
+    queries allowed for every chunk they stream; their budget is checked once the stream
+    ends. A `QUERY_BUDGETS` setting mapping URL names to `(max_queries, max_time_ms)`, or
+    `(max_queries, max_time_ms, max_queries_per_chunk)`, overrides the declared budgets, so
+    they can be tuned per deployment.
+    """
+    def decorate(view):
+        view.query_budget = QueryBudget(max_queries, max_time_ms, max_queries_per_chunk)
+        return view
+    return decorate
+
+
+def budget_for(request):
+    """
+    Returns the budget of the view that handled the request, or None.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    overrides = getattr(settings, 'QUERY_BUDGETS', {})
+    if match.url_name in overrides:
+        return QueryBudget(*overrides[match.url_name])
+    view = match.func
+    return getattr(view, 'query_budget', None) or getattr(getattr(view, 'view_class', None), 'query_budget', None)
+
+
+def fingerprint(sql):
+    """
+    Normalizes a query so repetitions with different parameters compare equal: literals
+    become `?` and `IN` lists of any length become `IN (...)`.
+    """
+    sql = _LITERAL_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def query_origin():
+    """
+    Describes what issued the query being executed: the innermost template node being
+    rendered ("shop/category_view.html:12 {{ product.picture_set.first }}") and the
+    innermost frame of the shop's own code.
+    """
+    template = code = None
+    frame = sys._getframe(2)
+    while frame is not None and not (template and code):
+        if template is None and frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            token = getattr(node, 'token', None)
+            origin = getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                tag = '{{ %s }}' if token.token_type == TokenType.VAR else '{%% %s %%}'
+                template = f'{origin.template_name}:{token.lineno} ' + tag % token.contents
+        filename = frame.f_code.co_filename
+        if code is None and filename.startswith(_SHOP_DIR) and not filename.endswith(_INSTRUMENTATION_FILES):
+            code = f'{Path(filename).relative_to(Path(_SHOP_DIR).parent)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return template, code
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper recording the SQL and duration of every query of a request,
+    and optionally where it was issued from.
+    """
+
+    def __init__(self, capture_origins=False):
+        self.capture_origins = capture_origins
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        origin = query_origin() if self.capture_origins else None
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, (time.perf_counter() - start) * 1000, origin))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def time_ms(self):
+        return sum(duration for _, duration, _ in self.queries)
+
+    def repeated(self, limit=5):
+        """
+        Returns the most repeated query fingerprints as `(fingerprint, count, origin)`, the
+        origin being the first place the query was issued from.
+        """
+        counts = Counter()
+        origins = {}
+        for sql, _, origin in self.queries:
+            key = fingerprint(sql)
+            counts[key] += 1
+            origins.setdefault(key, origin)
+        return [(key, count, origins[key]) for key, count in counts.most_common(limit)]
+
+
+def budget_report(request, budget, recorder, chunks=None):
+    streamed = f' streaming {chunks} chunks' if chunks is not None else ''
+    lines = [
+        f'{request.method} {request.path} ran {recorder.count} queries in {recorder.time_ms:.1f} ms{streamed}, '
+        f'over its budget of {budget}.'
+    ]
+    for key, count, origin in recorder.repeated():
+        lines.append(f'  {count}x {key}')
+        for place in origin or ():
+            if place:
+                lines.append(f'      from {place}')
+    return '\n'.join(lines)
+
+
+class QueryBudgetMiddleware:
+    """
+    Checks every request against the query budget of its view.
+
+    `QUERY_BUDGET_MODE` selects what happens when the number of queries goes over budget:
+    "raise" raises `QueryBudgetExceeded` (the test suite uses it, so a new N+1 query fails
+    the test that renders the page), "log" (the default) logs a warning with the most
+    repeated query fingerprints, and "off" disables the middleware. Going over the time
+    budget is only logged, since timings are not reproducible enough to fail tests on.
+
+    The place each query came from, the template line and the shop code line, is captured
+    when `DEBUG` is on or in "raise" mode; walking the stack per query is too costly for
+    production, where the report lists the fingerprints alone. With `DEBUG` on, responses
+    also carry `X-Query-Count`, `X-Query-Time-Ms` and `X-Query-Budget` headers.
+
+    The queries of a streaming response run while it is sent, after the view returned, so
+    they are recorded until the stream ends and checked then; the headers only count the
+    queries of the view itself.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.mode = getattr(settings, 'QUERY_BUDGET_MODE', 'log')
+        if self.mode == 'off':
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        mode = getattr(settings, 'QUERY_BUDGET_MODE', self.mode)
+        if mode == 'off':
+            return self.get_response(request)
+        recorder = QueryRecorder(capture_origins=settings.DEBUG or mode == 'raise')
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        budget = budget_for(request)
+        if settings.DEBUG:
+            response['X-Query-Count'] = str(recorder.count)
+            response['X-Query-Time-Ms'] = f'{recorder.time_ms:.1f}'
+            if budget is not None:
+                response['X-Query-Budget'] = str(budget)
+        if budget is None:
+            return response
+        if response.streaming:
+            response.streaming_content = self.record_stream(request, response.streaming_content, budget, recorder, mode)
+        else:
+            self.check(request, budget, recorder, mode)
+        return response
+
+    def record_stream(self, request, content, budget, recorder, mode):
+        chunks = 0
+        with connection.execute_wrapper(recorder):
+            for chunk in content:
+                chunks += 1
+                yield chunk
+        self.check(request, budget, recorder, mode, chunks)
+
+    def check(self, request, budget, recorder, mode, chunks=None):
+        limit = budget.query_limit(chunks or 0)
+        over_count = limit is not None and recorder.count > limit
+        over_time = budget.max_time_ms is not None and recorder.time_ms > budget.max_time_ms
+        if over_count or over_time:
+            report = budget_report(request, budget, recorder, chunks)
+            if over_count and mode == 'raise':
+                raise QueryBudgetExceeded(report)
+            logger.warning(report)
@@ -0,0 +1,242 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import random
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils import timezone
+
+from .query_budget import QueryRecorder, fingerprint
+
+
+def query_log_path():
+    return str(getattr(settings, 'QUERY_LOG_PATH', settings.BASE_DIR / 'logs' / 'query_log.jsonl'))
+
+
+def process_log_path(path, pid):
+    """
+    Returns the file of one process: `query_log.jsonl` becomes `query_log.<pid>.jsonl`.
+    """
+    root, extension = os.path.splitext(path)
+    return f'{root}.{pid}{extension}'
+
+
+def prune_query_logs(path=None, max_age_days=None):
+    """
+    Deletes the files of other processes, and rotated backups, not written to for
+    `QUERY_LOG_MAX_AGE_DAYS` days. Returns the names deleted.
+
+    Worker restarts keep adding files under new process IDs, so only pruning bounds their
+    number, to the restarts of that many days.
+    """
+    path = path or query_log_path()
+    if max_age_days is None:
+        max_age_days = getattr(settings, 'QUERY_LOG_MAX_AGE_DAYS', 7)
+    cutoff = time.time() - max_age_days * 86400
+    own = process_log_path(path, os.getpid())
+    root, extension = os.path.splitext(path)
+    deleted = []
+    for name in glob.glob(f'{glob.escape(root)}.*{glob.escape(extension)}*'):
+        if name == own or name.startswith(f'{own}.'):
+            continue
+        try:
+            if os.path.getmtime(name) < cutoff:
+                os.remove(name)
+                deleted.append(name)
+        except FileNotFoundError:
+            # Pruned by another process in the meantime.
+            continue
+    return deleted
+
+
+class QueryStats:
+    """
+    Aggregates of one query fingerprint in one view.
+
+    Attributes:
+        count (int): The number of executions.
+        total_ms (float): Their total duration.
+        max_ms (float): The duration of the slowest one.
+        template (str): The template line that issued the slowest execution, if any.
+        code (str): The shop code line that issued the slowest execution.
+        sql (str): The SQL of the slowest execution, with its placeholders.
+    """
+
+    __slots__ = ('count', 'total_ms', 'max_ms', 'template', 'code', 'sql')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.template = self.code = self.sql = None
+
+    def add(self, sql, duration_ms, origin):
+        self.count += 1
+        self.total_ms += duration_ms
+        if duration_ms >= self.max_ms:
+            self.max_ms = duration_ms
+            self.template, self.code = origin or (None, None)
+            self.sql = sql
+
+
+class QueryLog:
+    """
+    Per-process aggregates of the queries of sampled requests, keyed by view and query
+    fingerprint, flushed as JSON lines to a size-rotated file.
+
+    Each flush writes one line per `(view, fingerprint)` seen since the previous flush, then
+    starts over, so a report sums the lines of the files and their backups.
+
+    Every process writes and rotates its own file, named after its process ID (see
+    `process_log_path`): several processes rotating one shared file race each other and
+    lose or interleave lines. Files of processes gone for `QUERY_LOG_MAX_AGE_DAYS` are
+    deleted when a process opens its file and by the report (see `prune_query_logs`); a
+    process whose own file was pruned while it was idle opens a new one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._requests = {}
+        self._started = time.time()
+        self._last_flush = time.monotonic()
+        self._writer = self._writer_path = None
+
+    def record(self, view, recorder, min_ms=0.0):
+        with self._lock:
+            self._requests[view] = self._requests.get(view, 0) + 1
+            for sql, duration_ms, origin in recorder.queries:
+                if duration_ms < min_ms:
+                    continue
+                key = (view, fingerprint(sql))
+                stats = self._stats.get(key)
+                if stats is None:
+                    stats = self._stats[key] = QueryStats()
+                stats.add(sql, duration_ms, origin)
+
+    def flush_due(self, interval):
+        return time.monotonic() - self._last_flush >= interval
+
+    def _get_writer(self):
+        # Checked on every flush, since a worker forked after the first flush gets a new ID.
+        path = process_log_path(query_log_path(), os.getpid())
+        if self._writer_path != path or not os.path.exists(path):
+            if self._writer is not None:
+                for handler in self._writer.handlers:
+                    handler.close()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            prune_query_logs()
+            handler = RotatingFileHandler(
+                path,
+                maxBytes=getattr(settings, 'QUERY_LOG_MAX_BYTES', 10 * 2 ** 20),
+                backupCount=getattr(settings, 'QUERY_LOG_BACKUP_COUNT', 5),
+                encoding='utf-8',
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            writer = logging.Logger('shop.query_log.file')
+            writer.addHandler(handler)
+            self._writer, self._writer_path = writer, path
+        return self._writer
+
+    def flush(self):
+        """
+        Appends the aggregates to the log file and resets them. Returns the number of lines.
+        """
+        with self._lock:
+            stats, requests, started = self._stats, self._requests, self._started
+            self._stats, self._requests, self._started = {}, {}, time.time()
+            self._last_flush = time.monotonic()
+        if not stats:
+            return 0
+        writer = self._get_writer()
+        header = {
+            'flushed_at': timezone.now().isoformat(timespec='seconds'),
+            'period_s': round(time.time() - started, 1),
+            'pid': os.getpid(),
+        }
+        for (view, key), item in stats.items():
+            writer.info(json.dumps({
+                **header,
+                'view': view,
+                'sampled_requests': requests.get(view, 0),
+                'fingerprint': key,
+                'count': item.count,
+                'total_ms': round(item.total_ms, 3),
+                'max_ms': round(item.max_ms, 3),
+                'template': item.template,
+                'code': item.code,
+                'sql': item.sql,
+            }))
+        return len(stats)
+
+    def clear(self):
+        with self._lock:
+            self._stats, self._requests = {}, {}
+
+
+query_log = QueryLog()
+atexit.register(query_log.flush)
+
+
+class QueryLogMiddleware:
+    """
+    Samples requests and aggregates the SQL they run per view and query fingerprint, with
+    the template line and shop code line of the slowest execution of each fingerprint.
+
+    `QUERY_LOG_SAMPLE_RATE` is the fraction of requests recorded; at 0 (the default) the
+    middleware removes itself from the stack at startup, so it costs nothing. Unsampled
+    requests only cost one random number. Queries faster than `QUERY_LOG_MIN_MS` are left
+    out. The aggregates are written to `QUERY_LOG_PATH` every `QUERY_LOG_FLUSH_SECONDS`
+    (checked at the end of sampled requests) and at exit, one file per process;
+    `manage.py query_log_report` summarizes the files and their rotated backups.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'QUERY_LOG_SAMPLE_RATE', 0)
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+        self.min_ms = getattr(settings, 'QUERY_LOG_MIN_MS', 0)
+        self.flush_interval = getattr(settings, 'QUERY_LOG_FLUSH_SECONDS', 60)
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        recorder = QueryRecorder(capture_origins=True)
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None and match.view_name else 'unresolved'
+        query_log.record(view, recorder, self.min_ms)
+        if query_log.flush_due(self.flush_interval):
+            query_log.flush()
+        return response
+
+
+def read_query_log(path=None):
+    """
+    Yields the entries of the query log files of every process and their rotated backups,
+    oldest first within each process.
+    """
+    path = path or query_log_path()
+    backups = getattr(settings, 'QUERY_LOG_BACKUP_COUNT', 5)
+    root, extension = os.path.splitext(path)
+    names = []
+    for current in sorted(glob.glob(f'{glob.escape(root)}.*{glob.escape(extension)}')):
+        names += [f'{current}.{n}' for n in range(backups, 0, -1)] + [current]
+    for name in names:
+        if not os.path.exists(name):
+            continue
+        with open(name, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
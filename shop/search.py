@@ -0,0 +1,227 @@
+import math
+import re
+import unicodedata
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Value
+
+from .models import Product, SearchIndexEntry
+
+FIELD_WEIGHTS = {
+    'name': 4,
+    'tools': 2,
+    'category': 2,
+    'description': 1,
+}
+
+STOP_WORDS = frozenset({
+    'a', 'an', 'and', 'for', 'in', 'of', 'on', 'or', 'the', 'to', 'with',
+})
+
+MAX_TERM_LENGTH = SearchIndexEntry._meta.get_field('term').max_length
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+# Letters that have no Unicode decomposition into a base letter and an accent.
+_FOLD_TABLE = str.maketrans({'ł': 'l', 'ø': 'o', 'đ': 'd', 'ß': 'ss', 'æ': 'ae', 'œ': 'oe'})
+
+
+def fold(text):
+    """
+    Lowercases the text and strips accents ("Śrubokręt" -> "srubokret").
+    """
+    decomposed = unicodedata.normalize('NFKD', text.lower().translate(_FOLD_TABLE))
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def stem(word):
+    """
+    Light English suffix stripping, so "hammers" and "hammer" share a term.
+    """
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith('sses'):
+        return word[:-2]
+    if word.endswith(('ches', 'shes', 'xes', 'zes')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    if word.endswith('ing') and len(word) > 5:
+        return word[:-3]
+    if word.endswith('ed') and len(word) > 4:
+        return word[:-2]
+    return word
+
+
+def tokenize(text):
+    """
+    Splits text into normalized, stemmed search terms.
+    """
+    return [
+        stem(word)[:MAX_TERM_LENGTH]
+        for word in _WORD_RE.findall(fold(text or ''))
+        if word not in STOP_WORDS
+    ]
+
+
+def document_terms(product):
+    """
+    Returns the weighted terms of a product. Expects `category` and `tool` to be loaded.
+    """
+    return weighted_terms({
+        'name': [product.name],
+        'tools': [tool.name for tool in product.tool.all()],
+        'category': [product.category.name],
+        'description': [product.category.description],
+    })
+
+
+def weighted_terms(fields):
+    """
+    Returns the weighted terms of a document given as a mapping of field name to texts.
+    """
+    weights = Counter()
+    for field, texts in fields.items():
+        for text in texts:
+            for term in tokenize(text):
+                weights[term] += FIELD_WEIGHTS[field]
+    return weights
+
+
+def index_products(product_ids, chunk_size=500):
+    """
+    Rebuilds the search index entries of the given products.
+    """
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), chunk_size):
+        chunk = product_ids[start:start + chunk_size]
+        products = Product.objects.filter(pk__in=chunk).select_related('category').prefetch_related('tool')
+        entries = [
+            SearchIndexEntry(term=term, product=product, weight=weight)
+            for product in products
+            for term, weight in document_terms(product).items()
+        ]
+        with transaction.atomic():
+            SearchIndexEntry.objects.filter(product_id__in=chunk).delete()
+            SearchIndexEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+def rebuild_index(chunk_size=500):
+    """
+    Rebuilds the whole search index.
+    """
+    SearchIndexEntry.objects.all().delete()
+    product_ids = Product.objects.order_by('pk').values_list('pk', flat=True)
+    batch = []
+    for product_id in product_ids.iterator(chunk_size=chunk_size):
+        batch.append(product_id)
+        if len(batch) == chunk_size:
+            index_products(batch, chunk_size)
+            batch = []
+    index_products(batch, chunk_size)
+
+
+def search(query):
+    """
+    Returns the products matching every term of the query, most relevant first.
+
+    The relevance score is the sum of each matched term's weight multiplied by its inverse
+    document frequency, so rare words count more than words found on most products.
+    """
+    return search_terms(tokenize(query))
+
+
+def search_terms(terms, limit=None):
+    """
+    Same as `search`, for an already tokenized query.
+    """
+    product_ids = rank_products(terms, limit)
+    products = Product.objects.in_bulk(product_ids)
+    return [products[pk] for pk in product_ids if pk in products]
+
+
+def document_frequencies(terms):
+    """
+    Returns the number of products containing each of the terms found in the index.
+
+    Counts are cached for a few minutes: they are only used for IDF, and the most common
+    terms would otherwise cost a scan of most of the index on every search.
+    """
+    keys = {term: f'shop:search:df:{term}' for term in terms}
+    cached = cache.get_many(keys.values())
+    frequencies = {term: cached[key] for term, key in keys.items() if key in cached}
+    missing = [term for term in terms if term not in frequencies]
+    if missing:
+        counted = dict(
+            SearchIndexEntry.objects.filter(term__in=missing)
+            .values('term')
+            .annotate(documents=Count('product', distinct=True))
+            .values_list('term', 'documents')
+        )
+        # Unknown terms are not cached, so a product indexed a moment later is found at once.
+        cache.set_many({keys[term]: documents for term, documents in counted.items()}, 300)
+        frequencies.update(counted)
+    return frequencies
+
+
+def rank_products(terms, limit=None, max_candidates=None):
+    """
+    Returns the IDs of the products containing every term, most relevant first.
+
+    Only the `max_candidates` products (`SEARCH_MAX_CANDIDATES`, at least `limit`) where the
+    rarest term weighs most are ranked, read in that order from the term and weight index,
+    and their scores are summed over the index entries alone. A query therefore reads a
+    bounded number of entries per term however common its words are. When the rarest term
+    is on more products, those where it weighs least are left out: one-term queries are
+    unaffected, broader ones may return fewer matches than exist.
+    """
+    terms = list(dict.fromkeys(terms))
+    if not terms:
+        return []
+    if max_candidates is None:
+        max_candidates = getattr(settings, 'SEARCH_MAX_CANDIDATES', 2000)
+    max_candidates = max(max_candidates, limit or 0)
+
+    if len(terms) == 1:
+        # The score is the weight times a constant, so the candidates are already ranked.
+        candidates = SearchIndexEntry.objects.filter(term=terms[0]).order_by('-weight', 'product_id')
+        return list(candidates.values_list('product_id', flat=True)[:limit or max_candidates])
+
+    frequencies = document_frequencies(terms)
+    if len(frequencies) < len(terms):
+        return []
+
+    # Only used for IDF, so a few minutes old count is fine and saves a full count per query.
+    total = max(cache.get_or_set('shop:search:documents', Product.objects.count, 300), 1)
+    rarest = min(terms, key=frequencies.get)
+    others = [term for term in terms if term != rarest]
+    candidates = (
+        SearchIndexEntry.objects.filter(term=rarest)
+        .order_by('-weight', 'product_id')
+        .values('product_id')[:max_candidates]
+    )
+    # The other terms' weights are looked up by term and product for each candidate, so
+    # the work does not depend on how the database estimates the terms' frequencies.
+    weights = {
+        f'weight_{position}': Subquery(
+            SearchIndexEntry.objects.filter(term=term, product_id=OuterRef('product_id')).values('weight')[:1]
+        )
+        for position, term in enumerate(others)
+    }
+    score = F('weight') * Value(math.log(1 + total / max(frequencies[rarest], 1)))
+    for name, term in zip(weights, others):
+        score += F(name) * Value(math.log(1 + total / max(frequencies[term], 1)))
+    ranked = (
+        SearchIndexEntry.objects.filter(term=rarest, product_id__in=candidates)
+        .alias(**weights)
+        .filter(**{f'{name}__isnull': False for name in weights})
+        .annotate(score=ExpressionWrapper(score, output_field=FloatField()))
+        .order_by('-score', 'product_id')
+        .values_list('product_id', flat=True)
+    )
+    return list(ranked if limit is None else ranked[:limit])
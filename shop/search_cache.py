@@ -0,0 +1,150 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .cache import CATALOG_NAMESPACE, get_version
+from .fuzzy import fuzzy_matcher
+from .models import SearchQueryStat
+from .search import fold, rank_products, tokenize
+
+logger = logging.getLogger(__name__)
+
+MAX_QUERY_LENGTH = SearchQueryStat._meta.get_field('query').max_length
+
+
+def normalize_query(query):
+    """
+    Lowercases, accent-folds and collapses the whitespace of a query, so "  Młotek " and
+    "mlotek" share a cache entry.
+    """
+    return ' '.join(fold(query).split())[:MAX_QUERY_LENGTH]
+
+
+class SearchResult:
+    """
+    The cached outcome of a search.
+
+    Attributes:
+        product_ids (list): The IDs of the matching products, most relevant first.
+        corrected (str): The typo-corrected query when the fuzzy fallback was used, else None.
+    """
+
+    def __init__(self, product_ids, corrected=None):
+        self.product_ids = product_ids
+        self.corrected = corrected
+
+
+def run_search(query):
+    """
+    Runs a search without the cache, falling back to typo correction when the exact
+    terms match fewer than `SEARCH_FUZZY_THRESHOLD` products.
+    """
+    limit = getattr(settings, 'SEARCH_CACHE_MAX_RESULTS', 1000)
+    terms = tokenize(query)
+    product_ids = rank_products(terms, limit)
+    if len(product_ids) < getattr(settings, 'SEARCH_FUZZY_THRESHOLD', 3):
+        corrected = fuzzy_matcher.correct(terms)
+        if corrected:
+            return SearchResult(rank_products(corrected, limit), ' '.join(corrected))
+    return SearchResult(product_ids)
+
+
+def cache_key(normalized, version):
+    digest = hashlib.md5(normalized.encode(), usedforsecurity=False).hexdigest()
+    return f'shop:search:{version}:{digest}'
+
+
+def cached_search(query, record=True):
+    """
+    Returns the `SearchResult` of a query, from the search cache when possible.
+
+    Entries are keyed by the normalized query and the catalog version, so any product,
+    category or tool change makes older entries unreachable; the cache backend then expires
+    them (TTL) or evicts them (LRU). The search is also counted in the query statistics.
+    """
+    normalized = normalize_query(query)
+    if record:
+        search_stats.record(normalized)
+    search_cache = caches['search']
+    key = cache_key(normalized, get_version(CATALOG_NAMESPACE))
+    result = search_cache.get(key)
+    if result is None:
+        result = run_search(normalized)
+        search_cache.set(key, result)
+    return result
+
+
+class SearchStatsRecorder:
+    """
+    Buffers per-query search counts in memory and writes them to `SearchQueryStat` every
+    `flush_interval` seconds from a background thread, so searches never wait for it.
+
+    A flush inserts the missing rows with no hits, ignoring conflicts on the unique query,
+    then increments every count with one `UPDATE ... SET hits = hits + CASE query ... END`
+    per batch of `batch_size` queries, so concurrent workers never lose counts.
+    """
+
+    def __init__(self, flush_interval=30, batch_size=500):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def record(self, normalized):
+        if not normalized:
+            return
+        self.start()
+        with self._lock:
+            self._counts[normalized] += 1
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        queries = sorted(counts)
+        now = timezone.now()
+        for start in range(0, len(queries), self.batch_size):
+            batch = queries[start:start + self.batch_size]
+            with transaction.atomic():
+                SearchQueryStat.objects.bulk_create(
+                    [SearchQueryStat(query=query, hits=0) for query in batch], ignore_conflicts=True
+                )
+                SearchQueryStat.objects.filter(query__in=batch).update(
+                    hits=F('hits') + Case(
+                        *[When(query=query, then=Value(counts[query])) for query in batch], default=Value(0)
+                    ),
+                    last_searched=now,
+                )
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='search-stats', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception("Could not save search statistics")
+
+
+search_stats = SearchStatsRecorder(flush_interval=getattr(settings, 'SEARCH_STATS_FLUSH_INTERVAL', 30))
@@ -0,0 +1,252 @@
+import io
+import random
+from bisect import bisect
+from collections import Counter
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.db import connection, models, transaction
+from django.utils.text import slugify
+
+from .models import (
+    Address, Category, MediaBlob, Picture, Product, ShoppingCart, ShoppingCartProduct, Tool, acquire_blob,
+    vat_percent_of,
+)
+from .storage import get_picture_storage
+
+User = get_user_model()
+
+ADJECTIVES = (
+    'Compact', 'Cordless', 'Heavy Duty', 'Industrial', 'Precision', 'Professional', 'Rugged', 'Ergonomic',
+    'Magnetic', 'Adjustable', 'Folding', 'Insulated', 'Telescopic', 'Quick Release', 'Stainless', 'Mini',
+)
+NOUNS = (
+    'Hammer', 'Drill', 'Saw', 'Wrench', 'Screwdriver', 'Pliers', 'Chisel', 'Sander', 'Grinder', 'Clamp',
+    'Level', 'Tape Measure', 'Utility Knife', 'Socket Set', 'Hex Key', 'Ladder', 'Workbench', 'Toolbox',
+    'Glue Gun', 'Heat Gun', 'Multimeter', 'Trowel', 'Shovel', 'Rake', 'Pruner',
+)
+DEPARTMENTS = (
+    'Hand Tools', 'Power Tools', 'Garden', 'Measuring', 'Fasteners', 'Safety', 'Storage', 'Painting',
+    'Plumbing', 'Electrical', 'Woodworking', 'Automotive',
+)
+CITIES = ('Reykjavik', 'Kopavogur', 'Hafnarfjordur', 'Akureyri', 'Gardabaer', 'Mosfellsbaer', 'Selfoss')
+STREETS = ('Laugavegur', 'Hverfisgata', 'Skolavordustigur', 'Borgartun', 'Sudurlandsbraut', 'Hringbraut')
+
+
+def zipf_weights(count, exponent=1.1):
+    """
+    Returns cumulative weights following a Zipf law: item `k` is picked about `1/k**s` as often
+    as the first one, which is how sales and category sizes usually spread.
+    """
+    return list(accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def insert_rows(model, fields, rows, batch_size=10000):
+    """
+    Inserts plain tuples with `executemany`, skipping model instantiation and SQL compilation
+    per row. Model defaults are not applied, so `fields` must cover every non-null column.
+    """
+    columns = [model._meta.get_field(field).column for field in fields]
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        connection.ops.quote_name(model._meta.db_table),
+        ', '.join(connection.ops.quote_name(column) for column in columns),
+        ', '.join(['%s'] * len(columns)),
+    )
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[start:start + batch_size])
+
+
+class CatalogSeeder:
+    """
+    Generates a deterministic synthetic shop with bulk inserts.
+
+    Every value comes from one `random.Random(seed)`, so the same options produce the same
+    data. Category sizes, tool popularity and the products put in carts follow Zipf laws;
+    picture counts, stock and quantities are skewed towards small numbers.
+
+    Products, their tool links and pictures, millions of rows, are inserted as plain tuples; the rest
+    with `bulk_create`. Model signals are bypassed, so the seeder also maintains what they
+    would: gross prices, primary pictures and media blob reference counts.
+    The search index is left to `rebuild_search_index`.
+
+    Parameters:
+        seed (int): The random seed; it is also part of every generated name, so datasets
+            with different seeds can live in the same database.
+        batch_size (int): Rows generated and inserted per transaction.
+        log (callable): Called with progress messages.
+    """
+
+    def __init__(self, seed=24, batch_size=10000, log=None):
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+
+    def _batches(self, count):
+        for start in range(0, count, self.batch_size):
+            yield start, min(self.batch_size, count - start)
+
+    def is_seeded(self):
+        return Category.objects.filter(slug__startswith=f'seed-{self.seed}-').exists()
+
+    def seed_categories(self, count):
+        categories = Category.objects.bulk_create([
+            Category(
+                name=f'{DEPARTMENTS[i % len(DEPARTMENTS)]} {i // len(DEPARTMENTS) + 1}',
+                slug=f'seed-{self.seed}-category-{i}',
+                description=f'{DEPARTMENTS[i % len(DEPARTMENTS)]} for home and trade.',
+            )
+            for i in range(count)
+        ])
+        self.log(f'{count} categories')
+        return [category.pk for category in categories]
+
+    def seed_tools(self, count):
+        tools = Tool.objects.bulk_create([
+            Tool(name=f'{self.random.choice(NOUNS)} {self.seed}-{i}') for i in range(count)
+        ], batch_size=self.batch_size)
+        self.log(f'{count} tools')
+        return [tool.pk for tool in tools]
+
+    def seed_products(self, count, category_ids, tool_ids, max_tools=6):
+        rnd = self.random
+        category_weights = zipf_weights(len(category_ids))
+        tool_weights = zipf_weights(len(tool_ids))
+        links = Product.tool.through
+        product_ids = []
+        fields = [
+            'name', 'slug', 'category', 'netto_price', 'vat', 'gross_price_cents', 'stock', 'reserved',
+            'height', 'length', 'width', 'weight',
+        ]
+        for start, size in self._batches(count):
+            rows = []
+            for i in range(start, start + size):
+                name = f'{rnd.choice(ADJECTIVES)} {rnd.choice(NOUNS)} {self.seed}-{i}'
+                netto_price = int(rnd.lognormvariate(8, 1.2))
+                vat = '0.24' if rnd.random() < 0.9 else '0.11'
+                rows.append((
+                    name,
+                    slugify(name),
+                    category_ids[bisect(category_weights, rnd.random() * category_weights[-1])],
+                    netto_price,
+                    vat,
+                    netto_price * 100 + netto_price * vat_percent_of(vat),
+                    0 if rnd.random() < 0.1 else int(rnd.expovariate(1 / 40)),
+                    0,
+                    rnd.randrange(1, 200),
+                    rnd.randrange(1, 200),
+                    rnd.randrange(1, 200),
+                    rnd.randrange(50, 50000),
+                ))
+            with transaction.atomic():
+                insert_rows(Product, fields, rows)
+                slugs = [row[1] for row in rows]
+                ids = dict(Product.objects.filter(slug__in=slugs).values_list('slug', 'pk'))
+                batch_ids = [ids[slug] for slug in slugs]
+                insert_rows(links, ['product', 'tool'], [
+                    (product_id, tool_id)
+                    for product_id in batch_ids
+                    for tool_id in {
+                        tool_ids[bisect(tool_weights, rnd.random() * tool_weights[-1])]
+                        for _ in range(rnd.randrange(max_tools + 1))
+                    }
+                ])
+            product_ids.extend(batch_ids)
+            self.log(f'{start + size} products')
+        return product_ids
+
+    def seed_pictures(self, product_ids, pool_size=20, max_pictures=4):
+        """
+        Stores `pool_size` small generated JPEGs and gives every product up to `max_pictures`
+        of them, so pages render real images while the files stay few.
+        """
+        if not pool_size:
+            return 0
+        from PIL import Image
+
+        storage = get_picture_storage()
+        pool = []
+        for i in range(pool_size):
+            buffer = io.BytesIO()
+            color = tuple(self.random.randrange(256) for _ in range(3))
+            Image.new('RGB', (640, 480), color).save(buffer, 'JPEG', quality=80)
+            pool.append(storage.save(f'images/seed-{self.seed}-{i}.jpg', ContentFile(buffer.getvalue())))
+
+        derivatives = Picture._meta.get_field('derivatives').get_db_prep_save({}, connection)
+        references = Counter()
+        total = 0
+        for start in range(0, len(product_ids), self.batch_size):
+            chunk = product_ids[start:start + self.batch_size]
+            rows = []
+            for product_id in chunk:
+                # Geometric: most products have one picture, a few have several, some none.
+                count = 0
+                while count < max_pictures and self.random.random() < 0.6:
+                    count += 1
+                for name in self.random.sample(pool, min(count, len(pool))):
+                    rows.append((product_id, name, derivatives))
+                    references[name] += 1
+            with transaction.atomic():
+                insert_rows(Picture, ['product', 'image', 'derivatives'], rows)
+                first_picture = Picture.objects.filter(product=models.OuterRef('pk')).order_by('pk').values('pk')[:1]
+                Product.objects.filter(pk__in=chunk).update(primary_picture=models.Subquery(first_picture))
+            total += len(rows)
+            self.log(f'{total} pictures')
+        for name, count in references.items():
+            acquire_blob(name, storage)
+            MediaBlob.objects.filter(name=name).update(refcount=models.F('refcount') + count - 1)
+        return total
+
+    def seed_customers(self, count, product_ids, cart_ratio=0.3, max_lines=8):
+        """
+        Creates users, each with one or two addresses. A share of them gets an active cart,
+        filled with products picked by popularity, and some also have past inactive carts.
+        All users share the password "seed" so load tests can log in.
+        """
+        rnd = self.random
+        password = make_password('seed')
+        product_weights = zipf_weights(len(product_ids)) if product_ids else []
+        lines_total = 0
+        for start, size in self._batches(count):
+            users = User.objects.bulk_create([
+                User(username=f'seed{self.seed}_user{i}', email=f'user{i}@seed{self.seed}.example', password=password)
+                for i in range(start, start + size)
+            ])
+            addresses = [
+                Address(
+                    user=user,
+                    name='Home' if n == 0 else 'Work',
+                    street=f'{rnd.choice(STREETS)} {rnd.randrange(1, 200)}',
+                    city=rnd.choice(CITIES),
+                    zipcode=str(rnd.randrange(101, 900)),
+                )
+                for user in users
+                for n in range(1 if rnd.random() < 0.7 else 2)
+            ]
+            carts = []
+            for user in users:
+                if product_ids and rnd.random() < cart_ratio:
+                    carts.append(ShoppingCart(user=user, active=True))
+                    carts.extend(ShoppingCart(user=user, active=False) for _ in range(int(rnd.expovariate(1))))
+            with transaction.atomic():
+                Address.objects.bulk_create(addresses)
+                ShoppingCart.objects.bulk_create(carts)
+                lines = []
+                for cart in carts:
+                    picked = {
+                        product_ids[bisect(product_weights, rnd.random() * product_weights[-1])]
+                        for _ in range(1 + int(rnd.expovariate(1 / 2)) % max_lines)
+                    }
+                    lines.extend(
+                        ShoppingCartProduct(
+                            shopping_cart=cart, product_id=product_id, quantity=1 + int(rnd.expovariate(1.5))
+                        )
+                        for product_id in picked
+                    )
+                ShoppingCartProduct.objects.bulk_create(lines)
+            lines_total += len(lines)
+            self.log(f'{start + size} users, {lines_total} cart lines')
+        return lines_total
@@ -0,0 +1,240 @@
+from django.db import transaction
+from django.core.signals import request_started
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .cache import CATALOG_NAMESPACE, bump_version
+from .facets import tool_index
+from .holds import hold_manager, release_deleted_hold
+from .images import derivative_workers
+from .models import (
+    Category, Picture, Product, ShoppingCartProduct, Tool, acquire_blob, derivative_names, refresh_primary_picture,
+    release_blob, release_blobs,
+)
+from .search import index_products
+from .my_contex_processor import category_cache
+from .page_cache import NAV_TAG, category_tag, invalidate_tags_on_commit, product_tag, tool_tag
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, **kwargs):
+    # After the commit, so no worker caches the old rows under the new version.
+    transaction.on_commit(category_cache.invalidate)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tool)
+@receiver(post_delete, sender=Tool)
+def bump_catalog_version(sender, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: bump_version(CATALOG_NAMESPACE))
+
+
+@receiver(m2m_changed, sender=Product.tool.through)
+def bump_catalog_version_on_tools_change(sender, action, **kwargs):
+    # Tool names are searchable, so cached results and vocabularies depend on the links.
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(lambda: bump_version(CATALOG_NAMESPACE))
+
+
+@receiver(post_delete, sender=Category)
+def drop_category_tool_index(sender, instance, **kwargs):
+    tool_index.invalidate(instance.pk)
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_category(sender, instance, **kwargs):
+    instance._previous_category_id = None
+    if instance.pk is not None:
+        instance._previous_category_id = (
+            Product.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Product)
+def index_product_tools(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_category_id', None)
+    if previous is not None and previous != instance.category_id:
+        tool_index.update(previous, lambda index: index.remove_product(instance.pk))
+        tool_ids = list(instance.tool.values_list('pk', flat=True))
+        tool_index.update(instance.category_id, lambda index: index.add_product(instance.pk, tool_ids))
+    elif created:
+        tool_index.update(instance.category_id, lambda index: index.add_product(instance.pk))
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_tools(sender, instance, **kwargs):
+    tool_index.update(instance.category_id, lambda index: index.remove_product(instance.pk))
+
+
+@receiver(m2m_changed, sender=Product.tool.through)
+def update_product_tools(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # tool.product_set changes can touch any number of categories, rebuild them.
+        if action == 'pre_clear':
+            products = Product.objects.filter(tool=instance)
+        elif action in ('post_add', 'post_remove'):
+            products = Product.objects.filter(pk__in=pk_set)
+        else:
+            return
+        for category_id in products.values_list('category_id', flat=True).distinct():
+            tool_index.invalidate(category_id)
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action == 'post_add':
+        tool_index.update(instance.category_id, lambda index: index.add_tools(instance.pk, pk_set))
+    elif action == 'post_remove':
+        tool_index.update(instance.category_id, lambda index: index.remove_tools(instance.pk, pk_set))
+    else:
+        tool_index.update(instance.category_id, lambda index: index.clear_tools(instance.pk))
+
+
+@receiver(pre_save, sender=Picture)
+def remember_picture_product(sender, instance, **kwargs):
+    instance._previous_product_id = None
+    instance._previous_image = None
+    if instance.pk is not None:
+        instance._previous_product_id, instance._previous_image = (
+            Picture.objects.filter(pk=instance.pk).values_list('product_id', 'image').first() or (None, None)
+        )
+
+
+@receiver(post_save, sender=Picture)
+def update_primary_picture_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_primary_picture(instance.product_id)
+    previous = getattr(instance, '_previous_product_id', None)
+    if previous is not None and previous != instance.product_id:
+        refresh_primary_picture(previous)
+
+
+@receiver(post_save, sender=Picture)
+def count_picture_blob_references(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_image', None)
+    if raw or instance.image.name == previous:
+        return
+    acquire_blob(instance.image.name, instance.image.storage)
+    release_blob(previous)
+
+
+@receiver(post_delete, sender=Picture)
+def release_picture_blob(sender, instance, **kwargs):
+    release_blobs([instance.image.name, *derivative_names(instance.derivatives)])
+
+
+@receiver(post_save, sender=Picture)
+def build_picture_derivatives(sender, instance, raw=False, **kwargs):
+    if raw or not instance.image or instance.image.name == getattr(instance, '_previous_image', None):
+        return
+    picture_id = instance.pk
+    transaction.on_commit(lambda: derivative_workers.submit(picture_id))
+
+
+@receiver(post_delete, sender=Picture)
+def update_primary_picture_on_delete(sender, instance, **kwargs):
+    refresh_primary_picture(instance.product_id)
+
+
+@receiver(post_save, sender=Product)
+def index_product_search_terms(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_products([instance.pk])
+
+
+@receiver(m2m_changed, sender=Product.tool.through)
+def index_product_tool_terms(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action == 'pre_clear':
+            instance._cleared_product_ids = list(instance.product_set.values_list('pk', flat=True))
+        elif action == 'post_clear':
+            index_products(getattr(instance, '_cleared_product_ids', []))
+        elif action in ('post_add', 'post_remove'):
+            index_products(pk_set)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        index_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def index_category_search_terms(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created:
+        index_products(instance.product_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Tool)
+def index_tool_search_terms(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created:
+        index_products(instance.product_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_pages(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    tags = [product_tag(instance.pk), category_tag(instance.category_id)]
+    previous = getattr(instance, '_previous_category_id', None)
+    if previous is not None and previous != instance.category_id:
+        tags.append(category_tag(previous))
+    invalidate_tags_on_commit(*tags)
+
+
+@receiver(m2m_changed, sender=Product.tool.through)
+def invalidate_product_tool_pages(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_tags_on_commit(product_tag(instance.pk), category_tag(instance.category_id))
+    elif action in ('post_remove', 'pre_clear'):
+        # Every page showing the tool next to these products is tagged with the tool.
+        invalidate_tags_on_commit(tool_tag(instance.pk))
+    elif action == 'post_add':
+        products = Product.objects.filter(pk__in=pk_set).values_list('pk', 'category_id')
+        invalidate_tags_on_commit(
+            *{tag for pk, category_id in products for tag in (product_tag(pk), category_tag(category_id))}
+        )
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_tags_on_commit(category_tag(instance.pk), NAV_TAG)
+
+
+@receiver(post_save, sender=Tool)
+@receiver(post_delete, sender=Tool)
+def invalidate_tool_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_tags_on_commit(tool_tag(instance.pk))
+
+
+@receiver(post_save, sender=Picture)
+@receiver(post_delete, sender=Picture)
+def invalidate_picture_pages(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    product_ids = {instance.product_id, getattr(instance, '_previous_product_id', None)} - {None}
+    products = Product.objects.filter(pk__in=product_ids).values_list('pk', 'category_id')
+    invalidate_tags_on_commit(
+        *{tag for pk, category_id in products for tag in (product_tag(pk), category_tag(category_id))}
+    )
+
+
+@receiver(request_started)
+def start_hold_manager(sender, **kwargs):
+    # Not started in AppConfig.ready(), which also runs for migrate and other commands. The
+    # first request of a restarted worker reloads and releases the holds of the previous
+    # process instead of waiting for the next add to cart. Later calls return at once.
+    hold_manager.start()
+
+
+@receiver(pre_delete, sender=ShoppingCartProduct)
+def release_deleted_cart_hold(sender, instance, **kwargs):
+    release_deleted_hold(instance.pk)
@@ -1,7 +1,8 @@
 
 function changeImage(element) {
         const mainImage = document.getElementById("mainImage");
-        mainImage.src = element.src;
+        mainImage.srcset = element.dataset.srcset;
+        mainImage.src = element.dataset.src;
     }
 
 document.addEventListener("DOMContentLoaded", function () {
@@ -24,6 +25,27 @@ document.addEventListener("DOMContentLoaded", function () {
         }
     });
 
+    const searchForm = document.getElementById("searchForm");
+    if (searchForm) {
+        const searchInput = searchForm.querySelector("input[name='searched']");
+        const suggestions = document.getElementById("searchSuggestions");
+        searchInput.setAttribute("list", "searchSuggestions");
+        searchInput.setAttribute("autocomplete", "off");
+        searchInput.addEventListener("input", function () {
+            const url = searchForm.dataset.autocompleteUrl + "?q=" + encodeURIComponent(searchInput.value);
+            fetch(url)
+                .then(response => response.json())
+                .then(data => {
+                    suggestions.innerHTML = "";
+                    data.results.forEach(result => {
+                        const option = document.createElement("option");
+                        option.value = result.label;
+                        suggestions.appendChild(option);
+                    });
+                });
+        });
+    }
+
     window.onclick = function (event) {
         if (!event.target.matches('#dropdownButton')) {
             const dropdowns = document.getElementsByClassName("dropdown-content");
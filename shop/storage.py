@@ -0,0 +1,88 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.views.static import serve
+
+# Matches names containing a content hash, whose content can never change.
+IMMUTABLE_NAME = re.compile(r'/[0-9a-f]{2}/[0-9a-f]{32,}[-.]')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+class ContentHashStorage(FileSystemStorage):
+    """
+    File system storage keeping one file per distinct content.
+
+    Uploads are streamed to a temporary file while being hashed with SHA-256, then moved to
+    `<directory>/<first two hash digits>/<hash><extension>`, where `<directory>` is the
+    `upload_to` of the field. A name already in that form for its content, such as an image
+    derivative's, is kept as is. Uploading a content that is already stored only refreshes the
+    existing file's modification time, which `gc_media_blobs` uses to never delete a blob
+    that was just reused.
+
+    Names therefore identify their content and the URLs can be cached forever. Files are
+    shared between rows, so they must not be deleted directly: references are counted in
+    `MediaBlob` and unreferenced blobs are deleted by the `gc_media_blobs` command.
+    """
+
+    chunk_size = 64 * 1024
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in `_save`.
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        temporary_directory = self.path(directory)
+        os.makedirs(temporary_directory, exist_ok=True)
+        digest = hashlib.sha256()
+        descriptor, temporary_path = tempfile.mkstemp(dir=temporary_directory, prefix='.upload-')
+        try:
+            with os.fdopen(descriptor, 'wb') as temporary:
+                for chunk in content.chunks(self.chunk_size):
+                    digest.update(chunk)
+                    temporary.write(chunk)
+            hexdigest = digest.hexdigest()
+            hash_name = posixpath.join(hexdigest[:2], hexdigest + extension)
+            if name.lower().endswith('/' + hash_name):
+                final_name = name
+            else:
+                final_name = posixpath.join(directory, hash_name)
+            final_path = self.path(final_name)
+            if os.path.exists(final_path):
+                os.utime(final_path)
+                os.unlink(temporary_path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.chmod(temporary_path, self.file_permissions_mode or 0o644)
+                os.replace(temporary_path, final_path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.unlink(temporary_path)
+            raise
+        return final_name
+
+
+picture_storage = ContentHashStorage()
+
+
+def get_picture_storage():
+    """
+    Returns the storage of `Picture.image` (a callable keeps the instance out of migrations).
+    """
+    return picture_storage
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """
+    Development media server marking content-hashed files as cacheable forever, the way the
+    production web server or CDN should.
+    """
+    response = serve(request, path, document_root, show_indexes)
+    if IMMUTABLE_NAME.search('/' + path):
+        response['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return response
@@ -0,0 +1,57 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from shop import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(picture, sizes='100vw', alt='', css_class=''):
+    """
+    Renders a `<picture>` element offering every derivative of a picture, best format first,
+    with the smallest fallback JPEG as `<img src>`. The browser picks the format it supports
+    and the width matching `sizes` and the screen density.
+
+    Usage:
+        {% load shop_images %}
+        {% responsive_image prod.primary_picture sizes="200px" alt=prod.name %}
+    """
+    if not picture:
+        return ''
+    if not picture.derivatives:
+        return format_html('<img src="{}" alt="{}" class="{}" loading="lazy">', picture.image.url, alt, css_class)
+    sources = format_html_join(
+        '',
+        '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (images.mime_type(key), images.srcset(picture, key), sizes)
+            for key in picture.derivatives
+            if key != images.FALLBACK_FORMAT
+        ),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="lazy"></picture>',
+        sources,
+        images.image_url(picture, 0),
+        images.srcset(picture, images.FALLBACK_FORMAT),
+        sizes,
+        alt,
+        css_class,
+    )
+
+
+@register.simple_tag
+def image_srcset(picture, key=None):
+    """
+    Returns the `srcset` value of a picture, for `<img>` tags whose source is changed by script.
+    """
+    return images.srcset(picture, key) if picture else ''
+
+
+@register.simple_tag
+def image_url(picture, width=None):
+    """
+    Returns the URL of the smallest derivative at least `width` pixels wide.
+    """
+    return images.image_url(picture, width) if picture else ''
@@ -1,15 +1,32 @@
-from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import Http404
+import json
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
-from .models import Category, Product, Tool, Address, ShoppingCart, ShoppingCartProduct
+from .autocomplete import autocompleter
+from .carts import UnknownProducts, add_to_cart, get_active_cart
+from .exporting import EXPORT_FORMATS, export_catalog, header_lines, join_lines
+from .facets import tool_index
+from .models import Category, Product, Tool, Address, Order, ShoppingCart, ShoppingCartProduct
+from .orders import CartAlreadyOrdered, OutOfStock, commit_order
+from .pagination import (
+    DEFAULT_PRODUCT_SORT, PRODUCT_SORTS, SORT_LABELS, IdListPaginator, KeysetPaginator, price_params, sort_links,
+)
+from .page_cache import AnonymousPageCacheMixin, category_tag, product_tag, tool_tag
+from .pricing import cart_summary, filter_price_range, price_range
+from .query_budget import query_budget
 from .forms import LoginForm, UserForm, SearchForm, AddressForm
+from .search_cache import cached_search
 
 from django.contrib.auth import get_user_model, authenticate, login, logout
 
 User = get_user_model()
 
 
+@query_budget(max_queries=4, max_time_ms=50)
 class IndexView(View):
     """
     Handles the rendering of the homepage or base template.
@@ -30,6 +47,7 @@ class IndexView(View):
         return render(request, "shop/base.html")
 
 
+@query_budget(max_queries=8, max_time_ms=100)
 class SearchView(View):
     """
     Handles the search functionality for products.
@@ -37,9 +55,15 @@ class SearchView(View):
     Methods:
     --------
     GET:
+        - Parameters:
+            - searched (str, optional): The search query, used by the pagination links.
+            - sort (str, optional): relevance (default), name, -name, price or -price.
+            - min_price, max_price (str, optional): A gross price range in ISK. Results with a range
+              are sorted by price unless another sort is given.
+            - cursor (str, optional): The opaque token of the page to display.
         - Functionality:
-            - Creates a new instance of the `SearchForm`.
-            - Passes the form and the list of categories to the template context.
+            - Without a query, creates a new instance of the `SearchForm` and renders it.
+            - With a query, behaves like POST.
             - Renders the `shop/search.html` template.
 
     POST:
@@ -48,11 +72,18 @@ class SearchView(View):
         - Functionality:
             - Validates the search form data.
             - If valid:
-                - Attempts to filter products whose names contain the search query (case-insensitive).
-                - Passes the search form, filtered products, and list of categories to the template context.
+                - Looks the query up in the search index (product name, category name and description,
+                  tool names) and orders the matching products by relevance. Results are cached by
+                  normalized query until the catalog changes, and every search is counted.
+                - If fewer than `SEARCH_FUZZY_THRESHOLD` products match, retries with misspelled terms
+                  replaced by their closest indexed term and passes the corrected query as `corrected`.
+                - Passes the search form, the requested page of products and the page object to the
+                  template context. Only the products of the requested page are fetched: relevance
+                  pages are slices of the cached result list, other sorts use keyset pagination over
+                  the matching products. The pagination and sort links keep the query.
                 - Renders the `shop/search.html` template with the search results.
-            - If no products match the search query or another error occurs:
-                - Passes the search form and list of categories to the template context without products.
+            - If the form is invalid:
+                - Passes the search form to the template context without products.
                 - Renders the `shop/search.html` template.
 
     Template:
@@ -60,7 +91,11 @@ class SearchView(View):
     - shop/search.html
     """
 
+    paginate_by = getattr(settings, 'SEARCH_PAGE_SIZE', 24)
+
     def get(self, request):
+        if 'searched' in request.GET:
+            return self.search(request, request.GET)
         form = SearchForm()
         ctx = {
             'form': form,
@@ -68,17 +103,40 @@ class SearchView(View):
         return render(request, "shop/search.html", ctx)
 
     def post(self, request):
-        form = SearchForm(request.POST)
+        return self.search(request, request.POST)
+
+    def search(self, request, data):
+        form = SearchForm(data)
         if form.is_valid():
-            try:
-                products = Product.objects.filter(name__icontains=form.cleaned_data['searched'])
-                ctx = {
-                    'form': form,
-                    'products': products,
-                }
-                return render(request, "shop/search.html", ctx)
-            except Product.DoesNotExist:
-                pass
+            searched = form.cleaned_data['searched']
+            result = cached_search(searched)
+            sort = data.get('sort')
+            prices = price_range(data)
+            if sort in PRODUCT_SORTS or prices != (None, None):
+                sort = sort if sort in PRODUCT_SORTS else 'price'
+                matches = Product.objects.filter(pk__in=result.product_ids).select_related('primary_picture')
+                matches = filter_price_range(matches, prices)
+                page = KeysetPaginator(matches, PRODUCT_SORTS[sort], self.paginate_by).page(data.get('cursor'))
+                products = page.object_list
+            else:
+                sort = 'relevance'
+                page = IdListPaginator(result.product_ids, self.paginate_by).page(data.get('cursor'))
+                in_bulk = Product.objects.select_related('primary_picture').in_bulk(page.object_list)
+                products = [in_bulk[pk] for pk in page.object_list if pk in in_bulk]
+            query = [('searched', searched)] + price_params(data)
+            ctx = {
+                'form': form,
+                'products': products,
+                'page_obj': page,
+                'page_query': urlencode(query + [('sort', sort)]),
+                'sort': sort,
+                'sort_links': sort_links(query, {'relevance': 'Relevance', **SORT_LABELS}),
+                'searched': searched,
+                'min_price': data.get('min_price', ''),
+                'max_price': data.get('max_price', ''),
+                'corrected': result.corrected,
+            }
+            return render(request, "shop/search.html", ctx)
         ctx = {
             'form': form,
             'products': [],
@@ -87,7 +145,29 @@ class SearchView(View):
         return render(request, "shop/search.html", ctx)
 
 
-class CategoryView(View):
+@query_budget(max_queries=3, max_time_ms=50)
+class AutocompleteView(View):
+    """
+    Returns search box suggestions as JSON.
+
+    Methods:
+    --------
+    GET:
+        - Parameters:
+            - q (str): The text typed so far.
+        - Functionality:
+            - Looks the prefix up in the in-memory autocomplete index of product and category names,
+              most popular first. No database query is made per keystroke.
+            - Returns `{"results": [{"label": ..., "url": ..., "type": ...}]}`.
+    """
+
+    def get(self, request):
+        suggestions = autocompleter.complete(request.GET.get('q', ''))
+        return JsonResponse({'results': [suggestion.as_dict() for suggestion in suggestions]})
+
+
+@query_budget(max_queries=8, max_time_ms=100)
+class CategoryView(AnonymousPageCacheMixin, View):
     """
     Handles displaying all products under a specific category with filtering by tools.
 
@@ -98,9 +178,19 @@ class CategoryView(View):
             - slug (str): The unique slug of the category to be displayed.
         - Functionality:
             - Retrieves the category object using the provided slug.
-            - Fetches all tools associated with the products in this category.
+            - Fetches all tools associated with the products in this category, each annotated with
+              `facet_count`: the number of products left if that tool is added to the selection.
             - Fetches all products associated with this category.
-            - Optionally filters the products by the tools selected via GET parameters.
+            - Optionally filters the products by the tools selected via GET parameters. The filter is
+              resolved in memory by intersecting the category's tool index, and only the matching
+              products are fetched from the database.
+            - Optionally keeps only the products whose gross price lies between `min_price` and
+              `max_price` (ISK), using the indexed `gross_price_cents` column; the tool counts then
+              only count products in that range.
+            - Sorts the products by `sort` (name, -name, price, -price or id) and returns one page of
+              `CATEGORY_PAGE_SIZE` products with keyset pagination: the opaque `cursor` parameter
+              holds the sort key of the page boundary, so deep pages cost the same as the first one.
+              The pagination and sort links keep the selected tools and price range.
             - Prepares the context (`ctx`) with:
                 - A list of all categories (for navigation or other purposes).
                 - The specific category object.
@@ -108,6 +198,8 @@ class CategoryView(View):
                 - The list of tools available in the category.
                 - The list of selected tool IDs.
             - Renders the `shop/category_view.html` template with the prepared context.
+            - Pages of anonymous visitors are cached per category and tool selection until the
+              category, one of its products or one of the listed tools changes.
         - Error Handling:
             - If the category does not exist, raises an `Http404` error with the message "Category does not exist".
 
@@ -116,29 +208,57 @@ class CategoryView(View):
     - shop/category_view.html
     """
 
+    page_cache_params = ('tools', 'min_price', 'max_price', 'sort', 'cursor')
+    paginate_by = getattr(settings, 'CATEGORY_PAGE_SIZE', 24)
+
     def get(self, request, slug):
         try:
             category = Category.objects.get(slug=slug)
-            tools = Tool.objects.filter(product__category=category).distinct()
-            products = Product.objects.filter(category=category)
-            selected_tools = request.GET.getlist('tools')
+            index = tool_index.get(category.pk)
+            products = Product.objects.filter(category=category).select_related('primary_picture')
+            selected_tools = [int(tool_id) for tool_id in request.GET.getlist('tools') if tool_id.isdigit()]
+
+            prices = price_range(request.GET)
+            within = None
+            if prices != (None, None):
+                products = filter_price_range(products, prices)
+                within = index.bits_of(products.values_list('pk', flat=True))
+
+            facet_counts = index.facet_counts(selected_tools, within)
+            tools = list(Tool.objects.filter(pk__in=facet_counts).order_by('name'))
+            for tool in tools:
+                tool.facet_count = facet_counts[tool.pk]
+            self.add_page_tags(category_tag(category.pk), *[tool_tag(tool.pk) for tool in tools])
 
             if selected_tools:
-                for tool_id in selected_tools:
-                    products = products.filter(tool__id=tool_id)
+                products = products.filter(pk__in=index.product_ids(index.match(selected_tools)))
+
+            sort = request.GET.get('sort')
+            if sort not in PRODUCT_SORTS:
+                sort = DEFAULT_PRODUCT_SORT
+            paginator = KeysetPaginator(products, PRODUCT_SORTS[sort], self.paginate_by)
+            page = paginator.page(request.GET.get('cursor'))
+            filters = [('tools', tool_id) for tool_id in selected_tools] + price_params(request.GET)
 
             ctx = {
                 "category": category,
-                "products": products.distinct(),
+                "products": page.object_list,
+                "page_obj": page,
+                "page_query": urlencode(filters + [('sort', sort)]),
+                "sort": sort,
+                "sort_links": sort_links(filters),
                 "tools": tools,
-                "selected_tools": list(map(int, selected_tools)),
+                "selected_tools": selected_tools,
+                "min_price": request.GET.get('min_price', ''),
+                "max_price": request.GET.get('max_price', ''),
             }
             return render(request, "shop/category_view.html", ctx)
         except Category.DoesNotExist:
             raise Http404("Category does not exist")
 
 
-class ProductView(View):
+@query_budget(max_queries=6, max_time_ms=50)
+class ProductView(AnonymousPageCacheMixin, View):
     """
     Handles displaying detailed information about a specific product.
 
@@ -151,6 +271,8 @@ class ProductView(View):
             - Retrieves the product object using the provided slug.
             - Passes the product and list of categories to the template context.
             - Renders the `shop/product_view.html` template.
+            - Pages of anonymous visitors are cached until the product, its pictures or its tools
+              change. Anonymous visitors get a login link instead of the add-to-cart form.
 
     Template:
     ---------
@@ -158,13 +280,15 @@ class ProductView(View):
     """
 
     def get(self, request, slug):
-        product = get_object_or_404(Product, slug=slug)
+        product = get_object_or_404(Product.objects.prefetch_related('picture_set', 'tool'), slug=slug)
+        self.add_page_tags(product_tag(product.pk), *[tool_tag(tool.pk) for tool in product.tool.all()])
         ctx = {
             "product": product,
         }
         return render(request, "shop/product_view.html", ctx)
 
 
+@query_budget(max_queries=10, max_time_ms=100)
 class LoginView(View):
     """
     Handles user authentication.
@@ -212,6 +336,7 @@ class LoginView(View):
             return render(request, 'shop/login.html', {'form': form})
 
 
+@query_budget(max_queries=5, max_time_ms=50)
 class LogoutView(View):
     """
     Handles logging out the currently authenticated user.
@@ -233,6 +358,7 @@ class LogoutView(View):
         return redirect('index')
 
 
+@query_budget(max_queries=6, max_time_ms=100)
 class CreateUserView(View):
     """
     Handles user registration.
@@ -283,6 +409,7 @@ class CreateUserView(View):
             return render(request, 'shop/create_user.html', {'form': form})
 
 
+@query_budget(max_queries=7, max_time_ms=50)
 class ProfileView(LoginRequiredMixin, View):
     """
     Handles displaying a user's profile, including their addresses.
@@ -308,6 +435,7 @@ class ProfileView(LoginRequiredMixin, View):
                 - The `User` object.
                 - A list of all categories (for navigation or other purposes).
                 - The list of addresses associated with the user.
+                - The order history, read from the `Order` snapshots, when users view their own profile.
             - Renders the `shop/profile_view.html` template with the prepared context.
         - Error Handling:
             - If the user with the provided username does not exist, this view may raise a `User.DoesNotExist` exception.
@@ -326,9 +454,12 @@ class ProfileView(LoginRequiredMixin, View):
             "user": user,
             "addresses": addresses,
         }
+        if user == request.user:
+            ctx["orders"] = Order.objects.filter(user=user).order_by('-created_at').prefetch_related('lines')
         return render(request, 'shop/profile_view.html', ctx)
 
 
+@query_budget(max_queries=6, max_time_ms=50)
 class EditProfileView(LoginRequiredMixin, View):
     login_url = '/login/'
 
@@ -353,6 +484,7 @@ class EditProfileView(LoginRequiredMixin, View):
             return redirect('profile', username=user.username)
 
 
+@query_budget(max_queries=5, max_time_ms=50)
 class AddAddressView(LoginRequiredMixin, View):
     """
     Handles adding a new address for a user.
@@ -427,6 +559,7 @@ class AddAddressView(LoginRequiredMixin, View):
             return render(request, 'shop/add_address.html', ctx)
 
 
+@query_budget(max_queries=16, max_time_ms=100)
 class AddToCartView(LoginRequiredMixin, View):
     """
     Handles adding a product to the user's shopping cart.
@@ -446,13 +579,13 @@ class AddToCartView(LoginRequiredMixin, View):
             - request (HttpRequest): The incoming HTTP request object containing the form data.
         - Functionality:
             - Retrieves the `Product` object based on the `product_id` provided in the POST data.
-            - Gets or creates an active `ShoppingCart` object for the current user.
-            - Gets or creates a `ShoppingCartProduct` object linking the product to the cart.
-            - If the product is already in the cart, increments the quantity by 1.
-            - Saves the cart item to the database.
+            - Gets or creates the active `ShoppingCart` object for the current user.
+            - Atomically inserts the cart line or increments its quantity by `quantity` (default 1),
+              so concurrent clicks never lose an increment or create a second active cart.
             - Redirects the user to their cart page after successfully adding the product.
         - Error Handling:
             - If the product with the provided `product_id` does not exist, raises a `Http404` error.
+            - If `quantity` is not a positive integer, returns a 400 response.
 
     Template:
     ---------
@@ -464,17 +597,58 @@ class AddToCartView(LoginRequiredMixin, View):
     def post(self, request):
         product_id = request.POST['product_id']
         product = get_object_or_404(Product, pk=product_id)
-        cart, created = ShoppingCart.objects.get_or_create(user=request.user, active=True)
+        try:
+            quantity = int(request.POST.get('quantity', 1))
+            cart = get_active_cart(request.user)
+            add_to_cart(cart, [(product.pk, quantity)])
+        except ValueError:
+            return HttpResponseBadRequest("Quantity must be a positive integer")
 
-        cart_item, created = ShoppingCartProduct.objects.get_or_create(shopping_cart=cart, product=product)
+        return redirect('cart')
 
-        if not created:
-            cart_item.quantity += 1
-            cart_item.save()
 
-        return redirect('cart')
+@query_budget(max_queries=15, max_time_ms=100)
+class AddToCartBatchView(LoginRequiredMixin, View):
+    """
+    Handles adding many products to the user's shopping cart in one request.
 
+    Inherits:
+    ----------
+    - LoginRequiredMixin: Ensures that the user is authenticated before accessing this view.
 
+    Methods:
+    --------
+    POST:
+        - Parameters:
+            - request (HttpRequest): A JSON body of the form
+              `{"items": [{"product_id": 1, "quantity": 2}, ...]}`.
+        - Functionality:
+            - Gets or creates the active `ShoppingCart` of the current user.
+            - Adds every item in one transaction with two queries, whatever the number of items.
+            - Returns `{"cart": <cart id>, "added": <total quantity added>}`.
+        - Error Handling:
+            - Returns a 400 response if the body is malformed, a quantity is not positive or some
+              products do not exist. Nothing is added in that case.
+    """
+
+    login_url = '/login/'
+
+    def post(self, request):
+        try:
+            items = [
+                (int(item['product_id']), int(item.get('quantity', 1)))
+                for item in json.loads(request.body)['items']
+            ]
+            cart = get_active_cart(request.user)
+            add_to_cart(cart, items)
+        except UnknownProducts as error:
+            return JsonResponse({'error': str(error), 'product_ids': error.product_ids}, status=400)
+        except (ValueError, KeyError, TypeError) as error:
+            return JsonResponse({'error': str(error) or 'Malformed request body'}, status=400)
+        return JsonResponse({'cart': cart.pk, 'added': sum(quantity for _, quantity in items)})
+
+
+@query_budget(max_queries=9, max_time_ms=50)
 class CartView(LoginRequiredMixin, View):
     """
     Handles displaying the user's active shopping cart.
@@ -495,11 +669,12 @@ class CartView(LoginRequiredMixin, View):
         - Functionality:
             - Retrieves the active `ShoppingCart` object associated with the current user.
             - Fetches all `ShoppingCartProduct` objects linked to the user's active cart.
-            - Calculates the total price of all products in the cart, considering their quantity.
+            - Loads the cart lines with their unit and line prices and the cart totals (net, VAT, gross)
+              in a single query, using integer cents.
             - Prepares the context (`ctx`) with:
                 - The active `ShoppingCart` object.
                 - The list of products (`ShoppingCartProduct`) in the cart.
-                - The total price of all items in the cart, rounded to two decimal places.
+                - The gross total price of all items in the cart as `total`, and all totals as `totals`.
             - Renders the `shop/cart_view.html` template with the prepared context.
         - Error Handling:
             - If no active shopping cart exists for the user, raises a `Http404` error.
@@ -512,20 +687,19 @@ class CartView(LoginRequiredMixin, View):
     login_url = '/login/'
 
     def get(self, request):
-        cart, created = ShoppingCart.objects.get_or_create(user=request.user, active=True)
-        cart_products = ShoppingCartProduct.objects.filter(shopping_cart=cart)
-        total = 0
-        for cart_item in cart_products:
-            total += cart_item.quantity * cart_item.product.calculate_price()
+        cart = get_active_cart(request.user)
+        cart_products, totals = cart_summary(cart)
 
         ctx = {
             "cart": cart,
             "cart_products": cart_products,
-            "total": round(total, 2),
+            "total": totals.gross,
+            "totals": totals,
         }
         return render(request, 'shop/cart_view.html', ctx)
 
 
+@query_budget(max_queries=7, max_time_ms=50)
 class CheckoutView(LoginRequiredMixin, View):
     """
     Handles the checkout process for a user, including selecting an address and reviewing the cart.
@@ -561,10 +735,10 @@ class CheckoutView(LoginRequiredMixin, View):
             - Retrieves the selected address using the `address_id` from the POST data.
             - Retrieves the active `ShoppingCart` object for the current user.
             - Fetches all `ShoppingCartProduct` objects linked to the user's active cart.
-            - Calculates the total price of all products in the cart, considering their quantity.
+            - Loads the cart lines with their prices and the cart totals in a single query.
             - Prepares the context (`ctx`) with:
                 - The list of products (`ShoppingCartProduct`) in the cart.
-                - The total price of all items in the cart, rounded to two decimal places.
+                - The gross total price of all items in the cart as `total`, and all totals as `totals`.
                 - The selected address for delivery.
             - Renders the `shop/checkout.html` template with the prepared context.
         - Error Handling:
@@ -580,7 +754,7 @@ class CheckoutView(LoginRequiredMixin, View):
     def get(self, request):
         addresses = Address.objects.filter(user=request.user)
         cart = get_object_or_404(ShoppingCart, user=request.user, active=True)
-        cart_products = ShoppingCartProduct.objects.filter(shopping_cart=cart)
+        cart_products = ShoppingCartProduct.objects.filter(shopping_cart=cart).select_related('product__primary_picture')
 
         ctx = {
             "addresses": addresses,
@@ -592,23 +766,102 @@ class CheckoutView(LoginRequiredMixin, View):
         address_id = request.POST.get('address_id')
         address = Address.objects.get(pk=address_id)
         cart = get_object_or_404(ShoppingCart, user=request.user, active=True)
-        cart_products = ShoppingCartProduct.objects.filter(shopping_cart=cart)
-        total = 0
-        for cart_item in cart_products:
-            total += cart_item.quantity * cart_item.product.calculate_price()
+        cart_products, totals = cart_summary(cart)
 
         ctx = {
             "cart_products": cart_products,
-            "total": round(total, 2),
+            "total": totals.gross,
+            "totals": totals,
             "address": address,
         }
 
         return render(request, 'shop/checkout.html', ctx)
 
 
+@query_budget(max_queries=15, max_time_ms=200)
 class PaymentView(LoginRequiredMixin, View):
+    """
+    Handles paying for the user's active shopping cart.
+
+    Methods:
+    --------
+    POST:
+        - Functionality:
+            - Retrieves the active `ShoppingCart` object for the current user.
+            - Commits the order: deactivates the cart, takes the stock of every line and writes an
+              immutable `Order` snapshot (with the address chosen at checkout) in a single transaction.
+            - Renders the `shop/payment.html` template with the order.
+        - Error Handling:
+            - If no active shopping cart exists for the user, raises a `Http404` error.
+            - If some products are out of stock, nothing is taken and the cart is rendered again with
+              the missing products listed, with status 409.
+
+    Template:
+    ---------
+    - shop/payment.html
+    - shop/cart_view.html (when out of stock)
+    """
+
+    login_url = '/login/'
+
     def post(self, request):
         cart = get_object_or_404(ShoppingCart, user=request.user, active=True)
-        cart.active = False
-        cart.save()
-        return render(request, 'shop/payment.html')
+        address = Address.objects.filter(user=request.user, pk=request.POST.get('address_id') or None).first()
+        try:
+            order = commit_order(cart, address)
+        except CartAlreadyOrdered:
+            raise Http404("Cart was already ordered")
+        except OutOfStock as error:
+            cart_products, totals = cart_summary(cart)
+            ctx = {
+                "cart": cart,
+                "cart_products": cart_products,
+                "total": totals.gross,
+                "totals": totals,
+                "out_of_stock": [line.product for line in cart_products if line.product_id in error.product_ids],
+            }
+            return render(request, 'shop/cart_view.html', ctx, status=409)
+        return render(request, 'shop/payment.html', {"order": order})
+
+
+@query_budget(max_queries=3, max_queries_per_chunk=2)
+class CatalogExportView(UserPassesTestMixin, View):
+    """
+    Streams the whole catalog for marketplace feeds. Only available to staff.
+
+    Inherits:
+    ----------
+    - UserPassesTestMixin: Redirects anonymous users to the login page and refuses non-staff users.
+
+    Methods:
+    --------
+    GET:
+        - Parameters:
+            - format (str): `csv` (default) or `jsonl`.
+        - Functionality:
+            - Returns a `StreamingHttpResponse` sent as an attachment. Products are read in chunks
+              of `CATALOG_EXPORT_CHUNK_SIZE` through a database cursor, with the tools and pictures
+              of each chunk loaded in one query each, so the first bytes go out at once and memory
+              stays flat whatever the size of the catalog.
+            - Every chunk is streamed as one piece (the CSV header goes with the first), which the
+              query budget allows two queries.
+            - Picture URLs are absolute.
+        - Error Handling:
+            - Returns a 400 response for an unknown format.
+    """
+
+    login_url = '/login/'
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request):
+        export_format = request.GET.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return HttpResponseBadRequest("Unknown export format")
+        chunk_size = getattr(settings, 'CATALOG_EXPORT_CHUNK_SIZE', 2000)
+        lines = export_catalog(export_format, chunk_size, url_prefix=request.build_absolute_uri('/')[:-1])
+        pieces = join_lines(lines, chunk_size, header_lines(export_format))
+        response = StreamingHttpResponse(pieces, content_type=EXPORT_FORMATS[export_format])
+        response['Content-Disposition'] = f'attachment; filename="catalog.{export_format}"'
+        return response
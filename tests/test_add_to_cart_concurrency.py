@@ -0,0 +1,77 @@
+import json
+import threading
+
+import pytest
+from django.db import connection
+from django.urls import reverse
+
+from shop.carts import UnknownProducts, add_to_cart, get_active_cart
+from shop.models import Product, ShoppingCart, ShoppingCartProduct
+
+THREADS = 8
+ADDS_PER_THREAD = 25
+
+
+def hammer(target):
+    errors = []
+
+    def run():
+        try:
+            target()
+        except Exception as error:  # noqa: BLE001 - reported by the assertion below
+            errors.append(error)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_concurrent_adds_do_not_lose_increments(concurrent_db, user, test_product):
+    def add_many():
+        for _ in range(ADDS_PER_THREAD):
+            add_to_cart(get_active_cart(user), [(test_product.pk, 1)])
+
+    hammer(add_many)
+
+    assert ShoppingCart.objects.filter(user=user, active=True).count() == 1
+    line = ShoppingCartProduct.objects.get(shopping_cart__user=user, product=test_product)
+    assert line.quantity == THREADS * ADDS_PER_THREAD
+
+
+@pytest.mark.django_db
+def test_add_to_cart_batch_view(client, user, test_product, test_category):
+    other = Product.objects.create(name='Other', category=test_category, vat='0.24')
+    client.force_login(user)
+    items = [
+        {'product_id': test_product.pk, 'quantity': 2},
+        {'product_id': other.pk, 'quantity': 5},
+        {'product_id': test_product.pk},
+    ]
+    response = client.post(reverse('add_to_cart_batch'), json.dumps({'items': items}), content_type='application/json')
+    assert response.status_code == 200
+    assert response.json()['added'] == 8
+    quantities = dict(ShoppingCartProduct.objects.values_list('product_id', 'quantity'))
+    assert quantities == {test_product.pk: 3, other.pk: 5}
+
+
+@pytest.mark.django_db
+def test_add_to_cart_batch_rejects_unknown_products(client, user, test_product):
+    client.force_login(user)
+    items = [{'product_id': test_product.pk, 'quantity': 1}, {'product_id': 9999, 'quantity': 1}]
+    response = client.post(reverse('add_to_cart_batch'), json.dumps({'items': items}), content_type='application/json')
+    assert response.status_code == 400
+    assert response.json()['product_ids'] == [9999]
+    assert not ShoppingCartProduct.objects.exists()
+
+
+@pytest.mark.django_db
+def test_add_to_cart_rejects_non_positive_quantity(user, test_product):
+    with pytest.raises(ValueError):
+        add_to_cart(get_active_cart(user), [(test_product.pk, 0)])
+    with pytest.raises(UnknownProducts):
+        add_to_cart(get_active_cart(user), [(9999, 1)])
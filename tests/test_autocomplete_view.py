@@ -0,0 +1,65 @@
+import pytest
+from django.urls import reverse
+
+from shop.autocomplete import PrefixIndex, Suggestion, autocompleter
+from shop.models import Product
+
+
+def test_prefix_index_orders_by_popularity():
+    index = PrefixIndex([
+        Suggestion('Pocket knife', '/p/1', 'product', 1),
+        Suggestion('Knife sharpener', '/p/2', 'product', 5),
+        Suggestion('Kneepads', '/p/3', 'product', 9),
+        Suggestion('Saw', '/p/4', 'product', 3),
+    ])
+    assert [s.label for s in index.complete('kni')] == ['Knife sharpener', 'Pocket knife']
+    assert [s.label for s in index.complete('kn')] == ['Kneepads', 'Knife sharpener', 'Pocket knife']
+    assert [s.label for s in index.complete('POCKET KN')] == ['Pocket knife']
+    assert index.complete('') == []
+
+
+def test_prefix_index_breaks_ties_by_label():
+    index = PrefixIndex([Suggestion(label, f'/p/{label}', 'product', 2) for label in ('Saw C', 'Saw A', 'Saw B')])
+    assert [s.label for s in index.complete('sa')] == ['Saw A', 'Saw B', 'Saw C']
+    assert [s.label for s in index.complete('saw')] == ['Saw A', 'Saw B', 'Saw C']
+
+
+def test_prefix_index_precomputes_large_ranges():
+    labels = [f'{a} {b}' for a in ('Saw', 'Sander', 'Sash clamp', 'Spade') for b in ('blade', 'bench', 'set', 'sack')]
+    suggestions = [Suggestion(label, f'/p/{i}', 'product', i % 5) for i, label in enumerate(labels)]
+    index = PrefixIndex(suggestions, limit=3, precomputed_length=1, max_scan=2)
+    assert 's' in index.top and 'sa' in index.top and 'sand' in index.top and 'spade b' not in index.top
+    for prefix in {label.lower()[:length] for label in labels for length in range(1, len(label) + 1)}:
+        expected = sorted(
+            (s for s in suggestions if any(key.startswith(prefix) for key in [
+                ' '.join(s.label.lower().split()[start:]) for start in range(len(s.label.split()))
+            ])),
+            key=lambda s: (-s.weight, s.label),
+        )[:3]
+        assert index.complete(prefix) == expected, prefix
+
+
+@pytest.mark.django_db
+def test_autocomplete_view_returns_json(client, test_product):
+    response = client.get(reverse('autocomplete'), {'q': 'test'})
+    assert response.status_code == 200
+    labels = [result['label'] for result in response.json()['results']]
+    # The category holds one product, the product was never added to a cart.
+    assert labels == ['Test Category', 'Test Product']
+
+
+@pytest.mark.django_db
+def test_autocomplete_does_not_query_per_keystroke(client, test_product, django_assert_num_queries):
+    client.get(reverse('autocomplete'), {'q': 't'})
+    with django_assert_num_queries(0):
+        client.get(reverse('autocomplete'), {'q': 'te'})
+        client.get(reverse('autocomplete'), {'q': 'tes'})
+
+
+@pytest.mark.django_db
+def test_autocomplete_rebuilds_after_catalog_change(test_product, django_capture_on_commit_callbacks):
+    autocompleter.complete('test')
+    with django_capture_on_commit_callbacks(execute=True):
+        Product.objects.create(name='Test Saw', category=test_product.category, vat='0.24')
+    autocompleter.complete('test s')
+    assert 'Test Saw' in [s.label for s in autocompleter.complete('test s')]
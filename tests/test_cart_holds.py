@@ -0,0 +1,140 @@
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+
+from shop.carts import add_to_cart
+from shop.holds import HoldManager, TimingWheel, release_holds
+from shop.models import ShoppingCart, ShoppingCartProduct
+from shop.orders import OutOfStock, commit_order
+
+
+@pytest.fixture
+def scarce_product(test_product):
+    test_product.stock = 3
+    test_product.save()
+    return test_product
+
+
+def test_timing_wheel_returns_due_keys():
+    wheel = TimingWheel(tick=1, slots=8, now=100)
+    wheel.schedule('a', 102)
+    wheel.schedule('b', 105)
+    wheel.schedule('c', 120)  # More than one turn away.
+    assert wheel.advance(101) == []
+    assert wheel.advance(103) == ['a']
+    assert wheel.advance(112) == ['b']
+    assert len(wheel) == 1
+    assert wheel.advance(130) == ['c']
+
+
+def test_timing_wheel_reschedule_and_cancel():
+    wheel = TimingWheel(tick=1, slots=8, now=0)
+    wheel.schedule('a', 2)
+    wheel.schedule('a', 6)
+    wheel.schedule('b', 3)
+    wheel.cancel('b')
+    assert wheel.advance(4) == []
+    assert wheel.advance(6) == ['a']
+
+
+def test_timing_wheel_catches_up_after_long_pause():
+    wheel = TimingWheel(tick=1, slots=4, now=0)
+    for key in range(1000):
+        wheel.schedule(key, 1 + key % 50)
+    assert sorted(wheel.advance(10_000)) == list(range(1000))
+
+
+@pytest.mark.django_db
+def test_add_to_cart_holds_stock(client, user, scarce_product, django_capture_on_commit_callbacks):
+    client.force_login(user)
+    with django_capture_on_commit_callbacks(execute=False) as callbacks:
+        client.post(reverse('add_to_cart'), {'product_id': scarce_product.id, 'quantity': 2})
+    assert len(callbacks) == 1
+    scarce_product.refresh_from_db()
+    assert (scarce_product.reserved, scarce_product.available) == (2, 1)
+    line = ShoppingCartProduct.objects.get(product=scarce_product)
+    assert line.held_quantity == 2
+    assert line.hold_expires_at > timezone.now()
+
+
+@pytest.mark.django_db
+def test_no_hold_without_enough_stock(cart, scarce_product):
+    other = ShoppingCart.objects.create(user=cart.user, active=False)
+    add_to_cart(other, [(scarce_product.pk, 2)])
+    add_to_cart(cart, [(scarce_product.pk, 2)])
+    scarce_product.refresh_from_db()
+    assert scarce_product.reserved == 2
+    line = ShoppingCartProduct.objects.get(shopping_cart=cart)
+    assert (line.quantity, line.held_quantity, line.hold_expires_at) == (2, 0, None)
+
+
+@pytest.mark.django_db
+def test_expired_holds_are_released(cart, scarce_product):
+    add_to_cart(cart, [(scarce_product.pk, 3)])
+    manager = HoldManager()
+    manager.recover()
+    assert manager.process(timezone.now().timestamp()) == 0
+    later = timezone.now() + timedelta(minutes=16)
+    assert manager.process(later.timestamp()) == 1
+    scarce_product.refresh_from_db()
+    assert scarce_product.reserved == 0
+    line = ShoppingCartProduct.objects.get(shopping_cart=cart)
+    assert (line.quantity, line.held_quantity, line.hold_expires_at) == (3, 0, None)
+
+
+@pytest.mark.django_db
+def test_extended_hold_is_not_released(cart, scarce_product):
+    add_to_cart(cart, [(scarce_product.pk, 1)])
+    line = ShoppingCartProduct.objects.get(shopping_cart=cart)
+    ShoppingCartProduct.objects.filter(pk=line.pk).update(hold_expires_at=timezone.now() + timedelta(hours=1))
+    assert release_holds([line.pk], timezone.now() + timedelta(minutes=16)) == 0
+    scarce_product.refresh_from_db()
+    assert scarce_product.reserved == 1
+
+
+@pytest.mark.django_db
+def test_payment_consumes_hold(cart, scarce_product):
+    add_to_cart(cart, [(scarce_product.pk, 3)])
+    commit_order(cart)
+    scarce_product.refresh_from_db()
+    assert (scarce_product.stock, scarce_product.reserved) == (0, 0)
+    assert not ShoppingCartProduct.objects.filter(hold_expires_at__isnull=False).exists()
+
+
+@pytest.mark.django_db
+def test_held_stock_is_not_sold_to_other_carts(cart, scarce_product):
+    add_to_cart(cart, [(scarce_product.pk, 2)])
+    buyer = User.objects.create_user(username='other_buyer', password='test_password')
+    other = ShoppingCart.objects.create(user=buyer, active=True)
+    ShoppingCartProduct.objects.create(shopping_cart=other, product=scarce_product, quantity=2)
+    with pytest.raises(OutOfStock):
+        commit_order(other)
+    scarce_product.refresh_from_db()
+    assert (scarce_product.stock, scarce_product.reserved) == (3, 2)
+
+
+@pytest.mark.django_db
+def test_deleted_lines_release_their_hold(cart, scarce_product):
+    add_to_cart(cart, [(scarce_product.pk, 2)])
+    cart.delete()
+    scarce_product.refresh_from_db()
+    assert scarce_product.reserved == 0
+
+    # A line whose hold was already released does not give the stock back twice.
+    add_to_cart(ShoppingCart.objects.create(user=cart.user), [(scarce_product.pk, 2)])
+    line = ShoppingCartProduct.objects.get()
+    release_holds([line.pk], timezone.now() + timedelta(minutes=16))
+    line.delete()
+    scarce_product.refresh_from_db()
+    assert scarce_product.reserved == 0
+
+
+@pytest.mark.django_db
+def test_first_request_starts_hold_manager(client, monkeypatch):
+    started = []
+    monkeypatch.setattr(HoldManager, 'start', lambda self: started.append(self))
+    client.get(reverse('index'))
+    assert started
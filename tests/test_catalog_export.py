@@ -0,0 +1,105 @@
+import csv
+import json
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from shop.exporting import EXPORT_FIELDS, export_catalog
+from shop.models import Picture, Product, Tool
+from shop.query_budget import QueryBudgetExceeded
+
+
+@pytest.fixture
+def catalog(test_product):
+    test_product.tool.add(Tool.objects.create(name='Another Tool'))
+    Picture.objects.create(product=test_product, image='images/exported.jpg')
+    for i in range(4):
+        Product.objects.create(name=f'Extra {i}', netto_price=10 * i, vat='0.11', category=test_product.category)
+    return test_product
+
+
+@pytest.fixture
+def staff_client(client):
+    User.objects.create_user(username='staff', password='staff_password', is_staff=True)
+    client.login(username='staff', password='staff_password')
+    return client
+
+
+@pytest.mark.django_db
+def test_csv_export_lists_products_with_tools_and_pictures(catalog):
+    rows = list(csv.DictReader(StringIO(''.join(export_catalog('csv')))))
+    assert tuple(rows[0]) == EXPORT_FIELDS
+    assert len(rows) == 5
+    first = rows[0]
+    assert first['slug'] == catalog.slug
+    assert first['category'] == 'Test Category'
+    assert first['tools'] == 'Another Tool|Test Tool 3'
+    assert first['gross_price'] == '124.00'
+    assert first['pictures'].endswith('.jpg')
+
+
+@pytest.mark.django_db
+def test_export_query_count_depends_on_chunks_only(catalog):
+    with CaptureQueriesContext(connection) as queries:
+        records = [json.loads(line) for line in export_catalog('jsonl', chunk_size=2)]
+    assert [record['id'] for record in records] == sorted(Product.objects.values_list('pk', flat=True))
+    # One product query, then a tool and a picture query per chunk of two products.
+    assert len(queries) == 1 + 3 * 2
+
+
+@pytest.mark.django_db
+def test_export_can_be_imported_again(tmp_path, catalog):
+    path = tmp_path / 'catalog.jsonl'
+    call_command('export_catalog', '--format', 'jsonl', '--output', str(path))
+    Product.objects.filter(pk=catalog.pk).update(name='Changed')
+    call_command('import_catalog', str(path), stdout=StringIO())
+    catalog.refresh_from_db()
+    assert catalog.name == 'Test Product'
+    assert Product.objects.count() == 5
+
+
+@pytest.mark.django_db
+def test_export_view_streams_for_staff_only(client, user, catalog):
+    url = reverse('catalog_export')
+    assert client.get(url).status_code == 302
+    client.login(username='test_user', password='test_password')
+    assert client.get(url).status_code == 403
+
+
+@pytest.mark.django_db
+def test_export_view_streams_jsonl(staff_client, catalog):
+    response = staff_client.get(reverse('catalog_export'), {'format': 'jsonl'})
+    assert response.streaming
+    assert response['Content-Type'] == 'application/x-ndjson'
+    records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+    assert len(records) == 5
+    assert records[0]['pictures'][0].startswith('http://testserver/')
+    assert staff_client.get(reverse('catalog_export'), {'format': 'xml'}).status_code == 400
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('export_format', ['csv', 'jsonl'])
+def test_export_view_streams_one_piece_per_chunk(staff_client, catalog, settings, export_format):
+    settings.CATALOG_EXPORT_CHUNK_SIZE = 2
+    settings.QUERY_BUDGETS = {'catalog_export': (3, None, 2)}
+    response = staff_client.get(reverse('catalog_export'), {'format': export_format})
+    pieces = [piece.decode().splitlines() for piece in response.streaming_content]
+    header = [','.join(EXPORT_FIELDS)] if export_format == 'csv' else []
+    assert [len(piece) for piece in pieces] == [len(header) + 2, 2, 1]
+    assert pieces[0][:len(header)] == header
+
+
+@pytest.mark.django_db
+def test_export_view_budget_grows_with_chunks(staff_client, catalog, settings):
+    settings.CATALOG_EXPORT_CHUNK_SIZE = 2
+
+    # The budget is checked once the stream ends, against the chunks it streamed.
+    settings.QUERY_BUDGETS = {'catalog_export': (3, None, 1)}
+    response = staff_client.get(reverse('catalog_export'), {'format': 'jsonl'})
+    with pytest.raises(QueryBudgetExceeded, match='streaming 3 chunks, over its budget of 3 queries, 1 per chunk'):
+        list(response.streaming_content)
@@ -0,0 +1,61 @@
+import pytest
+from django.urls import reverse
+
+from shop.cache import get_version
+from shop.models import Category
+from shop.my_contex_processor import category_cache
+
+
+@pytest.mark.django_db
+def test_category_list_is_loaded_once(client, test_category):
+    client.get(reverse('index'))
+    client.get(reverse('index'))
+    assert category_cache.misses == 1
+    assert category_cache.hits == 1
+
+
+@pytest.mark.django_db
+def test_cached_category_list_skips_query(client, test_category, django_assert_num_queries):
+    client.get(reverse('index'))
+    with django_assert_num_queries(0):
+        response = client.get(reverse('index'))
+    assert response.context['categories'][0].name == "Test Category"
+
+
+@pytest.mark.django_db
+def test_category_save_invalidates_cache(client, test_category, django_capture_on_commit_callbacks):
+    client.get(reverse('index'))
+    with django_capture_on_commit_callbacks(execute=True):
+        Category.objects.create(name="Second Category", description="second")
+    response = client.get(reverse('index'))
+    assert len(response.context['categories']) == 2
+
+
+@pytest.mark.django_db
+def test_category_delete_invalidates_cache(client, test_category, django_capture_on_commit_callbacks):
+    client.get(reverse('index'))
+    with django_capture_on_commit_callbacks(execute=True):
+        test_category.delete()
+    response = client.get(reverse('index'))
+    assert len(response.context['categories']) == 0
+
+
+@pytest.mark.django_db
+def test_category_cache_is_invalidated_after_commit(client, test_category, django_capture_on_commit_callbacks):
+    client.get(reverse('index'))
+    version = get_version(category_cache.namespace)
+    with django_capture_on_commit_callbacks() as callbacks:
+        Category.objects.create(name="Second Category", description="second")
+    # Until the commit, readers keep the committed list under the current version.
+    assert get_version(category_cache.namespace) == version
+    assert len(client.get(reverse('index')).context['categories']) == 1
+    for callback in callbacks:
+        callback()
+    assert get_version(category_cache.namespace) != version
+
+
+def test_versioned_cache_is_bounded():
+    category_cache.clear()
+    for i in range(category_cache.maxsize + 5):
+        category_cache.get_or_set(i, lambda: i)
+    assert category_cache.stats()['size'] == category_cache.maxsize
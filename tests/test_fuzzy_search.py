@@ -0,0 +1,35 @@
+import pytest
+from django.urls import reverse
+
+from shop.fuzzy import SymmetricDeleteIndex, edit_distance
+from shop.models import Product
+
+
+def test_edit_distance_counts_transpositions():
+    assert edit_distance('hamer', 'hammer', 2) == 1
+    assert edit_distance('scerw', 'screw', 2) == 1
+    assert edit_distance('abc', 'xyz', 2) == 3
+
+
+def test_symmetric_delete_lookup():
+    index = SymmetricDeleteIndex({'hammer': 10, 'hamper': 1, 'screwdriver': 4, 'saw': 7})
+    assert index.lookup('hamer')[0] == ('hammer', 1)
+    assert index.lookup('scrwdriver') == [('screwdriver', 1)]
+    assert index.lookup('sx') == []
+    assert index.correct(['hamer', 'saw']) == ['hammer', 'saw']
+    assert index.correct(['saw']) is None
+
+
+@pytest.mark.django_db
+def test_search_view_falls_back_to_fuzzy_matching(client, test_category):
+    hammer = Product.objects.create(name='Claw hammer', category=test_category, vat='0.24')
+    response = client.post(reverse('search'), {'searched': 'clw hamer'})
+    assert list(response.context['products']) == [hammer]
+    assert response.context['corrected'] == 'claw hammer'
+    assert 'Showing results for' in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_exact_matches_skip_fuzzy_matching(client, test_product):
+    response = client.post(reverse('search'), {'searched': 'test product'})
+    assert response.context['corrected'] is None
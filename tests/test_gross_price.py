@@ -0,0 +1,97 @@
+import pytest
+from django.db.models import F
+from django.urls import reverse
+
+from shop.cache import CATALOG_NAMESPACE, get_version
+from shop.models import Product, Tool
+
+
+@pytest.fixture
+def priced(test_category):
+    # Net 100 at 24% VAT is dearer than net 110 at 11% VAT.
+    return [
+        Product.objects.create(name=name, netto_price=net, vat=vat, category=test_category)
+        for name, net, vat in [('Cheap', 50, '0.24'), ('High VAT', 100, '0.24'), ('Low VAT', 110, '0.11')]
+    ]
+
+
+@pytest.mark.django_db
+def test_gross_price_is_kept_on_save(test_product):
+    assert test_product.gross_price_cents == 12400
+    test_product.netto_price = 200
+    test_product.save(update_fields=['netto_price'])
+    test_product.refresh_from_db()
+    assert test_product.gross_price_cents == 24800
+    assert str(test_product.gross_price) == '248.00'
+
+
+@pytest.mark.django_db
+def test_gross_price_follows_bulk_changes(priced):
+    Product.objects.filter(vat='0.24').update(vat='0.11')
+    assert sorted(Product.objects.values_list('gross_price_cents', flat=True)) == [5550, 11100, 12210]
+    Product.objects.update(netto_price=F('netto_price') + 10)
+    assert sorted(Product.objects.values_list('gross_price_cents', flat=True)) == [6660, 12210, 13320]
+    cheap = Product.objects.get(name='Cheap')
+    cheap.netto_price = 1
+    Product.objects.bulk_update([cheap], ['netto_price'])
+    cheap.refresh_from_db()
+    assert cheap.gross_price_cents == 111
+
+
+@pytest.mark.django_db
+def test_bulk_price_changes_invalidate_cached_pages(client, test_category, priced, django_capture_on_commit_callbacks):
+    url = reverse('categories', kwargs={'slug': test_category.slug})
+    product_url = reverse('product', kwargs={'slug': priced[0].slug})
+    client.get(url, {'sort': 'price'})
+    client.get(product_url)
+    version = get_version(CATALOG_NAMESPACE)
+    with django_capture_on_commit_callbacks(execute=True):
+        Product.objects.filter(pk=priced[0].pk).update(netto_price=1000)
+    assert get_version(CATALOG_NAMESPACE) != version
+    response = client.get(url, {'sort': 'price'})
+    assert [product.name for product in response.context['products']] == ['Low VAT', 'High VAT', 'Cheap']
+    assert '1240' in client.get(product_url).content.decode()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Product.objects.bulk_update([Product(pk=priced[0].pk, netto_price=1, category=test_category)], ['netto_price'])
+    response = client.get(url, {'sort': 'price'})
+    assert [product.name for product in response.context['products']] == ['Cheap', 'Low VAT', 'High VAT']
+
+
+@pytest.mark.django_db
+def test_refresh_gross_prices(priced):
+    Product.objects.all().update(gross_price_cents=0)
+    Product.objects.filter(pk=priced[0].pk).refresh_gross_prices()
+    assert Product.objects.get(pk=priced[0].pk).gross_price_cents == 6200
+    assert Product.objects.get(pk=priced[1].pk).gross_price_cents == 0
+
+
+@pytest.mark.django_db
+def test_category_sorted_by_gross_price(client, test_category, priced):
+    url = reverse('categories', kwargs={'slug': test_category.slug})
+    response = client.get(url, {'sort': 'price'})
+    assert [product.name for product in response.context['products']] == ['Cheap', 'Low VAT', 'High VAT']
+    response = client.get(url, {'sort': '-price'})
+    assert [product.name for product in response.context['products']] == ['High VAT', 'Low VAT', 'Cheap']
+
+
+@pytest.mark.django_db
+def test_category_price_range_filters_products_and_facets(client, test_category, priced):
+    tool = Tool.objects.create(name='Range Tool')
+    for product in priced:
+        product.tool.add(tool)
+    url = reverse('categories', kwargs={'slug': test_category.slug})
+    response = client.get(url, {'min_price': '100', 'max_price': '122,10'})
+    assert [product.name for product in response.context['products']] == ['Low VAT']
+    assert {t.name: t.facet_count for t in response.context['tools']} == {'Range Tool': 1}
+    assert 'min_price=100&amp;max_price=122%2C10' in response.content.decode()
+
+    response = client.get(url, {'min_price': 'cheap'})
+    assert len(response.context['products']) == 3
+
+
+@pytest.mark.django_db
+def test_search_price_range(client, test_category, priced):
+    response = client.get(reverse('search'), {'searched': 'vat', 'max_price': '123'})
+    assert [product.name for product in response.context['products']] == ['Low VAT']
+    assert response.context['sort'] == 'price'
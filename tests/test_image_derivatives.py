@@ -0,0 +1,125 @@
+from io import BytesIO
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from PIL import Image
+
+from shop.images import DerivativeWorkers, available_formats, generate_derivatives
+from shop.models import Picture
+
+
+# conftest builds derivatives inline, keep the real pool for the threaded test.
+SUBMIT = DerivativeWorkers.submit
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
+def upload(name, size=(1600, 1000), mode='RGB', color='orange'):
+    data = BytesIO()
+    image = Image.new(mode, size, color)
+    image.save(data, 'PNG' if mode == 'RGBA' else 'JPEG')
+    return SimpleUploadedFile(name, data.getvalue())
+
+
+@pytest.mark.django_db
+def test_derivatives_cover_sizes_and_formats(test_product):
+    picture = Picture.objects.create(product=test_product, image=upload('drill.jpg'))
+    derivatives = generate_derivatives(picture)
+    assert sorted(derivatives) == sorted(available_formats())
+    assert 'webp' in derivatives and 'jpeg' in derivatives
+    for key, entries in derivatives.items():
+        assert [width for width, _ in entries] == [320, 640, 1280]
+        for width, name in entries:
+            assert name.startswith('images/derivatives/') and name.endswith(f'.{key}')
+            with picture.image.storage.open(name) as stored:
+                assert Image.open(stored).width == width
+    picture.refresh_from_db()
+    assert picture.derivatives == derivatives
+
+
+@pytest.mark.django_db
+def test_small_and_transparent_images_are_not_upscaled(test_product):
+    picture = Picture.objects.create(product=test_product, image=upload('icon.png', (200, 100), 'RGBA', (0, 0, 0, 0)))
+    derivatives = generate_derivatives(picture)
+    assert [width for width, _ in derivatives['jpeg']] == [200]
+
+
+@pytest.mark.django_db
+def test_identical_images_share_files(test_product):
+    first = Picture.objects.create(product=test_product, image=upload('a.jpg'))
+    second = Picture.objects.create(product=test_product, image=upload('b.jpg'))
+    assert generate_derivatives(first) == generate_derivatives(second)
+
+
+@pytest.mark.django_db
+def test_upload_builds_derivatives_after_commit(test_product, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        picture = Picture.objects.create(product=test_product, image=upload('saw.jpg'))
+    picture.refresh_from_db()
+    assert picture.derivatives['webp']
+    # Saving without a new image does not rebuild them.
+    picture.derivatives = {}
+    with django_capture_on_commit_callbacks(execute=True):
+        picture.save()
+    picture.refresh_from_db()
+    assert picture.derivatives == {}
+
+
+@pytest.mark.django_db
+def test_derivatives_are_built_off_the_request(test_product, monkeypatch, django_capture_on_commit_callbacks):
+    queued = []
+    monkeypatch.setattr(DerivativeWorkers, 'submit', lambda self, picture_id: queued.append(picture_id))
+    with django_capture_on_commit_callbacks(execute=True):
+        picture = Picture.objects.create(product=test_product, image=upload('queued.jpg'))
+    picture.refresh_from_db()
+    assert queued == [picture.pk] and picture.derivatives == {}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_derivative_workers_build_in_a_thread(test_product, concurrent_db):
+    picture = Picture.objects.create(product=test_product, image=upload('threaded.jpg'))
+    Picture.objects.filter(pk=picture.pk).update(derivatives={})
+    workers = DerivativeWorkers(max_workers=1)
+    SUBMIT(workers, picture.pk)
+    workers.shutdown()
+    picture.refresh_from_db()
+    assert picture.derivatives['jpeg']
+
+
+@pytest.mark.django_db
+def test_responsive_image_tag(test_product):
+    picture = Picture.objects.create(product=test_product, image=upload('hammer.jpg'))
+    template = Template('{% load shop_images %}{% responsive_image picture sizes="200px" alt="Hammer" %}')
+    assert template.render(Context({'picture': picture})).startswith(f'<img src="/media/{picture.image.name}"')
+    generate_derivatives(picture)
+    html = template.render(Context({'picture': picture}))
+    assert html.startswith('<picture><source type="image/')
+    assert '<source type="image/webp"' in html
+    assert '.webp 320w, ' in html and '.jpeg 1280w"' in html
+    assert 'alt="Hammer"' in html
+
+
+@pytest.mark.django_db
+def test_generate_thumbnails_backfills(test_product):
+    pictures = [Picture.objects.create(product=test_product, image=upload(f'p{i}.jpg', color=f'#{i}0{i}0{i}0')) for i in range(3)]
+    Picture.objects.create(product=test_product, image='images/missing.jpg')
+    call_command('generate_thumbnails', workers=0, batch_size=2)
+    for picture in pictures:
+        picture.refresh_from_db()
+        assert [width for width, _ in picture.derivatives['webp']] == [320, 640, 1280]
+    assert Picture.objects.filter(derivatives={}).count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_generate_thumbnails_in_worker_processes(test_product):
+    picture = Picture.objects.create(product=test_product, image=upload('pool.jpg'))
+    Picture.objects.filter(pk=picture.pk).update(derivatives={})
+    call_command('generate_thumbnails', workers=2)
+    picture.refresh_from_db()
+    assert picture.derivatives['jpeg']
@@ -0,0 +1,151 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from shop.facets import tool_index
+from shop.importing import CatalogImporter, SlugAllocator, parse_row
+from shop.models import Category, Product, SearchIndexEntry, Tool
+from shop.search import search
+
+CSV_FEED = (
+    'name,category,slug,netto_price,vat,stock,tools\n'
+    'Claw Hammer,Hand Tools,,1000,24,5,Hammer|Nails\n'
+    'Claw Hammer,Hand Tools,,1200,0.11,2,Hammer\n'
+    'Saw,Garden,,3000,24%,1,\n'
+    ',Garden,,1,24,1,\n'
+    'Drill,Power Tools,,abc,24,1,\n'
+)
+
+
+def write_feed(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_text(content)
+    return str(path)
+
+
+def test_slug_allocator_skips_taken_slugs():
+    slugs = SlugAllocator(['hammer', 'hammer-2'])
+    assert [slugs.allocate('Hammer') for _ in range(3)] == ['hammer-1', 'hammer-3', 'hammer-4']
+    assert slugs.allocate('Saw') == 'saw'
+    assert slugs.claim('saw') == 'saw-1'
+    assert slugs.claim('drill') == 'drill'
+
+
+def test_parse_row_normalizes_values():
+    row = parse_row({'name': ' Saw ', 'category': 'Garden', 'vat': '11%', 'stock': '3', 'tools': 'A| B|A|'})
+    assert row['name'] == 'Saw'
+    assert row['vat'] == '0.11'
+    assert row['stock'] == 3
+    assert row['tools'] == ['A', 'B']
+    with pytest.raises(ValueError):
+        parse_row({'name': 'Saw', 'category': 'Garden', 'vat': '7'})
+    with pytest.raises(ValueError):
+        parse_row('[1, 2]')
+
+
+@pytest.mark.django_db
+def test_import_csv_creates_categories_tools_and_unique_slugs(tmp_path, test_category):
+    Product.objects.create(name='Claw Hammer', category=test_category, vat='0.24')
+    path = write_feed(tmp_path, 'feed.csv', CSV_FEED)
+    stderr = StringIO()
+    call_command('import_catalog', path, stdout=StringIO(), stderr=stderr)
+
+    assert 'Line 5' in stderr.getvalue() and 'Line 6' in stderr.getvalue()
+    hammers = Product.objects.filter(name='Claw Hammer').order_by('pk')
+    assert [hammer.slug for hammer in hammers] == ['claw-hammer', 'claw-hammer-1', 'claw-hammer-2']
+    imported = hammers[1]
+    assert imported.category.name == 'Hand Tools'
+    assert imported.gross_price_cents == 124000
+    assert sorted(imported.tool.values_list('name', flat=True)) == ['Hammer', 'Nails']
+    assert hammers[2].vat == '0.11'
+    assert Category.objects.get(name='Garden').slug == 'garden'
+    assert Tool.objects.filter(name='Hammer').count() == 1
+    assert SearchIndexEntry.objects.filter(product=imported, term='nail').exists()
+    assert not (tmp_path / 'feed.csv.checkpoint').exists()
+
+
+@pytest.mark.django_db
+def test_import_jsonl_updates_products_by_slug(tmp_path, test_product):
+    rows = [
+        {'name': 'Renamed', 'category': test_product.category.name, 'slug': test_product.slug,
+         'netto_price': 500, 'vat': '0.24', 'tools': ['Wrench']},
+        'not json',
+    ]
+    path = write_feed(tmp_path, 'feed.jsonl', '\n'.join(json.dumps(row) if isinstance(row, dict) else row for row in rows))
+    call_command('import_catalog', path, stdout=StringIO(), stderr=StringIO())
+
+    test_product.refresh_from_db()
+    assert test_product.name == 'Renamed'
+    assert test_product.gross_price_cents == 62000
+    assert list(test_product.tool.values_list('name', flat=True)) == ['Wrench']
+    assert Product.objects.count() == 1
+    index = tool_index.get(test_product.category_id)
+    assert index.product_ids(index.match([Tool.objects.get(name='Wrench').pk])) == [test_product.pk]
+
+
+@pytest.mark.django_db
+def test_import_batch_keeps_last_of_duplicate_slugs(test_category):
+    hammer = Product.objects.create(name='Claw Hammer', category=test_category, vat='0.24')
+    rows = [
+        parse_row({'name': 'Claw Hammer', 'category': test_category.name, 'slug': hammer.slug, 'netto_price': 100}),
+        parse_row({'name': 'Claw Hammer', 'category': test_category.name, 'slug': hammer.slug, 'netto_price': 200}),
+        parse_row({'name': 'Saw', 'category': test_category.name, 'slug': 'new-saw'}),
+        parse_row({'name': 'Saw', 'category': test_category.name, 'slug': 'new-saw', 'stock': 4}),
+    ]
+    assert CatalogImporter().import_batch(rows) == (1, 1)
+
+    hammer.refresh_from_db()
+    assert hammer.netto_price == 200
+    assert SearchIndexEntry.objects.filter(product=hammer, term='hammer').count() == 1
+    assert list(search('hammer')) == [hammer]
+    assert Product.objects.get(name='Saw').stock == 4
+
+
+@pytest.mark.django_db
+def test_import_moving_products_invalidates_old_category(test_product, django_capture_on_commit_callbacks):
+    old_category = test_product.category
+    tool = test_product.tool.get()
+    tool_index.get(old_category.pk)
+    row = parse_row({'name': test_product.name, 'category': 'Garden', 'slug': test_product.slug, 'tools': tool.name})
+    with django_capture_on_commit_callbacks(execute=True):
+        CatalogImporter().import_batch([row])
+    index = tool_index.get(old_category.pk)
+    assert index.product_ids(index.match([tool.pk])) == []
+    index = tool_index.get(Category.objects.get(name='Garden').pk)
+    assert index.product_ids(index.match([tool.pk])) == [test_product.pk]
+
+
+@pytest.mark.django_db
+def test_import_batch_query_count_is_constant(test_category):
+    importer = CatalogImporter(update_search_index=False)
+    rows = [parse_row({'name': f'Product {i}', 'category': 'Bulk', 'tools': f'Tool {i % 3}'}) for i in range(300)]
+    with CaptureQueriesContext(connection) as queries:
+        importer.import_batch(rows)
+    assert Product.objects.filter(category__name='Bulk').count() == 300
+    assert len(queries) < 20
+
+
+@pytest.mark.django_db
+def test_import_resumes_after_checkpoint(tmp_path, test_category):
+    lines = [json.dumps({'name': f'Item {i}', 'category': 'Resumed'}) for i in range(5)]
+    path = write_feed(tmp_path, 'feed.jsonl', '\n'.join(lines))
+    checkpoint = tmp_path / 'state.json'
+    call_command('import_catalog', path, '--batch-size', '2', '--checkpoint', str(checkpoint), stdout=StringIO())
+    assert Product.objects.count() == 5
+
+    # Pretend the run died after the first batch of two rows.
+    Product.objects.exclude(name__in=['Item 0', 'Item 1']).delete()
+    stat = (tmp_path / 'feed.jsonl').stat()
+    checkpoint.write_text(json.dumps({'feed': path, 'size': stat.st_size, 'mtime': stat.st_mtime, 'rows': 2}))
+    call_command(
+        'import_catalog', path, '--batch-size', '2', '--checkpoint', str(checkpoint), '--resume', stdout=StringIO()
+    )
+    assert sorted(Product.objects.values_list('name', flat=True)) == [f'Item {i}' for i in range(5)]
+
+    checkpoint.write_text(json.dumps({'feed': path, 'size': 1, 'mtime': stat.st_mtime, 'rows': 2}))
+    with pytest.raises(CommandError):
+        call_command('import_catalog', path, '--checkpoint', str(checkpoint), '--resume', stdout=StringIO())
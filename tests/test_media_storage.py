@@ -0,0 +1,124 @@
+import os
+import time
+from io import BytesIO
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from PIL import Image
+
+from shop.images import generate_derivatives
+from shop.models import MediaBlob, Picture, derivative_names
+from shop.storage import get_picture_storage, serve_media
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
+def blob_files(root):
+    return sorted(
+        os.path.relpath(os.path.join(directory, name), root)
+        for directory, _, names in os.walk(root)
+        for name in names
+    )
+
+
+def age(name, seconds=7200):
+    path = get_picture_storage().path(name)
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+@pytest.mark.django_db
+def test_identical_uploads_share_one_blob(test_product, media_root):
+    first = Picture.objects.create(product=test_product, image=SimpleUploadedFile('a.JPG', b'same bytes'))
+    second = Picture.objects.create(product=test_product, image=SimpleUploadedFile('b.jpg', b'same bytes'))
+    other = Picture.objects.create(product=test_product, image=SimpleUploadedFile('c.jpg', b'other bytes'))
+    assert first.image.name == second.image.name != other.image.name
+    assert first.image.name.startswith('images/') and first.image.name.endswith('.jpg')
+    assert len(blob_files(media_root)) == 2
+    blob = MediaBlob.objects.get(name=first.image.name)
+    assert (blob.refcount, blob.size) == (2, len(b'same bytes'))
+
+
+@pytest.mark.django_db
+def test_references_follow_pictures(test_product):
+    first = Picture.objects.create(product=test_product, image=SimpleUploadedFile('a.jpg', b'one'))
+    second = Picture.objects.create(product=test_product, image=SimpleUploadedFile('b.jpg', b'one'))
+    name = first.image.name
+    first.delete()
+    assert MediaBlob.objects.get(name=name).refcount == 1
+    second.image = SimpleUploadedFile('c.jpg', b'two')
+    second.save()
+    assert MediaBlob.objects.get(name=name).refcount == 0
+    assert MediaBlob.objects.get(name=second.image.name).refcount == 1
+
+
+@pytest.mark.django_db
+def test_gc_deletes_unreferenced_blobs_in_batches(test_product, media_root):
+    pictures = [
+        Picture.objects.create(product=test_product, image=SimpleUploadedFile(f'{i}.jpg', f'{i}'.encode()))
+        for i in range(5)
+    ]
+    kept = pictures.pop()
+    for picture in pictures:
+        picture.delete()
+        age(picture.image.name)
+    MediaBlob.objects.filter(refcount=0).update(updated_at=MediaBlob.objects.first().updated_at.replace(year=2000))
+    call_command('gc_media_blobs', batch_size=2)
+    assert blob_files(media_root) == [kept.image.name]
+    assert list(MediaBlob.objects.values_list('name', flat=True)) == [kept.image.name]
+
+
+@pytest.mark.django_db
+def test_gc_keeps_recently_released_and_reused_blobs(test_product, media_root):
+    picture = Picture.objects.create(product=test_product, image=SimpleUploadedFile('a.jpg', b'a'))
+    picture.delete()
+    call_command('gc_media_blobs')
+    assert MediaBlob.objects.filter(name=picture.image.name).exists()
+    MediaBlob.objects.update(updated_at=MediaBlob.objects.get().updated_at.replace(year=2000))
+    # The file is fresher than its row, as when the same content was just uploaded again.
+    call_command('gc_media_blobs')
+    assert not MediaBlob.objects.exists()
+    assert blob_files(media_root) == [picture.image.name]
+
+
+def jpeg(color):
+    data = BytesIO()
+    Image.new('RGB', (700, 400), color).save(data, 'JPEG')
+    return SimpleUploadedFile('photo.jpg', data.getvalue())
+
+
+@pytest.mark.django_db
+def test_derivatives_are_counted_and_collected(test_product, media_root):
+    first = Picture.objects.create(product=test_product, image=jpeg('red'))
+    second = Picture.objects.create(product=test_product, image=jpeg('red'))
+    names = derivative_names(generate_derivatives(first))
+    generate_derivatives(second)
+    assert names and all(MediaBlob.objects.get(name=name).refcount == 2 for name in names)
+
+    # A rebuild moves the references instead of adding new ones.
+    generate_derivatives(first)
+    assert all(MediaBlob.objects.get(name=name).refcount == 2 for name in names)
+
+    first.refresh_from_db()
+    second.refresh_from_db()
+    first.delete()
+    second.delete()
+    assert all(MediaBlob.objects.get(name=name).refcount == 0 for name in names)
+    for name in names + [first.image.name]:
+        age(name)
+    MediaBlob.objects.update(updated_at=MediaBlob.objects.first().updated_at.replace(year=2000))
+    call_command('gc_media_blobs')
+    assert blob_files(media_root) == []
+
+
+@pytest.mark.django_db
+def test_hashed_media_urls_are_immutable(rf, test_product):
+    picture = Picture.objects.create(product=test_product, image=SimpleUploadedFile('a.jpg', b'cached'))
+    root = get_picture_storage().location
+    response = serve_media(rf.get(picture.image.url), picture.image.name, document_root=root)
+    assert response['Cache-Control'] == 'public, max-age=31536000, immutable'
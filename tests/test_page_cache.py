@@ -0,0 +1,115 @@
+import pytest
+from django.urls import reverse
+
+from shop.models import Category, Picture, Product, Tool
+
+
+def get(client, url, data=None):
+    response = client.get(url, data)
+    assert response.status_code == 200
+    return response
+
+
+@pytest.mark.django_db
+def test_anonymous_product_page_is_cached(client, test_product, django_assert_num_queries):
+    url = reverse('product', kwargs={'slug': test_product.slug})
+    assert get(client, url)['X-Page-Cache'] == 'miss'
+    with django_assert_num_queries(0):
+        response = get(client, url)
+    assert response['X-Page-Cache'] == 'hit'
+    assert test_product.name in response.content.decode()
+    assert 'csrfmiddlewaretoken' not in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_logged_in_users_bypass_the_cache(client, user, test_product):
+    url = reverse('product', kwargs={'slug': test_product.slug})
+    get(client, url)
+    client.force_login(user)
+    response = get(client, url)
+    assert 'X-Page-Cache' not in response
+    assert user.username in response.content.decode()
+    assert 'csrfmiddlewaretoken' in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_product_changes_invalidate_only_their_pages(
+    client, test_product, test_category, django_capture_on_commit_callbacks
+):
+    other_category = Category.objects.create(name='Other Category')
+    other = Product.objects.create(name='Other Product', category=other_category, vat='0.24')
+    urls = [
+        reverse('product', kwargs={'slug': test_product.slug}),
+        reverse('product', kwargs={'slug': other.slug}),
+        reverse('categories', kwargs={'slug': test_category.slug}),
+        reverse('categories', kwargs={'slug': other_category.slug}),
+    ]
+    for url in urls:
+        get(client, url)
+    test_product.name = 'Renamed Product'
+    with django_capture_on_commit_callbacks(execute=True):
+        test_product.save()
+    assert [get(client, url)['X-Page-Cache'] for url in urls] == ['miss', 'hit', 'miss', 'hit']
+    assert 'Renamed Product' in get(client, urls[2]).content.decode()
+
+
+@pytest.mark.django_db
+def test_picture_and_tool_changes_invalidate_pages(
+    client, test_product, test_category, django_capture_on_commit_callbacks
+):
+    product_url = reverse('product', kwargs={'slug': test_product.slug})
+    category_url = reverse('categories', kwargs={'slug': test_category.slug})
+    get(client, product_url)
+    get(client, category_url)
+    with django_capture_on_commit_callbacks(execute=True):
+        Picture.objects.create(product=test_product, image='images/new.jpg')
+    assert get(client, product_url)['X-Page-Cache'] == 'miss'
+    assert get(client, category_url)['X-Page-Cache'] == 'miss'
+
+    tool = test_product.tool.get()
+    tool.name = 'Renamed Tool'
+    with django_capture_on_commit_callbacks(execute=True):
+        tool.save()
+    assert 'Renamed Tool' in get(client, product_url).content.decode()
+    assert 'Renamed Tool' in get(client, category_url).content.decode()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        unrelated = Tool.objects.create(name='Unrelated Tool')
+        unrelated.name = 'Still Unrelated'
+        unrelated.save()
+    assert get(client, product_url)['X-Page-Cache'] == 'hit'
+
+
+@pytest.mark.django_db
+def test_pages_are_invalidated_after_commit(client, test_product, django_capture_on_commit_callbacks):
+    url = reverse('product', kwargs={'slug': test_product.slug})
+    get(client, url)
+    with django_capture_on_commit_callbacks() as callbacks:
+        test_product.name = 'Renamed Product'
+        test_product.save()
+    # A request racing the write still finds the page it may keep caching.
+    assert get(client, url)['X-Page-Cache'] == 'hit'
+    for callback in callbacks:
+        callback()
+    assert 'Renamed Product' in get(client, url).content.decode()
+
+
+@pytest.mark.django_db
+def test_category_rename_invalidates_menu(client, test_product, test_category, django_capture_on_commit_callbacks):
+    url = reverse('product', kwargs={'slug': test_product.slug})
+    get(client, url)
+    with django_capture_on_commit_callbacks(execute=True):
+        Category.objects.create(name='New Category')
+    response = get(client, url)
+    assert response['X-Page-Cache'] == 'miss'
+    assert 'New Category' in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_tool_filters_are_normalized(client, test_category, test_product):
+    first, second = Tool.objects.create(name='First Tool'), Tool.objects.create(name='Second Tool')
+    test_product.tool.add(first, second)
+    url = reverse('categories', kwargs={'slug': test_category.slug})
+    assert get(client, url, {'tools': [second.pk, first.pk]})['X-Page-Cache'] == 'miss'
+    assert get(client, url, {'tools': [first.pk, second.pk], 'utm_source': 'mail'})['X-Page-Cache'] == 'hit'
+    assert get(client, url, {'tools': [first.pk]})['X-Page-Cache'] == 'miss'
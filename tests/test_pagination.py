@@ -0,0 +1,116 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from shop.models import Category, Product, Tool
+from shop.pagination import KeysetPaginator, IdListPaginator, PRODUCT_SORTS
+from shop.views import CategoryView
+
+
+@pytest.fixture
+def small_pages(monkeypatch):
+    monkeypatch.setattr(CategoryView, 'paginate_by', 4)
+
+
+@pytest.fixture
+def listed(test_category):
+    return [
+        Product.objects.create(
+            name=f'Item {i % 5}', slug=f'item-{i}', netto_price=(i * 7) % 10, category=test_category, vat='0.24'
+        )
+        for i in range(10)
+    ]
+
+
+def walk(paginator, cursor=None, backwards=False):
+    pages = []
+    page = paginator.page(cursor)
+    while True:
+        pages.append([item.pk for item in page])
+        cursor = page.previous_cursor if backwards else page.next_cursor
+        if cursor is None:
+            return pages
+        page = paginator.page(cursor)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('sort', list(PRODUCT_SORTS))
+def test_keyset_pages_cover_ordering_with_ties(listed, sort):
+    queryset = Product.objects.all()
+    expected = list(queryset.order_by(*PRODUCT_SORTS[sort]).values_list('pk', flat=True))
+    paginator = KeysetPaginator(queryset, PRODUCT_SORTS[sort], 3)
+    pages = walk(paginator)
+    assert [pk for page in pages for pk in page] == expected
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+
+    last = paginator.page(paginator.page(paginator.page(paginator.page().next_cursor).next_cursor).next_cursor)
+    assert [pk for page in walk(paginator, last.previous_cursor, backwards=True) for pk in page] == (
+        expected[6:9] + expected[3:6] + expected[0:3]
+    ) and not last.has_next
+
+
+@pytest.mark.django_db
+def test_invalid_cursor_starts_over(listed):
+    paginator = KeysetPaginator(Product.objects.all(), PRODUCT_SORTS['name'], 3)
+    first = paginator.page()
+    assert [item.pk for item in paginator.page('forged')] == [item.pk for item in first]
+    other_sort = KeysetPaginator(Product.objects.all(), PRODUCT_SORTS['price'], 3)
+    assert [item.pk for item in other_sort.page(first.next_cursor)] == [item.pk for item in other_sort.page()]
+
+
+def test_id_list_pages():
+    paginator = IdListPaginator(list(range(100, 110)), 4)
+    first = paginator.page()
+    second = paginator.page(first.next_cursor)
+    third = paginator.page(second.next_cursor)
+    assert (first.object_list, second.object_list, third.object_list) == (
+        [100, 101, 102, 103], [104, 105, 106, 107], [108, 109]
+    )
+    assert not third.has_next and not first.has_previous
+    assert paginator.page(third.previous_cursor).object_list == second.object_list
+
+
+def test_id_list_resumes_at_position_of_dropped_id():
+    first = IdListPaginator(list(range(100, 110)), 4).page()
+    rebuilt = IdListPaginator([100, 101, 102, 104, 105, 106, 107, 108, 109], 4)
+    assert rebuilt.page(first.next_cursor).object_list == [104, 105, 106, 107]
+    third = IdListPaginator(list(range(100, 110)), 4).page(rebuilt.page(first.next_cursor).next_cursor)
+    rebuilt = IdListPaginator([100, 101, 102, 103, 104, 105, 106, 107, 109], 4)
+    assert rebuilt.page(third.previous_cursor).object_list == [104, 105, 106, 107]
+
+
+@pytest.mark.django_db
+def test_category_pages_keep_filters(client, small_pages, test_category, listed):
+    tool = Tool.objects.create(name='Pager Tool')
+    for product in listed[:7]:
+        product.tool.add(tool)
+    url = reverse('categories', kwargs={'slug': test_category.slug})
+    response = client.get(url, {'tools': tool.pk, 'sort': '-price'})
+    page = response.context['page_obj']
+    assert len(response.context['products']) == 4 and page.has_next
+    assert f'?tools={tool.pk}&amp;sort=-price&cursor=' in response.content.decode()
+    response = client.get(url, {'tools': tool.pk, 'sort': '-price', 'cursor': page.next_cursor})
+    seen = [product.pk for product in response.context['products']]
+    assert len(seen) == 3 and not response.context['page_obj'].has_next
+    assert set(seen) < {product.pk for product in listed[:7]}
+
+
+@pytest.mark.django_db
+def test_deep_category_pages_use_seek_not_offset(client, small_pages, test_category, listed):
+    url = reverse('categories', kwargs={'slug': test_category.slug})
+    cursor = client.get(url).context['page_obj'].next_cursor
+    cursor = client.get(url, {'cursor': cursor}).context['page_obj'].next_cursor
+    with CaptureQueriesContext(connection) as queries:
+        client.get(url, {'cursor': cursor})
+    listing = [query['sql'] for query in queries if 'LIMIT' in query['sql'] and '"shop_product"."name" >' in query['sql']]
+    assert listing and 'OFFSET' not in listing[0]
+
+
+@pytest.mark.django_db
+def test_search_sorted_by_price(client, test_category):
+    for price in (30, 10, 20):
+        Product.objects.create(name=f'Chisel {price}', netto_price=price, category=test_category, vat='0.24')
+    response = client.get(reverse('search'), {'searched': 'chisel', 'sort': 'price'})
+    assert [product.netto_price for product in response.context['products']] == [10, 20, 30]
+    assert 'sort=relevance' in response.content.decode()
@@ -0,0 +1,128 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from shop.models import Product, ShoppingCart, ShoppingCartProduct
+from shop.orders import CartAlreadyOrdered, OutOfStock, commit_order
+
+CHECKOUTS = 200
+
+
+@pytest.fixture
+def stocked_product(test_product):
+    test_product.stock = 5
+    test_product.save()
+    return test_product
+
+
+@pytest.mark.django_db
+def test_payment_takes_stock(client, user, cart, stocked_product):
+    ShoppingCartProduct.objects.create(shopping_cart=cart, product=stocked_product, quantity=2)
+    client.force_login(user)
+    response = client.post(reverse('payment'))
+    assert response.status_code == 200
+    stocked_product.refresh_from_db()
+    assert stocked_product.stock == 3
+    cart.refresh_from_db()
+    assert not cart.active
+
+
+@pytest.mark.django_db
+def test_payment_out_of_stock_rolls_back(client, user, cart, stocked_product, test_category):
+    scarce = Product.objects.create(name='Scarce', stock=1, category=test_category, vat='0.24')
+    ShoppingCartProduct.objects.create(shopping_cart=cart, product=stocked_product, quantity=2)
+    ShoppingCartProduct.objects.create(shopping_cart=cart, product=scarce, quantity=3)
+    client.force_login(user)
+    response = client.post(reverse('payment'))
+    assert response.status_code == 409
+    assert [product.name for product in response.context['out_of_stock']] == ['Scarce']
+    stocked_product.refresh_from_db()
+    scarce.refresh_from_db()
+    assert (stocked_product.stock, scarce.stock) == (5, 1)
+    cart.refresh_from_db()
+    assert cart.active
+
+
+@pytest.mark.django_db
+def test_cart_cannot_be_ordered_twice(cart, stocked_product):
+    ShoppingCartProduct.objects.create(shopping_cart=cart, product=stocked_product, quantity=1)
+    commit_order(cart)
+    with pytest.raises(CartAlreadyOrdered):
+        commit_order(cart)
+    stocked_product.refresh_from_db()
+    assert stocked_product.stock == 4
+
+
+def test_concurrent_checkouts_never_oversell(concurrent_db, test_category):
+    first = Product.objects.create(name='Flash sale A', stock=50, category=test_category, vat='0.24')
+    second = Product.objects.create(name='Flash sale B', stock=120, category=test_category, vat='0.24')
+    users = User.objects.bulk_create([User(username=f'buyer{i}') for i in range(CHECKOUTS)])
+    carts = ShoppingCart.objects.bulk_create([ShoppingCart(user=user) for user in users])
+    ShoppingCartProduct.objects.bulk_create(
+        [ShoppingCartProduct(shopping_cart=cart, product=first, quantity=1) for cart in carts]
+        + [ShoppingCartProduct(shopping_cart=cart, product=second, quantity=1) for cart in carts]
+    )
+    outcomes = []
+    lock = threading.Lock()
+
+    def checkout(cart):
+        try:
+            commit_order(cart)
+            outcome = 'ordered'
+        except OutOfStock:
+            outcome = 'out of stock'
+        finally:
+            connection.close()
+        with lock:
+            outcomes.append(outcome)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(checkout, carts))
+
+    first.refresh_from_db()
+    second.refresh_from_db()
+    assert outcomes.count('ordered') == 50
+    assert outcomes.count('out of stock') == CHECKOUTS - 50
+    assert (first.stock, second.stock) == (0, 70)
+    assert ShoppingCart.objects.filter(active=False).count() == 50
+
+
+@pytest.mark.django_db
+def test_payment_writes_order_snapshot(client, user, cart, address, stocked_product, django_assert_max_num_queries):
+    ShoppingCartProduct.objects.create(shopping_cart=cart, product=stocked_product, quantity=2)
+    client.force_login(user)
+    response = client.post(reverse('payment'), {'address_id': address.id})
+    order = response.context['order']
+    assert (order.total_net_cents, order.total_vat_cents, order.total_gross_cents) == (20000, 4800, 24800)
+    assert (order.city, order.zipcode) == ('Test City', '12345')
+    line = order.lines.get()
+    assert (line.product_name, line.quantity, line.vat_percent, line.unit_gross_cents) == ('Test Product', 2, 24, 12400)
+
+    # Later catalog changes do not touch the order.
+    stocked_product.name = 'Renamed'
+    stocked_product.netto_price = 999
+    stocked_product.save()
+    line.refresh_from_db()
+    assert (line.product_name, line.line_gross_cents) == ('Test Product', 24800)
+
+    with django_assert_max_num_queries(6):
+        response = client.get(reverse('profile', kwargs={'username': user.username}))
+    assert '2 x Test Product = 248.00 ISK' in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_order_lines_are_bulk_inserted(cart, test_category):
+    products = Product.objects.bulk_create(
+        [Product(name=f'Bulk {i}', slug=f'bulk-{i}', stock=10, vat='0.24', category=test_category) for i in range(30)]
+    )
+    ShoppingCartProduct.objects.bulk_create([ShoppingCartProduct(shopping_cart=cart, product=p) for p in products])
+    with CaptureQueriesContext(connection) as queries:
+        order = commit_order(cart)
+    inserts = [query['sql'] for query in queries if query['sql'].startswith('INSERT INTO "shop_orderline"')]
+    assert len(inserts) == 1
+    assert order.lines.count() == 30
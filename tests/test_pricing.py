@@ -0,0 +1,45 @@
+from decimal import Decimal
+
+import pytest
+from django.urls import reverse
+
+from shop.models import Product, ShoppingCartProduct
+from shop.pricing import CartTotals, cart_summary
+
+
+@pytest.mark.django_db
+def test_cart_summary_uses_exact_decimals(cart, test_category):
+    prices = [(199, '0.24', 3), (7, '0.11', 13), (1, '0.24', 1)]
+    for i, (netto, vat, quantity) in enumerate(prices):
+        product = Product.objects.create(name=f'Priced {i}', netto_price=netto, vat=vat, category=test_category)
+        ShoppingCartProduct.objects.create(shopping_cart=cart, product=product, quantity=quantity)
+
+    lines, totals = cart_summary(cart)
+    assert [line.unit_price for line in lines] == [Decimal('246.76'), Decimal('7.77'), Decimal('1.24')]
+    assert [line.line_total for line in lines] == [Decimal('740.28'), Decimal('101.01'), Decimal('1.24')]
+    assert totals == CartTotals(Decimal('689.00'), Decimal('153.53'), Decimal('842.53'))
+
+
+@pytest.mark.django_db
+def test_cart_summary_is_a_single_query(cart, test_category, django_assert_num_queries):
+    for i in range(20):
+        product = Product.objects.create(name=f'Line {i}', netto_price=10, vat='0.24', category=test_category)
+        ShoppingCartProduct.objects.create(shopping_cart=cart, product=product, quantity=2)
+    with django_assert_num_queries(1):
+        lines, totals = cart_summary(cart)
+    assert totals.gross == Decimal('496.00')
+
+
+@pytest.mark.django_db
+def test_empty_cart_summary(cart):
+    lines, totals = cart_summary(cart)
+    assert lines == []
+    assert totals.gross == Decimal('0.00')
+
+
+@pytest.mark.django_db
+def test_cart_view_shows_net_and_vat(client, user, cart, cart_product):
+    client.force_login(user)
+    response = client.get(reverse('cart'))
+    assert response.context['totals'] == CartTotals(Decimal('200.00'), Decimal('48.00'), Decimal('248.00'))
+    assert '124.00ISK' in response.content.decode()
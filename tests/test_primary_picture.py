@@ -0,0 +1,65 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from shop.models import Picture, Product, ShoppingCartProduct
+
+
+def add_products(category, count):
+    products = []
+    start = Product.objects.count()
+    for i in range(start, start + count):
+        product = Product.objects.create(name=f'Listed {i}', netto_price=10, vat='0.24', category=category)
+        Picture.objects.create(product=product, image=f'images/listed-{i}.jpg')
+        products.append(product)
+    return products
+
+
+def count_queries(client, url, method='get', data=None):
+    with CaptureQueriesContext(connection) as queries:
+        response = getattr(client, method)(url, data)
+    assert response.status_code == 200
+    return len(queries)
+
+
+@pytest.mark.django_db
+def test_primary_picture_follows_pictures(test_product):
+    first = Picture.objects.create(product=test_product, image='images/first.jpg')
+    second = Picture.objects.create(product=test_product, image='images/second.jpg')
+    test_product.refresh_from_db()
+    assert test_product.primary_picture == first
+    first.delete()
+    test_product.refresh_from_db()
+    assert test_product.primary_picture == second
+    second.delete()
+    test_product.refresh_from_db()
+    assert test_product.primary_picture is None
+
+
+@pytest.mark.django_db
+def test_category_view_query_count_is_constant(client, test_category, django_capture_on_commit_callbacks):
+    url = reverse('categories', kwargs={'slug': test_category.slug})
+    add_products(test_category, 1)
+    client.get(url)
+    few = count_queries(client, url)
+    with django_capture_on_commit_callbacks(execute=True):
+        add_products(test_category, 10)
+    client.get(url)
+    assert count_queries(client, url) == few
+    assert 'images/listed-7.jpg' in client.get(url).content.decode()
+
+
+@pytest.mark.django_db
+def test_cart_and_checkout_query_count_is_constant(client, user, cart, address, test_category):
+    client.force_login(user)
+    for product in add_products(test_category, 1):
+        ShoppingCartProduct.objects.create(shopping_cart=cart, product=product)
+    client.get(reverse('index'))
+    cart_few = count_queries(client, reverse('cart'))
+    checkout_few = count_queries(client, reverse('checkout'), 'post', {'address_id': address.id})
+
+    for product in add_products(test_category, 10):
+        ShoppingCartProduct.objects.create(shopping_cart=cart, product=product)
+    assert count_queries(client, reverse('cart')) == cart_few
+    assert count_queries(client, reverse('checkout'), 'post', {'address_id': address.id}) == checkout_few
@@ -0,0 +1,88 @@
+import json
+import time
+from io import StringIO
+
+import pytest
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.template import engines
+from django.urls import reverse
+
+from shop.models import Product
+from shop.profiling import ProfilingMiddleware, StackSampler, collapsed_stacks, profile_token
+
+
+@pytest.fixture
+def profile_dir(settings, tmp_path):
+    settings.PROFILE_DIR = tmp_path
+    return tmp_path
+
+
+def test_profiler_is_removed_when_disabled(settings):
+    settings.PROFILE_SIGNED_REQUESTS = False
+    settings.PROFILE_SAMPLE_RATE = 0
+    with pytest.raises(MiddlewareNotUsed):
+        ProfilingMiddleware(lambda request: None)
+
+
+@pytest.mark.django_db
+def test_sampler_splits_orm_template_and_python(test_product):
+    template = engines['django'].from_string('{% for i in items %}{{ i|add:1 }}{% endfor %}')
+    with StackSampler(interval=0.001) as sampler:
+        deadline = time.perf_counter() + 0.15
+        while time.perf_counter() < deadline:
+            list(Product.objects.filter(name__icontains='test').select_related('category'))
+        deadline = time.perf_counter() + 0.15
+        while time.perf_counter() < deadline:
+            template.render({'items': range(200)})
+        deadline = time.perf_counter() + 0.15
+        while time.perf_counter() < deadline:
+            sum(i * i for i in range(1000))
+
+    assert sampler.layers['orm'] > 0 and sampler.layers['template'] > 0 and sampler.layers['python'] > 0
+    assert sampler.duration_ms >= 450
+    lines = list(collapsed_stacks(sampler))
+    assert any(';test_sampler_splits_orm_template_and_python (test_profiling.py:' in line for line in lines)
+    assert all(line.rsplit(' ', 1)[1].strip().isdigit() for line in lines)
+
+
+@pytest.mark.django_db
+def test_signed_request_writes_speedscope_profile(client, settings, profile_dir, test_category):
+    settings.PROFILE_SIGNED_REQUESTS = True
+    output = StringIO()
+    page = reverse('categories', kwargs={'slug': test_category.slug})
+    call_command('profile_token', page, stdout=output)
+    url = page + '?sort=price'
+
+    response = client.get(url, headers={'X-Profile-Request': output.getvalue().strip()})
+    assert response.status_code == 200
+    assert 'orm' in response['X-Profile-Layers']
+    path = profile_dir / response['X-Profile']
+    assert '-categories-' in path.name and path.name.endswith('.speedscope.json')
+    profile = json.loads(path.read_text())
+    assert profile['name'].startswith(f'categories GET {url} ')
+    sampled = profile['profiles'][0]
+    assert sampled['type'] == 'sampled' and len(sampled['samples']) == len(sampled['weights'])
+    assert all(index < len(profile['shared']['frames']) for sample in sampled['samples'] for index in sample)
+
+
+@pytest.mark.django_db
+def test_unsigned_or_forged_requests_are_not_profiled(client, settings, profile_dir, test_product):
+    settings.PROFILE_SIGNED_REQUESTS = True
+    url = reverse('product', kwargs={'slug': test_product.slug})
+    response = client.get(url, headers={'X-Profile-Request': 'profile:forged:signature'})
+    assert 'X-Profile' not in response
+    # A token only profiles the path it was issued for.
+    response = client.get(url, headers={'X-Profile-Request': profile_token('/search/')})
+    assert 'X-Profile' not in response
+    assert list(profile_dir.iterdir()) == []
+
+
+@pytest.mark.django_db
+def test_sampled_requests_write_collapsed_profiles(client, settings, profile_dir, test_product):
+    settings.PROFILE_SAMPLE_RATE = 1.0
+    settings.PROFILE_FORMAT = 'collapsed'
+    response = client.get(reverse('product', kwargs={'slug': test_product.slug}))
+    assert 'X-Profile' not in response
+    [path] = profile_dir.iterdir()
+    assert '-product-' in path.name and path.name.endswith('.collapsed.txt')
@@ -0,0 +1,65 @@
+import copy
+
+import pytest
+from django.urls import reverse
+
+from shop.models import Product
+from shop.query_budget import QueryBudgetExceeded, fingerprint
+
+
+@pytest.fixture
+def listed_products(test_category):
+    return [Product.objects.create(name=f'Listed {i}', category=test_category, vat='0.24') for i in range(6)]
+
+
+@pytest.fixture
+def n_plus_one_template(settings, tmp_path):
+    # A listing template asking every product for its pictures, the classic N+1.
+    (tmp_path / 'shop').mkdir()
+    (tmp_path / 'shop' / 'category_view.html').write_text(
+        '{% for prod in products %}\n{{ prod.name }}\n{{ prod.picture_set.first }}\n{% endfor %}\n'
+    )
+    templates = copy.deepcopy(settings.TEMPLATES)
+    templates[0]['DIRS'] = [tmp_path]
+    settings.TEMPLATES = templates
+
+
+def test_fingerprint_ignores_parameters():
+    assert fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x'") == (
+        fingerprint("SELECT * FROM t WHERE id IN (%s)  AND name = 'y'")
+    )
+    assert fingerprint('SELECT * FROM t LIMIT 21') == 'SELECT * FROM t LIMIT ?'
+
+
+@pytest.mark.django_db
+def test_views_within_budget_pass(client, listed_products, test_category):
+    response = client.get(reverse('categories', kwargs={'slug': test_category.slug}))
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_n_plus_one_exceeds_budget_with_template_line(client, listed_products, test_category, n_plus_one_template):
+    with pytest.raises(QueryBudgetExceeded) as error:
+        client.get(reverse('categories', kwargs={'slug': test_category.slug}))
+    report = str(error.value)
+    assert 'over its budget of 8 queries' in report
+    assert '6x SELECT' in report and '"shop_picture"' in report
+    assert 'from shop/category_view.html:3 {{ prod.picture_set.first }}' in report
+
+
+@pytest.mark.django_db
+def test_budget_overrides_and_log_mode(client, settings, test_product, caplog):
+    settings.QUERY_BUDGET_MODE = 'log'
+    settings.QUERY_BUDGETS = {'product': (1, None)}
+    response = client.get(reverse('product', kwargs={'slug': test_product.slug}))
+    assert response.status_code == 200
+    assert 'over its budget of 1 queries' in caplog.text
+
+
+@pytest.mark.django_db
+def test_debug_headers(client, settings, test_product):
+    settings.DEBUG = True
+    response = client.get(reverse('product', kwargs={'slug': test_product.slug}))
+    assert int(response['X-Query-Count']) > 0
+    assert response['X-Query-Budget'] == '6 queries, 50 ms'
+    assert float(response['X-Query-Time-Ms']) >= 0
@@ -0,0 +1,106 @@
+import json
+import os
+import time
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+
+from shop.query_log import QueryLogMiddleware, query_log, read_query_log
+
+
+@pytest.fixture
+def query_log_file(settings, tmp_path):
+    settings.QUERY_LOG_PATH = tmp_path / 'query_log.jsonl'
+    settings.QUERY_LOG_SAMPLE_RATE = 1.0
+    return settings.QUERY_LOG_PATH
+
+
+def test_query_log_middleware_is_removed_when_sampling_is_off(settings):
+    from django.core.exceptions import MiddlewareNotUsed
+
+    settings.QUERY_LOG_SAMPLE_RATE = 0
+    with pytest.raises(MiddlewareNotUsed):
+        QueryLogMiddleware(lambda request: None)
+
+
+@pytest.mark.django_db
+def test_sampled_queries_are_aggregated_per_view(client, query_log_file, test_category):
+    url = reverse('categories', kwargs={'slug': test_category.slug})
+    client.get(url)
+    client.get(url + '?sort=price')
+    assert query_log.flush() > 0
+
+    entries = list(read_query_log())
+    assert {entry['view'] for entry in entries} == {'categories'}
+    products = [entry for entry in entries if 'FROM "shop_product"' in entry['fingerprint']]
+    assert products and sum(entry['count'] for entry in products) >= 2
+    assert all(entry['sampled_requests'] == 2 for entry in entries)
+    assert any(entry['code'] and entry['code'].startswith('shop/') for entry in products)
+    assert query_log.flush() == 0
+
+
+@pytest.mark.django_db
+def test_query_log_report(client, query_log_file, test_product):
+    client.get(reverse('product', kwargs={'slug': test_product.slug}))
+    client.get(reverse('index'))
+    query_log.flush()
+
+    output = StringIO()
+    call_command('query_log_report', '--view', 'product', '--json', stdout=output)
+    rows = json.loads(output.getvalue())
+    assert rows and {row['view'] for row in rows} == {'product'}
+    assert rows == sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    output = StringIO()
+    call_command('query_log_report', '--sort', 'count', stdout=output)
+    assert 'total ms' in output.getvalue() and 'at shop/' in output.getvalue()
+
+
+@pytest.mark.django_db
+def test_rotated_backups_are_read(client, settings, query_log_file, test_product):
+    settings.QUERY_LOG_MAX_BYTES = 512
+    url = reverse('product', kwargs={'slug': test_product.slug})
+    for _ in range(3):
+        client.get(url)
+        query_log.flush()
+    assert query_log_file.with_name(f'query_log.{os.getpid()}.jsonl.1').exists()
+    assert sum(entry['sampled_requests'] == 1 for entry in read_query_log()) >= 3
+
+
+@pytest.mark.django_db
+def test_report_sums_the_files_of_every_process(client, query_log_file, test_product):
+    client.get(reverse('product', kwargs={'slug': test_product.slug}))
+    query_log.flush()
+    [own] = list(read_query_log())[:1]
+    other = query_log_file.with_name('query_log.99999.jsonl')
+    other.write_text(json.dumps({**own, 'pid': 99999, 'count': 5}) + '\n')
+
+    output = StringIO()
+    call_command('query_log_report', '--view', 'product', '--json', stdout=output)
+    row = next(row for row in json.loads(output.getvalue()) if row['fingerprint'] == own['fingerprint'])
+    assert row['count'] == own['count'] + 5
+
+
+@pytest.mark.django_db
+def test_old_files_of_other_processes_are_pruned(client, query_log_file, test_product):
+    old, backup, recent = (query_log_file.with_name(name) for name in (
+        'query_log.99998.jsonl', 'query_log.99998.jsonl.1', 'query_log.99999.jsonl',
+    ))
+    for path in (old, backup, recent):
+        path.write_text('')
+    past = time.time() - 8 * 86400
+    for path in (old, backup):
+        os.utime(path, (past, past))
+
+    client.get(reverse('product', kwargs={'slug': test_product.slug}))
+    query_log.flush()
+    assert not old.exists() and not backup.exists() and recent.exists()
+
+    # A process whose own file was pruned while it was idle writes to a new one.
+    own = query_log_file.with_name(f'query_log.{os.getpid()}.jsonl')
+    os.remove(own)
+    client.get(reverse('categories', kwargs={'slug': test_product.category.slug}))
+    query_log.flush()
+    assert own.exists() and list(read_query_log())
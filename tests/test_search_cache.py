@@ -0,0 +1,82 @@
+import json
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+
+from shop.models import Product, SearchQueryStat, Tool
+from shop.search_cache import cached_search, normalize_query, search_stats
+
+
+def test_normalize_query():
+    assert normalize_query('  Młotek   STOLARSKI ') == 'mlotek stolarski'
+    assert normalize_query('Śrubokręt') == normalize_query('srubokret')
+
+
+@pytest.mark.django_db
+def test_repeated_search_is_served_from_cache(test_product, django_assert_num_queries):
+    assert cached_search('Test Product').product_ids == [test_product.pk]
+    with django_assert_num_queries(0):
+        assert cached_search('  test   PRODUCT ').product_ids == [test_product.pk]
+
+
+@pytest.mark.django_db
+def test_product_change_invalidates_cached_results(test_product, django_capture_on_commit_callbacks):
+    cached_search('test product')
+    with django_capture_on_commit_callbacks(execute=True):
+        other = Product.objects.create(name='Test Product Two', category=test_product.category, vat='0.24')
+    assert cached_search('test product').product_ids == [test_product.pk, other.pk]
+
+
+@pytest.mark.django_db
+def test_tool_links_invalidate_cached_results(test_product, django_capture_on_commit_callbacks):
+    chisel = Tool.objects.create(name='Chisel')
+    assert cached_search('chisel').product_ids == []
+    with django_capture_on_commit_callbacks(execute=True):
+        test_product.tool.add(chisel)
+    assert cached_search('chisel').product_ids == [test_product.pk]
+    with django_capture_on_commit_callbacks(execute=True):
+        chisel.product_set.clear()
+    assert cached_search('chisel').product_ids == []
+
+
+@pytest.mark.django_db
+def test_search_view_uses_cache(client, test_product, django_assert_max_num_queries):
+    client.post(reverse('search'), {'searched': 'test product'})
+    # The second search only loads the products of the page.
+    with django_assert_max_num_queries(1):
+        response = client.post(reverse('search'), {'searched': 'Test  product'})
+    assert [product.name for product in response.context['products']] == ['Test Product']
+
+
+@pytest.mark.django_db
+def test_search_stats_are_flushed_and_exported(test_product, capsys):
+    cached_search('Test Product')
+    cached_search('test product')
+    cached_search('hammer')
+    search_stats.flush()
+    assert SearchQueryStat.objects.get(query='test product').hits == 2
+
+    call_command('export_search_stats', limit=1)
+    exported = json.loads(capsys.readouterr().out)
+    assert [(row['query'], row['hits']) for row in exported] == [('test product', 2)]
+
+
+@pytest.mark.django_db
+def test_search_stats_flush_runs_the_same_queries_for_any_number_of_searches(django_assert_num_queries):
+    SearchQueryStat.objects.create(query='saw', hits=5)
+    for query in ['saw', 'saw', 'drill', 'hammer', 'chisel', 'file']:
+        search_stats.record(query)
+    with django_assert_num_queries(4):
+        # SAVEPOINT, INSERT ... ON CONFLICT DO NOTHING, UPDATE ... CASE, RELEASE SAVEPOINT
+        search_stats.flush()
+    hits = dict(SearchQueryStat.objects.values_list('query', 'hits'))
+    assert hits == {'saw': 7, 'drill': 1, 'hammer': 1, 'chisel': 1, 'file': 1}
+
+
+@pytest.mark.django_db
+def test_warm_search_cache(test_product, django_assert_num_queries):
+    SearchQueryStat.objects.create(query='test product', hits=10)
+    call_command('warm_search_cache', stdout=None)
+    with django_assert_num_queries(0):
+        cached_search('test product', record=False)
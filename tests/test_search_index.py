@@ -0,0 +1,87 @@
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+
+from shop.models import Category, Product, SearchIndexEntry, Tool
+from shop.search import rank_products, search, stem, tokenize
+
+
+def test_tokenize_folds_and_stems():
+    assert tokenize('Śrubokręty and HAMMERS, 12-in-1') == ['srubokrety', 'hammer', '12', '1']
+    assert stem('knives') == 'knive'
+    assert stem('boxes') == 'box'
+
+
+@pytest.mark.django_db
+def test_product_is_indexed_on_save(test_product):
+    terms = set(SearchIndexEntry.objects.filter(product=test_product).values_list('term', flat=True))
+    assert {'test', 'product', 'tool', '3', 'category', 'description'} <= terms
+
+
+@pytest.mark.django_db
+def test_search_matches_tools_and_category(test_product):
+    assert list(search('tool 3')) == [test_product]
+    assert list(search('test category')) == [test_product]
+    assert list(search('test products')) == [test_product]
+    assert list(search('test nothing')) == []
+
+
+@pytest.mark.django_db
+def test_search_ranks_name_matches_first(test_category):
+    by_tool = Product.objects.create(name='Pocket knife', category=test_category, vat='0.24')
+    by_tool.tool.add(Tool.objects.create(name='Saw'))
+    by_name = Product.objects.create(name='Folding saw', category=test_category, vat='0.24')
+    assert list(search('saw')) == [by_name, by_tool]
+
+
+@pytest.mark.django_db
+def test_rare_term_limits_ranked_products(test_category, django_assert_num_queries):
+    for i in range(5):
+        Product.objects.create(name=f'Claw hammer {i}', category=test_category, vat='0.24')
+    rare = Product.objects.create(name='Claw hammer XL', category=test_category, vat='0.24')
+    assert rank_products(tokenize('hammer xl')) == [rare.pk]
+    # Document frequencies and the product count are cached after the first search.
+    with django_assert_num_queries(1):
+        assert rank_products(tokenize('xl hammers')) == [rare.pk]
+
+
+@pytest.mark.django_db
+def test_broad_queries_rank_a_bounded_number_of_candidates(test_category):
+    by_tool = Product.objects.create(name='Pocket knife', category=test_category, vat='0.24')
+    by_tool.tool.add(Tool.objects.create(name='Hammer'))
+    hammers = [Product.objects.create(name=f'Claw hammer {i}', category=test_category, vat='0.24').pk for i in range(4)]
+    assert rank_products(['hammer']) == [*hammers, by_tool.pk]
+    assert rank_products(['hammer'], max_candidates=3) == hammers[:3]
+    assert rank_products(tokenize('claw hammer'), max_candidates=2) == hammers[:2]
+    assert rank_products(tokenize('claw hammer'), limit=3, max_candidates=2) == hammers[:3]
+
+
+@pytest.mark.django_db
+def test_index_follows_category_and_tool_renames(test_product):
+    category = test_product.category
+    category.name = 'Multitools'
+    category.save()
+    tool = test_product.tool.first()
+    tool.name = 'Pliers'
+    tool.save()
+    assert list(search('multitool pliers')) == [test_product]
+    assert list(search('tool 3')) == []
+
+
+@pytest.mark.django_db
+def test_rebuild_search_index_command(test_product):
+    SearchIndexEntry.objects.all().delete()
+    call_command('rebuild_search_index', stdout=None)
+    assert list(search('test product')) == [test_product]
+
+
+@pytest.mark.django_db
+def test_search_view_paginates(client, test_category, settings):
+    for i in range(30):
+        Product.objects.create(name=f'Hammer {i}', category=test_category, vat='0.24')
+    first = client.get(reverse('search'), {'searched': 'hammer'})
+    cursor = first.context['page_obj'].next_cursor
+    response = client.get(reverse('search'), {'searched': 'hammer', 'cursor': cursor})
+    assert response.status_code == 200
+    assert not response.context['page_obj'].has_next
+    assert len(response.context['products']) == 30 - len(first.context['products'])
@@ -0,0 +1,60 @@
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db.models import Count
+
+from shop.models import Category, MediaBlob, Picture, Product, ShoppingCart, ShoppingCartProduct, Tool
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
+def seed(*args):
+    call_command(
+        'seed_catalog', '--products', '300', '--categories', '8', '--tools', '30', '--users', '40',
+        '--picture-pool', '3', '--batch-size', '100', *args, stdout=StringIO(),
+    )
+
+
+def snapshot():
+    return [
+        (product.name, product.slug, product.netto_price, product.vat, product.category.name,
+         sorted(product.tool.values_list('name', flat=True)))
+        for product in Product.objects.order_by('pk').select_related('category')
+    ]
+
+
+@pytest.mark.django_db
+def test_seed_catalog_creates_consistent_skewed_data():
+    seed()
+    assert Product.objects.count() == 300
+    assert User.objects.count() == 40
+    sizes = sorted(Category.objects.annotate(size=Count('product')).values_list('size', flat=True), reverse=True)
+    assert sizes[0] > 3 * sizes[-1]
+    for product in Product.objects.all()[:50]:
+        assert product.gross_price_cents == product.compute_gross_price_cents()
+    with_pictures = Product.objects.filter(picture__isnull=False).distinct()
+    assert with_pictures.count() == Product.objects.filter(primary_picture__isnull=False).count()
+    assert sum(MediaBlob.objects.values_list('refcount', flat=True)) == Picture.objects.count()
+    assert ShoppingCart.objects.filter(active=True).exists()
+    assert ShoppingCartProduct.objects.exists()
+    assert User.objects.first().check_password('seed')
+
+
+@pytest.mark.django_db
+def test_seed_catalog_is_deterministic():
+    seed('--seed', '7')
+    first = snapshot()
+    with pytest.raises(CommandError):
+        seed('--seed', '7')
+    Product.objects.all().delete()
+    Category.objects.all().delete()
+    User.objects.all().delete()
+    Tool.objects.all().delete()
+    seed('--seed', '7')
+    assert snapshot() == first
@@ -0,0 +1,118 @@
+import pytest
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from shop.cache import get_version
+from shop.facets import CategoryToolIndex, tool_index
+from shop.models import Category, Product, Tool
+
+
+@pytest.fixture
+def indexed_products(test_category):
+    hammer = Tool.objects.create(name='Hammer')
+    knife = Tool.objects.create(name='Knife')
+    saw = Tool.objects.create(name='Saw')
+    first = Product.objects.create(name='First', category=test_category, vat='0.24')
+    first.tool.set([hammer, knife])
+    second = Product.objects.create(name='Second', category=test_category, vat='0.24')
+    second.tool.set([hammer, saw])
+    return hammer, knife, saw, first, second
+
+
+def test_category_tool_index_intersection():
+    index = CategoryToolIndex(category_id=1)
+    index.add_product(10, [1, 2])
+    index.add_product(11, [1, 3])
+    index.add_product(12, [2])
+    assert index.product_ids(index.match([1])) == [10, 11]
+    assert index.product_ids(index.match([1, 2])) == [10]
+    assert index.product_ids(index.match([2, 3])) == []
+    index.remove_product(10)
+    assert index.product_ids(index.match([2])) == [12]
+
+
+@pytest.mark.django_db
+def test_index_matches_database(indexed_products, test_category):
+    hammer, knife, saw, first, second = indexed_products
+    index = tool_index.get(test_category.pk)
+    assert index.product_ids(index.match([hammer.pk])) == [first.pk, second.pk]
+    assert index.product_ids(index.match([hammer.pk, saw.pk])) == [second.pk]
+
+
+@pytest.mark.django_db
+def test_index_is_updated_incrementally(
+    indexed_products, test_category, django_assert_num_queries, django_capture_on_commit_callbacks
+):
+    hammer, knife, saw, first, second = indexed_products
+    index = tool_index.get(test_category.pk)
+    with django_capture_on_commit_callbacks(execute=True):
+        second.tool.add(knife)
+        first.tool.remove(hammer)
+    with django_assert_num_queries(0):
+        index = tool_index.get(test_category.pk)
+    assert index.product_ids(index.match([knife.pk])) == [first.pk, second.pk]
+    assert index.product_ids(index.match([hammer.pk])) == [second.pk]
+
+
+@pytest.mark.django_db
+def test_index_follows_category_change(indexed_products, test_category, django_capture_on_commit_callbacks):
+    hammer, knife, saw, first, second = indexed_products
+    other = Category.objects.create(name='Other', description='other')
+    tool_index.get(test_category.pk)
+    with django_capture_on_commit_callbacks(execute=True):
+        first.category = other
+        first.save()
+    index = tool_index.get(test_category.pk)
+    assert index.product_ids(index.match([hammer.pk])) == [second.pk]
+    index = tool_index.get(other.pk)
+    assert index.product_ids(index.match([knife.pk])) == [first.pk]
+
+
+@pytest.mark.django_db
+def test_rolled_back_change_leaves_index_alone(indexed_products, test_category, django_capture_on_commit_callbacks):
+    hammer, knife, saw, first, second = indexed_products
+    tool_index.get(test_category.pk)
+    version = get_version(tool_index.namespace(test_category.pk))
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        with pytest.raises(RuntimeError), transaction.atomic():
+            second.tool.add(knife)
+            raise RuntimeError
+    assert callbacks == []
+    assert get_version(tool_index.namespace(test_category.pk)) == version
+    index = tool_index.get(test_category.pk)
+    assert index.product_ids(index.match([knife.pk])) == [first.pk]
+
+
+@pytest.mark.django_db
+def test_category_view_filters_with_index(client, indexed_products, test_category):
+    hammer, knife, saw, first, second = indexed_products
+    url = reverse('categories', kwargs={'slug': test_category.slug})
+    response = client.get(url, {'tools': [hammer.pk, knife.pk]})
+    assert list(response.context['products']) == [first]
+    response = client.get(url, {'tools': [knife.pk, saw.pk]})
+    assert list(response.context['products']) == []
+
+
+@pytest.mark.django_db
+def test_category_view_shows_facet_counts(client, indexed_products, test_category):
+    hammer, knife, saw, first, second = indexed_products
+    url = reverse('categories', kwargs={'slug': test_category.slug})
+    response = client.get(url, {'tools': [hammer.pk]})
+    counts = {tool.name: tool.facet_count for tool in response.context['tools']}
+    assert counts == {'Hammer': 2, 'Knife': 1, 'Saw': 1}
+    assert 'Knife (1)' in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_facet_counts_do_not_query_per_tool(client, indexed_products, test_category):
+    url = reverse('categories', kwargs={'slug': test_category.slug})
+    client.get(url)
+    with CaptureQueriesContext(connection) as before:
+        client.get(url)
+    for name in ('Tool A', 'Tool B', 'Tool C', 'Tool D'):
+        indexed_products[3].tool.add(Tool.objects.create(name=name))
+    client.get(url)
+    with CaptureQueriesContext(connection) as after:
+        client.get(url)
+    assert len(after) == len(before)